@@ -0,0 +1,104 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""界面启动耗时基准
+
+每次在新的 Python 进程中载入 src/main.py 并创建窗口，分别计时：
+导入 main、创建并显示窗口，以及从启动进程到退出的总耗时。
+同时检查启动时没有载入 pandas、numpy、openpyxl 等重量级模块，有则以退出码 1 结束。
+没有图形界面（如服务器上没有 DISPLAY）时只统计导入。用法：
+    python benchmarks/bench_startup.py --repeat 5 --output bench_results.jsonl
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# 启动时不应载入的模块：这些只在开始处理时才需要
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "xlrd", "processor", "parse_cache", "win32com"]
+
+# 在子进程中执行：计时并以一行 JSON 输出结果
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {src!r})
+import tkinter as tk
+import main
+imported = time.perf_counter()
+window = None
+try:
+    root = tk.Tk()
+    main.AdvancedAccountingProcessor(root)
+    root.update()
+    window = time.perf_counter() - imported
+    root.destroy()
+except tk.TclError:
+    pass
+print(json.dumps({{"import": imported - started, "window": window,
+                   "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_once():
+    """启动一个新进程，返回 (总耗时, 子进程内各段耗时)"""
+    code = CHILD.format(src=SRC_DIR, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - start
+    return total, json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对方科目处理器界面启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取中位数）")
+    parser.add_argument("--output", default="bench_results.jsonl", help="结果追加写入的 JSON Lines 文件")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    windows = [child["window"] for _, child in runs if child["window"] is not None]
+    heavy = sorted({name for _, child in runs for name in child["heavy"]})
+    result = {
+        "benchmark": "startup",
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seconds": {
+            "process_total": round(statistics.median(total for total, _ in runs), 4),
+            "import_main": round(statistics.median(child["import"] for _, child in runs), 4),
+            "create_window": round(statistics.median(windows), 4) if windows else None,
+        },
+        "heavy_modules": heavy,
+    }
+    with open(args.output, "a", encoding="utf-8") as out:
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    s = result["seconds"]
+    print(f"进程总耗时 {s['process_total']:.3f} 秒，导入 main {s['import_main']:.3f} 秒，"
+          + (f"创建窗口 {s['create_window']:.3f} 秒" if windows else "（无图形界面，未创建窗口）"))
+    if heavy:
+        print(f"启动时载入了重量级模块：{', '.join(heavy)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
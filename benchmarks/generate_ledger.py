@@ -0,0 +1,243 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""生成用于性能测试的模拟序时账
+
+直接写出 xlsx 各部件（共享字符串表、筛选、可选的宏工程），与 Excel 导出的文件结构一致，
+百万行也只需数秒。用法：
+    python benchmarks/generate_ledger.py out.xlsx --rows 100000 --layout together --shuffle
+"""
+
+import argparse
+import random
+import zipfile
+from xml.sax.saxutils import escape
+
+
+# 两种布局的表头及对应的处理参数
+LAYOUTS = {
+    "separate": {
+        "header": ["日期", "凭证字号", "摘要", "科目名称", "借方金额", "贷方金额"],
+        "params": {"voucher_col": "B", "subject_col": "D", "debit_col": "E", "credit_col": "F",
+                   "sheet_name": "", "target_col": "H"},
+    },
+    "together": {
+        "header": ["日期", "凭证字号", "摘要", "科目名称", "金额", "借贷方向"],
+        "params": {"voucher_col": "B", "subject_col": "D", "amount_col": "E", "direction_col": "F",
+                   "debit_flag": "借", "credit_flag": "贷", "credit_action": "直接等于",
+                   "sheet_name": "", "target_col": "H"},
+    },
+}
+
+SUBJECT_ROOTS = ["银行存款", "库存现金", "应收账款", "应付账款", "应交税费", "管理费用", "销售费用",
+                 "主营业务收入", "主营业务成本", "原材料", "库存商品", "其他应收款", "应付职工薪酬"]
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">\
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>\
+<Default Extension="xml" ContentType="application/xml"/>{vba_default}\
+<Override PartName="/xl/workbook.xml" ContentType="{main_type}"/>\
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>\
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>\
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>\
+</Types>"""
+
+ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>\
+</Relationships>"""
+
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" \
+xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">\
+<sheets><sheet name="序时账" sheetId="1" r:id="rId1"/></sheets>\
+<definedNames><definedName name="_xlnm._FilterDatabase" localSheetId="0" hidden="1">序时账!$A$1:$F${last_row}</definedName></definedNames>\
+</workbook>"""
+
+WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>\
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>\
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>\
+{vba_rel}</Relationships>"""
+
+STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">\
+<numFmts count="1"><numFmt numFmtId="164" formatCode="#,##0.00"/></numFmts>\
+<fonts count="1"><font><sz val="11"/><name val="等线"/></font></fonts>\
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>\
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>\
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>\
+<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>\
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>\
+<cellStyles count="1"><cellStyle name="常规" xfId="0" builtinId="0"/></cellStyles>\
+</styleSheet>"""
+
+VBA_REL = ('<Relationship Id="rId4" Type="http://schemas.microsoft.com/office/2006/relationships/vbaProject" '
+           'Target="vbaProject.bin"/>')
+VBA_DEFAULT = '<Default Extension="bin" ContentType="application/vnd.ms-office.vbaProject"/>'
+MAIN_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"
+MACRO_MAIN_TYPE = "application/vnd.ms-excel.sheet.macroEnabled.main+xml"
+
+
+def make_subjects(cardinality, rng):
+    """生成指定数量的科目名称（一级科目-明细科目）"""
+    subjects = list(SUBJECT_ROOTS[:cardinality])
+    while len(subjects) < cardinality:
+        subjects.append(f"{rng.choice(SUBJECT_ROOTS)}-明细{len(subjects):05d}")
+    return subjects
+
+
+def voucher_sizes(rows, distribution, mean, rng):
+    """按分布生成每张凭证的行数（至少 2 行，一借一贷）"""
+    remaining = rows
+    while remaining > 0:
+        if distribution == "fixed":
+            size = mean
+        elif distribution == "uniform":
+            size = rng.randint(2, max(2, 2 * mean - 2))
+        else:  # longtail：大多数凭证很小，偶尔有上百行的大凭证
+            size = 2 + int(rng.paretovariate(1.5) * max(mean - 2, 1) / 3)
+        size = max(2, min(size, remaining)) if remaining >= 2 else remaining
+        remaining -= size
+        yield size
+
+
+def ledger_rows(rows, layout, distribution, mean, subjects, rng):
+    """生成数据行：每张凭证借贷平衡，借方在前"""
+    voucher_no = 0
+    for size in voucher_sizes(rows, distribution, mean, rng):
+        voucher_no += 1
+        voucher = f"记-{voucher_no:06d}"
+        day = f"2023-{voucher_no % 12 + 1:02d}-{voucher_no % 28 + 1:02d}"
+        debit_lines = max(1, size // 2)
+        amount = round(rng.uniform(10, 100000), 2)
+        for i in range(size):
+            is_debit = i < debit_lines
+            line_amount = round(amount / (debit_lines if is_debit else size - debit_lines), 2)
+            subject = rng.choice(subjects)
+            if layout == "separate":
+                yield [day, voucher, f"摘要{voucher_no}", subject,
+                       line_amount if is_debit else None, None if is_debit else line_amount]
+            else:
+                yield [day, voucher, f"摘要{voucher_no}", subject, line_amount, "借" if is_debit else "贷"]
+
+
+class _SharedStrings:
+    def __init__(self):
+        self.index = {}
+
+    def get(self, text):
+        if text not in self.index:
+            self.index[text] = len(self.index)
+        return self.index[text]
+
+    def xml(self, total):
+        items = "".join(f"<si><t>{escape(text)}</t></si>" for text in self.index)
+        return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                f'count="{total}" uniqueCount="{len(self.index)}">{items}</sst>')
+
+
+def _column_letter(idx):
+    letters = ""
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def write_xlsx(path, header, rows, macro=False):
+    """把表头和数据行写成 xlsx/xlsm（字符串进共享字符串表，首行带筛选）"""
+    strings = _SharedStrings()
+    letters = [_column_letter(i + 1) for i in range(len(header))]
+    string_cells = 0
+    last_row = 1
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetData>')
+            pending = []
+            for row_num, values in enumerate(_prepend(header, rows), start=1):
+                cells = []
+                for letter, value in zip(letters, values):
+                    if value is None:
+                        continue
+                    if isinstance(value, str):
+                        string_cells += 1
+                        cells.append(f'<c r="{letter}{row_num}" t="s"><v>{strings.get(value)}</v></c>')
+                    else:
+                        cells.append(f'<c r="{letter}{row_num}" s="1"><v>{value}</v></c>')
+                pending.append(f'<row r="{row_num}">{"".join(cells)}</row>')
+                last_row = row_num
+                if len(pending) >= 10000:
+                    sheet.write("".join(pending).encode("utf-8"))
+                    pending = []
+            sheet.write("".join(pending).encode("utf-8"))
+            sheet.write(f'</sheetData><autoFilter ref="A1:{letters[-1]}{last_row}"/></worksheet>'
+                        .encode("utf-8"))
+
+        zf.writestr("[Content_Types].xml", CONTENT_TYPES.format(
+            vba_default=VBA_DEFAULT if macro else "", main_type=MACRO_MAIN_TYPE if macro else MAIN_TYPE))
+        zf.writestr("_rels/.rels", ROOT_RELS)
+        zf.writestr("xl/workbook.xml", WORKBOOK.format(last_row=last_row))
+        zf.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS.format(vba_rel=VBA_REL if macro else ""))
+        zf.writestr("xl/styles.xml", STYLES)
+        zf.writestr("xl/sharedStrings.xml", strings.xml(string_cells))
+        if macro:
+            # 占位的宏工程，用于检验宏文件是否原样保留
+            zf.writestr("xl/vbaProject.bin", bytes(range(256)) * 64)
+
+
+def _prepend(header, rows):
+    yield header
+    yield from rows
+
+
+def generate_ledger(path, rows, layout="separate", distribution="longtail", mean_voucher=4,
+                    subjects=50, shuffle=False, macro=False, seed=0):
+    """生成模拟序时账，返回对应的处理参数
+
+    distribution: fixed / uniform / longtail（凭证行数分布）
+    shuffle: 打乱行顺序（同一凭证的行不再连续）
+    """
+    rng = random.Random(seed)
+    data = ledger_rows(rows, layout, distribution, mean_voucher, make_subjects(subjects, rng), rng)
+    if shuffle:
+        data = list(data)
+        rng.shuffle(data)
+    write_xlsx(path, LAYOUTS[layout]["header"], data, macro=macro)
+    return dict(LAYOUTS[layout]["params"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成模拟序时账")
+    parser.add_argument("path", help="输出文件（.xlsx 或 .xlsm）")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default="separate")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "longtail"], default="longtail")
+    parser.add_argument("--mean-voucher", type=int, default=4, help="凭证平均行数")
+    parser.add_argument("--subjects", type=int, default=50, help="科目数量")
+    parser.add_argument("--shuffle", action="store_true", help="打乱行顺序")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_ledger(args.path, args.rows, args.layout, args.distribution, args.mean_voucher,
+                    args.subjects, args.shuffle, macro=args.path.lower().endswith(".xlsm"), seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
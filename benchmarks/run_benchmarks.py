@@ -0,0 +1,149 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""处理流程各阶段的性能基准
+
+对不同规模和形态的模拟序时账分别计时：读取、计算对方科目、写回，以及整体（整表/流式）。
+每次运行的结果追加写入 JSON Lines 文件，便于对比不同提交之间的变化。用法：
+    python benchmarks/run_benchmarks.py --rows 1000 10000 100000 --output bench_results.jsonl
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import openpyxl  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import processor  # noqa: E402
+from engine import compute_ledger  # noqa: E402
+from generate_ledger import LAYOUTS, generate_ledger  # noqa: E402
+
+
+# 场景：在基准形态（凭证连续、长尾凭证大小、50 个科目、普通 xlsx）上逐项变化
+VARIANTS = {
+    "base": {},
+    "shuffled": {"shuffle": True},
+    "macro": {"macro": True},
+    "many_subjects": {"subjects": 5000},
+    "big_vouchers": {"distribution": "uniform", "mean_voucher": 40},
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def timed(func, repeat):
+    """重复执行取中位数耗时，返回 (秒, 最后一次的返回值)"""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), result
+
+
+def ledger_path(workdir, rows, layout, variant):
+    ext = ".xlsm" if VARIANTS[variant].get("macro") else ".xlsx"
+    return os.path.join(workdir, f"ledger_{layout}_{variant}_{rows}{ext}")
+
+
+def run_scenario(workdir, rows, layout, variant, repeat):
+    """生成（或复用）模拟账套并对各阶段计时"""
+    path = ledger_path(workdir, rows, layout, variant)
+    if not os.path.exists(path):
+        tmp_path = path + ".part"
+        generate_ledger(tmp_path, rows, layout, **VARIANTS[variant])
+        os.replace(tmp_path, path)
+    params = processor.normalize_params(LAYOUTS[layout]["params"], layout)
+
+    out_dir = os.path.join(workdir, "out")
+    os.makedirs(out_dir, exist_ok=True)
+    save_path = processor.output_path(path, out_dir)
+
+    stages = {}
+    stages["read"], ledger = timed(lambda: processor.read_ledger(path, params, layout, params["sheet_name"]),
+                                   repeat)
+    stats = {}
+    stages["compute"], result = timed(lambda: compute_ledger(ledger, params, layout, stats), repeat)
+    stages["write"], _ = timed(lambda: processor.save_output(path, save_path, {params["sheet_name"]: result}, params), repeat)
+    stages["total"], _ = timed(lambda: processor.process_file(path, params, layout, out_dir), repeat)
+    stages["total_streaming"], _ = timed(
+        lambda: processor.process_file(path, params, layout, out_dir, streaming=True), repeat)
+
+    return {
+        "rows": rows,
+        "layout": layout,
+        "variant": variant,
+        "vouchers": stats["vouchers"],
+        "file_bytes": os.path.getsize(path),
+        "seconds": {name: round(value, 4) for name, value in stages.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对方科目处理器性能基准")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="行数（可到 1000000）")
+    parser.add_argument("--layouts", nargs="+", choices=["separate", "together"],
+                        default=["separate", "together"])
+    parser.add_argument("--variants", nargs="+", choices=sorted(VARIANTS), default=sorted(VARIANTS))
+    parser.add_argument("--repeat", type=int, default=1, help="每个阶段重复次数（取中位数）")
+    parser.add_argument("--workdir", help="模拟账套存放目录（可复用），默认临时目录")
+    parser.add_argument("--output", default="bench_results.jsonl", help="结果追加写入的 JSON Lines 文件")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="counterparty_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    run_info = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "openpyxl": openpyxl.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+    print(f"{'rows':>8} {'layout':<9} {'variant':<14} {'read':>8} {'compute':>8} {'write':>8} "
+          f"{'total':>8} {'stream':>8}")
+    with open(args.output, "a", encoding="utf-8") as out:
+        for rows in args.rows:
+            for layout in args.layouts:
+                for variant in args.variants:
+                    result = run_scenario(workdir, rows, layout, variant, args.repeat)
+                    out.write(json.dumps({**run_info, **result}, ensure_ascii=False) + "\n")
+                    out.flush()
+                    s = result["seconds"]
+                    print(f"{rows:>8} {layout:<9} {variant:<14} {s['read']:>8.3f} {s['compute']:>8.3f} "
+                          f"{s['write']:>8.3f} {s['total']:>8.3f} {s['total_streaming']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""命令行入口：不打开界面，按配置文件批量处理，结果写入运行报告
+
+用法：
+    python src/cli.py --config params.json [--report report.json] 文件或目录 ...
+    python src/cli.py --config params.json --watch 目录       # 常驻监视，处理新放入的文件
+
+配置文件为 JSON，键与界面字段一致，例如：
+    {"mode": "separate", "voucher_col": "B", "subject_col": "C",
+     "debit_col": "D", "credit_col": "E", "sheet_name": "", "target_col": "H"}
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+import processor
+import watch
+from parse_cache import DEFAULT_CACHE_SIZE, ParseCache
+
+
+def load_config(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="对方科目处理器（命令行）")
+    parser.add_argument("inputs", nargs="+", help="Excel 文件或目录")
+    parser.add_argument("--config", required=True, help="参数配置文件（JSON）")
+    parser.add_argument("--mode", choices=sorted(processor.MODE_PARAMS),
+                        help="处理模式，默认取配置文件中的 mode，再默认 separate")
+    parser.add_argument("--save-dir", help="保存目录，默认与原文件相同")
+    parser.add_argument("--workers", type=int, help="并行进程数，默认CPU核数")
+    parser.add_argument("--streaming", action="store_true", help="流式处理大文件")
+    parser.add_argument("--force", action="store_true", help="忽略增量清单，全部重新处理")
+    parser.add_argument("--cross-file", action="store_true",
+                        help="把所有输入文件当作一套账，跨文件合并同一凭证（不支持流式处理）")
+    parser.add_argument("--report", help="运行报告输出路径（JSON），默认输出到标准输出")
+    parser.add_argument("--cache", action="store_true",
+                        help="缓存解析结果，同一文件换参数重新处理时跳过 Excel 解析")
+    parser.add_argument("--cache-dir", help="解析缓存目录（指定后自动启用缓存），默认在用户缓存目录下")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE >> 20,
+                        help="解析缓存大小上限（MB），超出时淘汰最久未用的文件")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视模式：常驻运行，处理放入目录的新文件（Ctrl+C 退出），每批的报告输出为一行 JSON")
+    parser.add_argument("--interval", type=float, default=watch.DEFAULT_INTERVAL,
+                        help="监视模式下检查目录的间隔（秒）")
+    parser.add_argument("--settle", type=float, default=watch.DEFAULT_SETTLE,
+                        help="监视模式下文件大小和修改时间保持不变多少秒后才处理（等待复制完成）")
+    parser.add_argument("--trace-memory", action="store_true", help="统计各阶段峰值内存（较慢）")
+    parser.add_argument("--verbose", action="store_true", help="每个文件完成时向标准错误输出一行 JSON 统计")
+    return parser
+
+
+def watch_folder(args, config, mode, cache):
+    """监视模式：每处理完一批文件输出一行 JSON 报告，Ctrl+C 退出"""
+    if len(args.inputs) != 1 or not os.path.isdir(args.inputs[0]):
+        raise ValueError("监视模式需要指定一个目录")
+    if args.cross_file or config.get("cross_file"):
+        raise ValueError("监视模式不支持跨文件合并凭证")
+
+    def on_report(report):
+        line = json.dumps(report, ensure_ascii=False)
+        if args.report:
+            with open(args.report, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        else:
+            print(line, flush=True)
+
+    try:
+        watch.watch(args.inputs[0], config, mode, save_dir=args.save_dir,
+                    streaming=args.streaming or bool(config.get("streaming")),
+                    workers=args.workers or config.get("workers"), cache=cache,
+                    interval=args.interval, settle=args.settle, on_report=on_report,
+                    trace_memory=args.trace_memory)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ParseCache(args.cache_dir, args.cache_size << 20)
+    try:
+        config = load_config(args.config)
+        mode = args.mode or config.get("mode") or "separate"
+        if args.watch:
+            return watch_folder(args, config, mode, cache)
+        report = processor.run(args.inputs, config, mode, save_dir=args.save_dir,
+                               streaming=args.streaming or bool(config.get("streaming")),
+                               workers=args.workers or config.get("workers"), force=args.force,
+                               trace_memory=args.trace_memory, cache=cache,
+                               cross_file=args.cross_file or bool(config.get("cross_file")))
+    except (OSError, ValueError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0 if report["summary"]["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
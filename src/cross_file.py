@@ -0,0 +1,148 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""跨文件按凭证汇总：同一凭证分散在多个文件（或工作表）中时，合并计算对方科目
+
+按凭证字号的哈希分区落盘后逐个分区汇总，整批数据不需要同时放进内存：
+
+    1. 登记：逐个工作表把每行的凭证编码和方向存为 rows/<文件>-<工作表>.npz，
+       去重后的 (凭证, 方向, 科目) 按凭证哈希追加到 part-<分区>/ 下
+    2. 汇总：逐个分区拼出每个凭证的借方、贷方科目串，按文件拆分写入 results/<文件>/
+    3. 取结果：每个文件只读取自己的凭证科目串，广播回各行
+
+登记和取结果可以在多个进程中并行，汇总在一个进程内依次处理各分区。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from engine import join_subjects
+
+
+DEFAULT_PARTITIONS = 16
+
+
+class VoucherGroups:
+    """一批文件的跨文件凭证汇总，中间结果保存在 spill_dir 下
+
+    files 为这批文件的列表（决定科目的先后顺序），partitions 为哈希分区数；
+    分区越多，汇总时单个分区占用的内存越少。对象本身只保存路径，可以传给子进程。
+    """
+
+    def __init__(self, spill_dir, files, partitions=DEFAULT_PARTITIONS):
+        self.spill_dir = spill_dir
+        self.file_ids = {file_path: i for i, file_path in enumerate(files)}
+        self.partitions = partitions
+
+    def _path(self, *parts):
+        return os.path.join(self.spill_dir, *parts)
+
+    def add(self, file_path, sheet_idx, sheet_name, vouchers, voucher_names, sides, subject_codes,
+            subject_names):
+        """登记一个工作表，参数为 engine.ledger_sides 的返回值"""
+        file_id = self.file_ids[file_path]
+        key = f"{file_id:06d}-{sheet_idx:04d}"
+        os.makedirs(self._path("rows"), exist_ok=True)
+        np.savez(self._path("rows", key + ".npz"), vouchers=vouchers, names=voucher_names,
+                 sides=sides, sheet=np.array(sheet_name, dtype=object))
+
+        # 只有借贷行参与汇总；同一工作表内重复的 (凭证, 方向, 科目) 只保留第一次出现
+        mask = sides != 0
+        entries = pd.DataFrame({
+            "voucher": voucher_names[vouchers[mask]],
+            "side": sides[mask],
+            "subject": np.append(subject_names, None)[subject_codes[mask]],
+        }).drop_duplicates()
+        entries["file"] = np.int32(file_id)
+        partition = pd.util.hash_array(entries["voucher"].to_numpy(dtype=object)) % self.partitions
+        for k, chunk in entries.groupby(partition, sort=False):
+            os.makedirs(self._path(f"part-{k}"), exist_ok=True)
+            chunk.to_pickle(self._path(f"part-{k}", key + ".pkl"))
+
+    def reduce(self):
+        """逐个分区汇总每个凭证的借方、贷方科目串，按文件写入结果分片"""
+        for k in range(self.partitions):
+            part_dir = self._path(f"part-{k}")
+            if not os.path.isdir(part_dir):
+                continue
+            # 文件名按 (文件, 工作表) 排序，拼接后即为整批数据中的先后顺序
+            entries = pd.concat([pd.read_pickle(os.path.join(part_dir, name))
+                                 for name in sorted(os.listdir(part_dir))], ignore_index=True)
+            codes, names = pd.factorize(entries["voucher"])
+            names = np.asarray(names, dtype=object)
+            if (codes < 0).any():
+                # 凭证字号为空的行归为同一个凭证
+                codes = np.where(codes < 0, len(names), codes)
+                names = np.append(names, None)
+            subject_codes, subject_names = pd.factorize(entries["subject"])
+            subject_names = np.asarray(subject_names, dtype=object)
+            sides = entries["side"].to_numpy()
+
+            strings = {}
+            debit = join_subjects(codes, subject_codes, subject_names, sides == 1, len(names), strings)
+            credit = join_subjects(codes, subject_codes, subject_names, sides == -1, len(names),
+                                   strings)
+
+            pairs = pd.DataFrame({"file": entries["file"], "voucher": codes}).drop_duplicates()
+            for file_id, chunk in pairs.groupby("file", sort=False):
+                voucher = chunk["voucher"].to_numpy()
+                os.makedirs(self._path("results", str(file_id)), exist_ok=True)
+                pd.DataFrame({"voucher": names[voucher], "debit": debit[voucher],
+                              "credit": credit[voucher]}).to_pickle(
+                    self._path("results", str(file_id), f"{k}.pkl"))
+
+    def sheets(self, file_path):
+        """文件登记过的工作表，[(工作表序号, 工作表名), ...]"""
+        prefix = f"{self.file_ids[file_path]:06d}-"
+        sheets = []
+        for name in sorted(os.listdir(self._path("rows"))):
+            if name.startswith(prefix):
+                with np.load(self._path("rows", name), allow_pickle=True) as data:
+                    sheets.append((int(name[len(prefix):-4]), data["sheet"].item()))
+        return sheets
+
+    def results(self, file_path, sheet_idx, voucher_results=None):
+        """取一个工作表各行的对方科目，返回与登记时行数相同的字符串列表
+
+        voucher_results 为 file_results 的返回值，同一文件的多个工作表可以共用。
+        """
+        if voucher_results is None:
+            voucher_results = self.file_results(file_path)
+        key = f"{self.file_ids[file_path]:06d}-{sheet_idx:04d}"
+        with np.load(self._path("rows", key + ".npz"), allow_pickle=True) as data:
+            vouchers, names, sides = data["vouchers"], data["names"], data["sides"]
+
+        # 只有非借非贷行的凭证不在汇总结果中，取到末尾的空字符串
+        idx = pd.Index(voucher_results["voucher"]).get_indexer(names)
+        debit = np.append(voucher_results["debit"].to_numpy(dtype=object), "")[idx]
+        credit = np.append(voucher_results["credit"].to_numpy(dtype=object), "")[idx]
+
+        result = np.full(len(vouchers), "", dtype=object)
+        is_debit = sides == 1
+        is_credit = sides == -1
+        result[is_debit] = credit[vouchers[is_debit]]
+        result[is_credit] = debit[vouchers[is_credit]]
+        return result.tolist()
+
+    def file_results(self, file_path):
+        """文件中各凭证的汇总结果（凭证、借方科目串、贷方科目串）"""
+        result_dir = self._path("results", str(self.file_ids[file_path]))
+        names = sorted(os.listdir(result_dir)) if os.path.isdir(result_dir) else []
+        if not names:
+            return pd.DataFrame({"voucher": [], "debit": [], "credit": []}, dtype=object)
+        return pd.concat([pd.read_pickle(os.path.join(result_dir, name)) for name in names],
+                         ignore_index=True)
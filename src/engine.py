@@ -0,0 +1,535 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""对方科目计算引擎（不依赖界面，两种模式共用）"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+SEPARATOR = "、"
+AMOUNT_KEYS = ("debit_col", "credit_col", "amount_col")
+
+# 对方科目的输出形式：科目规则（full 科目全称，first_level 一级科目）及是否附上金额
+SUBJECT_RULES = ("full", "first_level")
+FULL_OUTPUT = {"subjects": "full", "with_amount": False}
+FIRST_LEVEL_CODE_LENGTH = 4  # 一级科目编码的位数
+# 科目开头的编码：编码之后为空白、级别分隔符或结尾（"1年内到期的非流动负债" 不是编码）
+_SUBJECT_CODE_RE = re.compile(r"(\d+(?:\.\d+)*)(?=\s|[-_－＿]|$)")
+_SUBJECT_LEVEL_RE = re.compile(r"[-_－＿]")
+# 行数达到此值且传入进程池时，按凭证分区并行汇总（见 compute_outputs）
+PARALLEL_MIN_ROWS = 500_000
+
+
+def excel_column_to_num(col_str):
+    """将Excel列字母转换为数字索引（如'A'->1, 'AI'->35）"""
+    num = 0
+    for i, c in enumerate(reversed(col_str.upper())):
+        num += (ord(c) - 64) * (26 ** i)
+    return num
+
+
+def get_column_name(df, col_input):
+    """将用户输入（列字母/列序号/列名）解析为 DataFrame 列名，超出表头范围时原样返回"""
+    if col_input.isalpha():
+        col_idx = excel_column_to_num(col_input)
+    elif col_input.isdigit():
+        col_idx = int(col_input)
+    else:
+        return col_input
+    if not 1 <= col_idx <= len(df.columns):
+        return col_input
+    return df.columns[col_idx - 1]
+
+
+def column_position(header, col_input):
+    """将用户输入解析为表头中的列位置（从 0 开始），规则与 get_column_name 一致，
+    列不存在时抛出 ValueError"""
+    if col_input.isalpha():
+        position = excel_column_to_num(col_input) - 1
+    elif col_input.isdigit():
+        position = int(col_input) - 1
+    else:
+        position = -1
+    if 0 <= position < len(header):
+        return position
+    # 超出表头范围的输入按列名查找（中文列名也满足 isalpha）
+    if col_input in header:
+        return list(header).index(col_input)
+    raise ValueError(f"以下列不存在于文件中：{col_input}")
+
+
+def mode_column_keys(mode):
+    """本模式需要的列参数"""
+    if mode == "separate":
+        return ["voucher_col", "subject_col", "debit_col", "credit_col"]
+    return ["voucher_col", "subject_col", "amount_col", "direction_col"]
+
+
+def resolve_columns(df, params, mode):
+    """解析本模式需要的列名，列不存在时抛出 ValueError"""
+    keys = mode_column_keys(mode)
+    columns = {key: get_column_name(df, params[key]) for key in keys}
+    missing_columns = [str(col) for col in columns.values() if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"以下列不存在于文件中：{', '.join(missing_columns)}")
+    return columns
+
+
+def resolve_positions(header, params, mode):
+    """解析本模式需要的列在表头中的位置（从 0 开始），列不存在时抛出 ValueError"""
+    positions = {}
+    missing_columns = []
+    for key in mode_column_keys(mode):
+        try:
+            positions[key] = column_position(header, params[key])
+        except ValueError:
+            missing_columns.append(params[key])
+    if missing_columns:
+        raise ValueError(f"以下列不存在于文件中：{', '.join(missing_columns)}")
+    return positions
+
+
+def normalize_voucher(series):
+    """凭证字号转为字符串，去掉 .0 后缀并去除首尾空白"""
+    voucher = series.map(str)
+    voucher = voucher.where(~voucher.str.endswith(".0"), voucher.str[:-2])
+    return voucher.str.strip()
+
+
+def encode_column(values):
+    """字典编码一列取值，返回 (int32 编码, 取值表)，空单元格编码为 -1"""
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    return codes.astype(np.int32), np.asarray(uniques, dtype=object)
+
+
+def _codes(series):
+    """列的 (编码, 取值表)；分类类型直接取已有编码"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), np.asarray(series.cat.categories, dtype=object)
+    return encode_column(series.to_numpy(dtype=object))
+
+
+def compact_ledger(columns, mode):
+    """由各列的字典编码（{列参数: (编码, 取值表)}）构造紧凑的账套 DataFrame
+
+    凭证、科目、借贷标识为分类类型，金额列为浮点数（空单元格为 0），列名即列参数。
+    金额无法转为数字时抛出 ValueError。
+    """
+    data = {}
+    for key in mode_column_keys(mode):
+        codes, values = columns[key]
+        if key in AMOUNT_KEYS:
+            # 只转换去重后的取值，再按编码展开；编码 -1 取到末尾的 0
+            amounts = pd.Series(values, dtype=object).astype(float).to_numpy()
+            data[key] = np.append(amounts, 0.0)[codes]
+        else:
+            data[key] = pd.Categorical.from_codes(codes, pd.Index(values, dtype=object))
+    return pd.DataFrame(data)
+
+
+def voucher_codes(series):
+    """按规范化后的凭证字号（见 normalize_voucher）编码，返回 (每行凭证编码, 凭证字号数组)
+
+    只对去重后的取值做字符串处理；空单元格归为同一个凭证，其字号为 None。
+    """
+    codes, values = _codes(series)
+    labels, names = pd.factorize(normalize_voucher(pd.Series(values, dtype=object)))
+    names = np.asarray(names, dtype=object)
+    if (codes < 0).any():
+        labels = np.append(labels, len(names))
+        names = np.append(names, None)
+    return labels[codes], names
+
+
+def subject_codes_names(series):
+    """科目列的 (每行科目编码, 科目名数组)，科目名为取值的字符串形式，空单元格编码为 -1"""
+    codes, values = _codes(series)
+    return codes, np.array([str(value) for value in values], dtype=object)
+
+
+def first_level_subject(subject):
+    """一级科目：以编码开头的科目（纯编码或 "1002.01 银行存款" 这样的编码加名称）
+    取编码的前 FIRST_LEVEL_CODE_LENGTH 位（带点的编码取第一段），
+    其余取第一个 "-" 或 "_" 之前的部分"""
+    text = str(subject).strip()
+    code = _SUBJECT_CODE_RE.match(text)
+    if code:
+        return code.group(1).split(".")[0][:FIRST_LEVEL_CODE_LENGTH]
+    return _SUBJECT_LEVEL_RE.split(text, 1)[0].strip()
+
+
+def subject_view(subject_codes, subject_names, rule):
+    """按科目规则（见 SUBJECT_RULES）换算 (每行科目编码, 科目名数组)，只对去重后的科目名处理"""
+    if rule == "full":
+        return subject_codes, subject_names
+    codes, names = pd.factorize(
+        np.array([first_level_subject(name) for name in subject_names], dtype=object))
+    # 编码 -1（空单元格）取到末尾的 -1
+    return np.append(codes, -1)[subject_codes], np.asarray(names, dtype=object)
+
+
+def subject_amount(subject, amount):
+    """附金额的对方科目，如“银行存款 1,000.00”"""
+    return f"{subject} {amount:,.2f}"
+
+
+def direction_masks(df, columns, params, mode):
+    """返回 (借方行掩码, 贷方行掩码)，同一行只会落在一侧"""
+    if mode == "separate":
+        debit = df[columns["debit_col"]].fillna(0).astype(float)
+        credit = df[columns["credit_col"]].fillna(0).astype(float)
+        is_debit = debit > 0
+        is_credit = ~is_debit & (credit > 0)
+    else:
+        # 金额列不参与计算，但保持原有的数值校验
+        df[columns["amount_col"]].fillna(0).astype(float)
+        direction = df[columns["direction_col"]]
+        is_debit = direction == params["debit_flag"]
+        is_credit = ~is_debit & (direction == params["credit_flag"])
+    return is_debit.to_numpy(), is_credit.to_numpy()
+
+
+def row_amounts(df, columns, params, mode, is_debit):
+    """各行计入对方科目的金额：借贷分开时取本方向的金额列，
+    借贷在一起时取金额列，贷方处理方式为"取相反数"时贷方行取相反数"""
+    if mode == "separate":
+        debit = df[columns["debit_col"]].fillna(0).astype(float).to_numpy()
+        credit = df[columns["credit_col"]].fillna(0).astype(float).to_numpy()
+        return np.where(is_debit, debit, credit)
+    amounts = df[columns["amount_col"]].fillna(0).astype(float).to_numpy()
+    if params.get("credit_action") == "取相反数":
+        return np.where(is_debit, amounts, -amounts)
+    return amounts
+
+
+def _join_sorted(codes, items, n_vouchers, strings):
+    """codes 为按凭证编码排好序的各条目凭证，把每个凭证的条目拼成一串"""
+    joined = np.full(n_vouchers, "", dtype=object)
+    if not len(codes):
+        return joined
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)]
+    joined[codes[starts]] = [strings.setdefault(text, text) for text in
+                             (SEPARATOR.join(items[a:b]) for a, b in zip(starts, ends))]
+    return joined
+
+
+def join_subjects(vouchers, subject_codes, subject_names, mask, n_vouchers, strings):
+    """按凭证汇总某一方向的去重科目，返回以凭证编码为下标的科目串数组
+
+    科目按在凭证中首次出现的顺序排列；相同的科目串经 strings 字典复用同一个对象。
+    """
+    side = pd.DataFrame({"voucher": vouchers[mask], "subject": subject_codes[mask]})
+    side = side[side["subject"] >= 0].drop_duplicates()
+    # 按凭证编码稳定排序后切片拼接，避免逐组构造 Series
+    side = side.sort_values("voucher", kind="stable")
+    subjects = subject_names[side["subject"].to_numpy()].tolist()
+    return _join_sorted(side["voucher"].to_numpy(), subjects, n_vouchers, strings)
+
+
+def join_subject_amounts(vouchers, subject_codes, subject_names, amounts, mask, n_vouchers,
+                         strings):
+    """同 join_subjects，每个科目附上它在凭证中本方向的合计金额（见 subject_amount）"""
+    side = pd.DataFrame({"voucher": vouchers[mask], "subject": subject_codes[mask],
+                         "amount": amounts[mask]})
+    side = side[side["subject"] >= 0]
+    totals = side.groupby(["voucher", "subject"], sort=False)["amount"].sum().reset_index()
+    totals = totals.sort_values("voucher", kind="stable")
+    items = [subject_amount(name, amount) for name, amount in
+             zip(subject_names[totals["subject"].to_numpy()], totals["amount"].to_numpy())]
+    return _join_sorted(totals["voucher"].to_numpy(), items, n_vouchers, strings)
+
+
+def compute_counterparty(df, params, mode, stats=None, columns=None, pool=None):
+    """计算每一行的对方科目，返回与 df 行数相同的字符串列表
+
+    借方行取同一凭证下贷方科目的去重合集，贷方行取借方科目的去重合集，
+    两者都不是的行为空字符串。传入 stats 字典时写入行数和凭证数。
+    columns 为已解析好的 {列参数: 列名}，省略时按 params 从 df 中解析。
+    pool 见 compute_outputs。
+    """
+    return compute_outputs(df, params, mode, [FULL_OUTPUT], stats, columns, pool)[0]
+
+
+def compute_outputs(df, params, mode, outputs, stats=None, columns=None, pool=None):
+    """一次分组同时计算多种形式的对方科目，返回与 outputs 一一对应的结果列表
+
+    outputs 为 [{"subjects": 科目规则, "with_amount": 是否附金额}, ...]，
+    凭证、方向和科目只解析一次，各输出只是汇总方式不同。其余参数同 compute_counterparty。
+    pool 为带 workers 属性和 submit 方法的进程池（如 processor.ComputePool），
+    行数达到 PARALLEL_MIN_ROWS 时按凭证分区交给它并行汇总（见 join_partitioned），结果不变。
+    """
+    columns = columns or resolve_columns(df, params, mode)
+    is_debit, is_credit = direction_masks(df, columns, params, mode)
+
+    vouchers, voucher_names = voucher_codes(df[columns["voucher_col"]])
+    n_vouchers = len(voucher_names)
+    subject_codes, subject_names = subject_codes_names(df[columns["subject_col"]])
+    amounts = None
+    if any(output["with_amount"] for output in outputs):
+        amounts = row_amounts(df, columns, params, mode, is_debit)
+    views = {}
+    for output in outputs:
+        rule = output["subjects"]
+        if rule not in views:
+            views[rule] = subject_view(subject_codes, subject_names, rule)
+
+    if pool is not None and pool.workers > 1 and len(df) >= PARALLEL_MIN_ROWS:
+        joined = join_partitioned(pool, vouchers, is_debit, is_credit, views, amounts, outputs,
+                                  n_vouchers)
+    else:
+        joined = join_sides(vouchers, is_debit, is_credit, views, amounts, outputs, n_vouchers)
+
+    results = []
+    for debit_subjects, credit_subjects in joined:
+        # 广播回每一行：借方行写贷方科目，贷方行写借方科目
+        result = np.full(len(df), "", dtype=object)
+        result[is_debit] = credit_subjects[vouchers[is_debit]]
+        result[is_credit] = debit_subjects[vouchers[is_credit]]
+        results.append(result.tolist())
+    if stats is not None:
+        stats.update(rows=len(df), vouchers=n_vouchers)
+    return results
+
+
+def join_sides(vouchers, is_debit, is_credit, views, amounts, outputs, n_vouchers):
+    """按 outputs 逐个汇总，返回 [(借方科目串数组, 贷方科目串数组), ...]，数组以凭证编码为下标
+
+    views 为 {科目规则: (每行科目编码, 科目名数组)}，amounts 为各行金额（不附金额时可为 None）。
+    """
+    # 大量凭证的对方科目相同，结果中相同的字符串共用一个对象
+    strings = {}
+    joined = []
+    for output in outputs:
+        codes, names = views[output["subjects"]]
+        if output["with_amount"]:
+            joined.append(tuple(
+                join_subject_amounts(vouchers, codes, names, amounts, mask, n_vouchers, strings)
+                for mask in (is_debit, is_credit)))
+        else:
+            joined.append(tuple(
+                join_subjects(vouchers, codes, names, mask, n_vouchers, strings)
+                for mask in (is_debit, is_credit)))
+    return joined
+
+
+def join_partitioned(pool, vouchers, is_debit, is_credit, views, amounts, outputs, n_vouchers):
+    """同 join_sides，按凭证编码除以 pool.workers 的余数分区，各分区在进程池中并行汇总
+
+    同一凭证只落在一个分区；分区内凭证编码为原编码整除分区数，行保持原有顺序，
+    因而科目的先后与不分区时相同。只传送分区内有方向的行的编码数组，合并时按凭证编码放回。
+    """
+    k = pool.workers
+    part = vouchers % k
+    used = is_debit | is_credit
+    futures = []
+    for p in range(k):
+        rows = np.flatnonzero(used & (part == p))
+        futures.append(pool.submit(
+            _join_partition, vouchers[rows] // k, is_debit[rows], is_credit[rows],
+            {rule: (codes[rows], names) for rule, (codes, names) in views.items()},
+            None if amounts is None else amounts[rows], outputs, len(range(p, n_vouchers, k))))
+
+    joined = [(np.empty(n_vouchers, dtype=object), np.empty(n_vouchers, dtype=object))
+              for _ in outputs]
+    for p, future in enumerate(futures):
+        for merged, pieces in zip(joined, future.result()):
+            for whole, (codes, text, lengths) in zip(merged, pieces):
+                ends = np.cumsum(lengths).tolist()
+                uniques = np.empty(len(ends), dtype=object)
+                uniques[:] = [text[a:b] for a, b in zip([0] + ends[:-1], ends)]
+                whole[p::k] = uniques[codes]
+    return joined
+
+
+def _join_partition(*args):
+    """子进程中汇总一个分区（参数同 join_sides），各科目串数组编码后传回
+
+    传回 (各凭证的编码, 去重后的科目串拼成的字符串, 各串长度)，
+    比逐个传送几十万个字符串对象快得多，合并时相同的科目串仍共用一个对象。
+    """
+    packed = []
+    for pair in join_sides(*args):
+        sides = []
+        for texts in pair:
+            codes, uniques = pd.factorize(texts)
+            sides.append((codes.astype(np.int32), "".join(uniques),
+                          np.fromiter(map(len, uniques), dtype=np.int64, count=len(uniques))))
+        packed.append(sides)
+    return packed
+
+
+def ledger_sides(df, params, mode, columns=None):
+    """各行的凭证、借贷方向和科目，供跨文件汇总（见 cross_file）使用
+
+    返回 (每行凭证编码, 凭证字号数组, 每行方向, 每行科目编码, 科目名数组)，
+    方向 1 为借方、-1 为贷方、0 为都不是，规则与 compute_counterparty 一致。
+    """
+    columns = columns or resolve_columns(df, params, mode)
+    is_debit, is_credit = direction_masks(df, columns, params, mode)
+    sides = np.zeros(len(df), dtype=np.int8)
+    sides[is_debit] = 1
+    sides[is_credit] = -1
+    vouchers, voucher_names = voucher_codes(df[columns["voucher_col"]])
+    subject_codes, subject_names = subject_codes_names(df[columns["subject_col"]])
+    return vouchers, voucher_names, sides, subject_codes, subject_names
+
+
+def compute_ledger(ledger, params, mode, stats=None, pool=None):
+    """计算 compact_ledger 得到的紧凑账套的对方科目"""
+    columns = {key: key for key in mode_column_keys(mode)}
+    return compute_counterparty(ledger, params, mode, stats, columns, pool)
+
+
+class UnsortedVouchersError(ValueError):
+    """凭证字号不连续（同一凭证分散在多处），无法按凭证流式处理"""
+
+
+def _normalize_voucher_value(value):
+    voucher = str(value)
+    if voucher.endswith(".0"):
+        voucher = voucher[:-2]
+    return voucher.strip()
+
+
+def _row_side(row, positions, params, mode):
+    """单行的 (借贷方向, 金额)：方向 1 借方，-1 贷方，0 都不是，规则与 direction_masks 一致；
+    金额规则与 row_amounts 一致"""
+    if mode == "separate":
+        debit = row[positions["debit_col"]]
+        credit = row[positions["credit_col"]]
+        debit = float(0 if debit is None else debit)
+        credit = float(0 if credit is None else credit)
+        if debit > 0:
+            return 1, debit
+        if credit > 0:
+            return -1, credit
+        return 0, 0.0
+
+    amount = row[positions["amount_col"]]
+    amount = float(0 if amount is None else amount)
+    direction = row[positions["direction_col"]]
+    if direction == params["debit_flag"]:
+        return 1, amount
+    if direction == params["credit_flag"]:
+        return -1, -amount if params.get("credit_action") == "取相反数" else amount
+    return 0, 0.0
+
+
+def _side_subjects(sides, subjects, amounts, output, first_level, strings):
+    """一个凭证按某种输出形式汇总的 (借方科目串, 贷方科目串)"""
+    to_first_level = output["subjects"] == "first_level"
+    with_amount = output["with_amount"]
+    debit_totals = {}  # 科目 -> 合计金额，按首次出现的顺序
+    credit_totals = {}
+    for side, subject, amount in zip(sides, subjects, amounts):
+        if subject is None or side == 0:
+            continue
+        name = str(subject)
+        if to_first_level:
+            if name not in first_level:
+                first_level[name] = first_level_subject(name)
+            name = first_level[name]
+        totals = debit_totals if side == 1 else credit_totals
+        if with_amount:
+            totals[name] = totals.get(name, 0.0) + amount
+        else:
+            totals.setdefault(name, None)
+    joined = []
+    for totals in (debit_totals, credit_totals):
+        if with_amount:
+            text = SEPARATOR.join(subject_amount(name, total) for name, total in totals.items())
+        else:
+            text = SEPARATOR.join(totals)
+        joined.append(strings.setdefault(text, text))
+    return joined
+
+
+def _flush_voucher(sides, subjects, amounts, outputs, first_level, strings, single):
+    """输出一个凭证内各行的对方科目，single 为 False 时每行为各输出的元组；
+    相同的科目串经 strings 字典复用同一个对象"""
+    if single:
+        debit_str, credit_str = _side_subjects(sides, subjects, amounts, outputs[0], first_level,
+                                               strings)
+        for side in sides:
+            yield credit_str if side == 1 else debit_str if side == -1 else ""
+        return
+    joined = [_side_subjects(sides, subjects, amounts, output, first_level, strings)
+              for output in outputs]
+    credits = tuple(credit for _, credit in joined)
+    debits = tuple(debit for debit, _ in joined)
+    empty = ("",) * len(joined)
+    for side in sides:
+        yield credits if side == 1 else debits if side == -1 else empty
+
+
+def stream_counterparty(rows, positions, params, mode, stats=None, outputs=None):
+    """按行流式计算对方科目，逐行产出结果
+
+    rows 为数据行（不含表头）的可迭代对象，positions 为 {列参数: 列位置}。
+    要求同一凭证的借贷行连续出现，每个凭证结束即输出，内存只与最大凭证的行数有关；
+    发现凭证再次出现时抛出 UnsortedVouchersError。非借非贷的行不参与判断。
+    传入 stats 字典时在全部产出后写入行数和凭证数。
+    传入 outputs（见 compute_outputs）时每行产出与之对应的结果元组。
+    """
+    finished = set()
+    strings = {}
+    first_level = {}
+    single = not outputs
+    outputs = outputs or [FULL_OUTPUT]
+    empty = "" if single else ("",) * len(outputs)
+    n_rows = 0
+    current = None
+    sides = []
+    subjects = []
+    amounts = []
+
+    for row in rows:
+        n_rows += 1
+        side, amount = _row_side(row, positions, params, mode)
+        if side == 0:
+            # 非借非贷的行（如空行）结果必为空，不影响所在凭证，也不打断当前凭证
+            if sides:
+                sides.append(0)
+                subjects.append(None)
+                amounts.append(0.0)
+            else:
+                yield empty
+            continue
+
+        voucher = _normalize_voucher_value(row[positions["voucher_col"]])
+        if voucher != current:
+            if sides:
+                yield from _flush_voucher(sides, subjects, amounts, outputs, first_level, strings,
+                                          single)
+                finished.add(current)
+            if voucher in finished:
+                raise UnsortedVouchersError(f"凭证 {voucher} 不连续，无法流式处理")
+            current = voucher
+            sides = []
+            subjects = []
+            amounts = []
+        sides.append(side)
+        subjects.append(row[positions["subject_col"]])
+        amounts.append(amount)
+
+    if sides:
+        yield from _flush_voucher(sides, subjects, amounts, outputs, first_level, strings, single)
+        finished.add(current)
+    if stats is not None:
+        stats.update(rows=n_rows, vouchers=len(finished))
@@ -0,0 +1,163 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""处理阶段的计时、内存统计与进度
+
+每个文件用一个 Stages 记录各阶段（读取、计算、写回……）的耗时和峰值内存，
+结果随运行报告返回，并以 JSON 写入 counterparty 日志。传入 progress 回调时，
+阶段切换和已处理行数会按时间间隔节流后报告，供界面显示文件内的进度。
+"""
+
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+logger = logging.getLogger("counterparty")
+
+STAGE_NAMES = {
+    "read": "读取",
+    "compute": "计算",
+    "write": "写回",
+    "stream": "流式读算写",
+    "cache": "写缓存",
+    "group": "跨文件汇总",
+}
+
+
+PROGRESS_INTERVAL = 0.2  # 秒
+PROGRESS_STEP = 4096  # 每处理这么多行检查一次是否需要报告
+
+
+class Stages:
+    """单个文件各阶段的耗时（秒）、峰值内存（MB，需开启 trace_memory）和行数/凭证数
+
+    峰值内存用 tracemalloc 统计 Python 和 numpy 分配的内存，开销较大，默认关闭。
+    progress(阶段, 本阶段已处理行数, 凭证数) 在进入阶段时和处理过程中（最多每
+    PROGRESS_INTERVAL 秒一次）调用，凭证数未知时为 None。
+    """
+
+    def __init__(self, trace_memory=False, progress=None):
+        self.trace_memory = trace_memory
+        self.progress = progress
+        self.stages = {}
+        self.counts = {}
+        self._started_tracing = False
+        self._current = None
+        self._rows = 0
+        self._last_report = 0.0
+
+    def __enter__(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        """统计 with 块的耗时；同名阶段多次进入时累加耗时、取最大峰值"""
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing and hasattr(tracemalloc, "reset_peak"):
+            # Python 3.8 没有 reset_peak，峰值为开始统计以来的最大值
+            tracemalloc.reset_peak()
+        self._current = name
+        self._rows = 0
+        self.report(force=True)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {"seconds": 0.0})
+            entry["seconds"] = round(entry["seconds"] + time.perf_counter() - start, 4)
+            if tracing:
+                peak = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 1)
+                entry["peak_mb"] = max(entry.get("peak_mb", 0.0), peak)
+
+    def count(self, **counts):
+        """记录行数、凭证数等计数，多次记录（如多个工作表）时累加"""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+        self.report(force=True)
+
+    def report(self, force=False):
+        """报告当前进度，未到间隔时跳过"""
+        if not self.progress:
+            return
+        now = time.perf_counter()
+        if force or now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            self.progress(self._current, self._rows, self.counts.get("vouchers"))
+
+    def track(self, iterable):
+        """逐项透传 iterable，同时把已处理行数计入当前阶段；没有 progress 时原样返回"""
+        if not self.progress:
+            return iterable
+        return self._track(iterable)
+
+    def _track(self, iterable):
+        count = 0
+        for item in iterable:
+            yield item
+            count += 1
+            if count == PROGRESS_STEP:
+                self._rows += count
+                count = 0
+                self.report()
+        self._rows += count
+
+    def as_dict(self):
+        return {"stages": self.stages, **self.counts}
+
+
+def log_record(record):
+    """以一行 JSON 记录单个文件的处理结果和各阶段统计"""
+    logger.info(json.dumps(record, ensure_ascii=False))
+
+
+def summarize_stages(records):
+    """汇总一批文件的各阶段耗时、最大峰值内存和总行数/凭证数"""
+    stages = {}
+    totals = {"rows": 0, "vouchers": 0}
+    for record in records:
+        for name, entry in (record.get("stages") or {}).items():
+            total = stages.setdefault(name, {"seconds": 0.0})
+            total["seconds"] = round(total["seconds"] + entry["seconds"], 4)
+            if "peak_mb" in entry:
+                total["peak_mb"] = max(total.get("peak_mb", 0.0), entry["peak_mb"])
+        for key in totals:
+            totals[key] += record.get(key) or 0
+    return {"stages": stages, **totals}
+
+
+def format_stages(stage_summary):
+    """阶段汇总转为一行中文说明，用于界面提示"""
+    parts = []
+    for name, entry in stage_summary["stages"].items():
+        text = f"{STAGE_NAMES.get(name, name)} {entry['seconds']:.2f} 秒"
+        if "peak_mb" in entry:
+            text += f"（峰值 {entry['peak_mb']:.0f} MB）"
+        parts.append(text)
+    if not parts:
+        return ""
+    return (f"共 {stage_summary['rows']} 行、{stage_summary['vouchers']} 个凭证；"
+            + "，".join(parts))
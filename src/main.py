@@ -16,11 +16,15 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Font, Alignment
-import win32com.client as win32
+import logging
+import queue
+import sys
 import threading
+import multiprocessing
+
+# pandas、openpyxl 等较重的模块（processor、parse_cache）在开始处理时才由处理线程载入，
+# 窗口不必等它们加载完才显示
+from instrument import STAGE_NAMES, format_stages
 
 
 class AdvancedAccountingProcessor:
@@ -31,6 +35,8 @@ class AdvancedAccountingProcessor:
         # 界面组件初始化
         self.create_widgets()
         self.processing = False
+        # 处理线程只往队列里放事件，界面更新都在主线程的 poll_events 中完成（Tk 不是线程安全的）
+        self.events = queue.Queue()
 
     def create_widgets(self):
         # 输入框架
@@ -53,7 +59,8 @@ class AdvancedAccountingProcessor:
             ("借方金额列", "debit_col"),
             ("贷方金额列", "credit_col"),
             ("工作表名称", "sheet_name"),
-            ("目标列位置", "target_col")
+            ("目标列位置", "target_col"),
+            ("附加输出", "extra_outputs")
         ]
         self.entries_separate = {}
         for text, var_name in fields_separate:
@@ -75,7 +82,8 @@ class AdvancedAccountingProcessor:
             ("贷方标识", "credit_flag"),
             ("贷方处理方式", "credit_action"),
             ("工作表名称", "sheet_name"),
-            ("目标列位置", "target_col")
+            ("目标列位置", "target_col"),
+            ("附加输出", "extra_outputs")
         ]
         self.entries_together = {}
         for text, var_name in fields_together:
@@ -100,6 +108,17 @@ class AdvancedAccountingProcessor:
         self.file_mode_var = tk.StringVar(value="single")
         ttk.Radiobutton(file_mode_frame, text="单文件处理", variable=self.file_mode_var, value="single").pack(side='left')
         ttk.Radiobutton(file_mode_frame, text="批量处理", variable=self.file_mode_var, value="batch").pack(side='left')
+        self.streaming_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_mode_frame, text="流式处理（大文件）", variable=self.streaming_var).pack(side='left', padx=5)
+        self.force_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_mode_frame, text="强制重新处理", variable=self.force_var).pack(side='left', padx=5)
+        self.cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_mode_frame, text="缓存解析结果", variable=self.cache_var).pack(side='left', padx=5)
+        self.cross_file_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(file_mode_frame, text="跨文件合并凭证", variable=self.cross_file_var).pack(side='left', padx=5)
+        ttk.Label(file_mode_frame, text="并行进程数").pack(side='left', padx=(5, 2))
+        self.workers_var = tk.StringVar(value=str(os.cpu_count() or 1))
+        ttk.Spinbox(file_mode_frame, from_=1, to=64, width=4, textvariable=self.workers_var).pack(side='left')
 
         # 文件选择
         self.file_path = tk.StringVar()
@@ -118,7 +137,9 @@ class AdvancedAccountingProcessor:
 
         # 进度条
         self.progress = ttk.Progressbar(self.root, orient="horizontal", length=300, mode="determinate")
-        self.progress.pack(pady=10)
+        self.progress.pack(pady=(10, 0))
+        self.status_var = tk.StringVar()
+        ttk.Label(self.root, textvariable=self.status_var).pack(pady=(2, 10))
 
         # 控制按钮
         btn_frame = ttk.Frame(self.root)
@@ -168,397 +189,154 @@ class AdvancedAccountingProcessor:
             messagebox.showerror("错误", "必填字段不能为空")
             return
 
+        try:
+            job = self.collect_job()
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+
         self.processing = True
-        thread = threading.Thread(target=self.process_files)
+        self.root.config(cursor="wait")
+        self.progress["value"] = 0
+        self.status_var.set("")
+        thread = threading.Thread(target=self.process_files, args=job)
         thread.start()
+        self.root.after(100, self.poll_events)
 
     def stop_processing(self):
         self.processing = False
 
-    def process_files(self):
-        try:
-            # 获取处理参数
-            if self.mode_var.get() == "separate":
-                params = {
-                    "voucher_col": self.entries_separate["voucher_col"].get().strip(),
-                    "subject_col": self.entries_separate["subject_col"].get().strip(),
-                    "debit_col": self.entries_separate["debit_col"].get().strip(),
-                    "credit_col": self.entries_separate["credit_col"].get().strip(),
-                    "sheet_name": self.entries_separate["sheet_name"].get().strip() or None,
-                    "target_col": self.entries_separate["target_col"].get().strip().upper()
-                }
-            else:
-                params = {
-                    "voucher_col": self.entries_together["voucher_col"].get().strip(),
-                    "subject_col": self.entries_together["subject_col"].get().strip(),
-                    "amount_col": self.entries_together["amount_col"].get().strip(),
-                    "direction_col": self.entries_together["direction_col"].get().strip(),
-                    "debit_flag": self.entries_together["debit_flag"].get().strip(),
-                    "credit_flag": self.entries_together["credit_flag"].get().strip(),
-                    "credit_action": self.entries_together["credit_action"].get(),
-                    "sheet_name": self.entries_together["sheet_name"].get().strip() or None,
-                    "target_col": self.entries_together["target_col"].get().strip().upper()
-                }
-
-            # 获取文件列表
-            if self.file_mode_var.get() == "single":
-                files = [self.file_path.get()]
-            else:
-                dir_path = self.dir_path.get()
-                files = [os.path.join(dir_path, f) for f in os.listdir(dir_path)
-                         if f.lower().endswith(('.xls', '.xlsx', '.xlsm'))]
-
-            total_files = len(files)
-            for i, file_path in enumerate(files):
-                if not self.processing:
-                    break
-
-                try:
-                    if self.mode_var.get() == "separate":
-                        self.process_separate_mode(file_path, params, i + 1, total_files)
-                    else:
-                        self.process_together_mode(file_path, params, i + 1, total_files)
-                except Exception as e:
-                    messagebox.showerror("错误", f"处理文件失败：{file_path}\n{str(e)}")
-
-            messagebox.showinfo("完成", "处理完成！" if self.processing else "处理已中止")
-
-        finally:
-            self.processing = False
-            self.root.config(cursor="")
-            self.progress["value"] = 0
-
-    def remove_filters_with_win32com(self, file_path, sheet_name=None):
-        """使用 win32com 取消 Excel 文件中的筛选"""
-        try:
-            # 启动 Excel 应用程序
-            excel = win32.gencache.EnsureDispatch('Excel.Application')
-            excel.Visible = False  # 不显示 Excel 界面
-            excel.DisplayAlerts = False  # 禁用警告
-
-            # 打开工作簿
-            wb = excel.Workbooks.Open(file_path)
-            if sheet_name:
-                ws = wb.Sheets(sheet_name)
-            else:
-                ws = wb.Sheets(1)  # 默认选择第一个工作表
-
-            # 取消筛选
-            if ws.AutoFilterMode:
-                ws.AutoFilterMode = False
-
-            # 保存并关闭工作簿
-            wb.Save()
-            wb.Close()
-            excel.Quit()
-
-        except Exception as e:
-            print(f"使用 win32com 取消筛选失败：{str(e)}")
-            raise e
-    def process_separate_mode(self, file_path, params, current_num, total_files):
-        """处理借贷方分开模式"""
+    def collect_job(self):
+        """在主线程读取界面上的处理参数，并行进程数不是正整数时抛出 ValueError"""
+        if self.mode_var.get() == "separate":
+            params = {
+                "voucher_col": self.entries_separate["voucher_col"].get().strip(),
+                "subject_col": self.entries_separate["subject_col"].get().strip(),
+                "debit_col": self.entries_separate["debit_col"].get().strip(),
+                "credit_col": self.entries_separate["credit_col"].get().strip(),
+                "sheet_name": self.entries_separate["sheet_name"].get().strip() or None,
+                "target_col": self.entries_separate["target_col"].get().strip().upper(),
+                "extra_outputs": self.entries_separate["extra_outputs"].get().strip()
+            }
+        else:
+            params = {
+                "voucher_col": self.entries_together["voucher_col"].get().strip(),
+                "subject_col": self.entries_together["subject_col"].get().strip(),
+                "amount_col": self.entries_together["amount_col"].get().strip(),
+                "direction_col": self.entries_together["direction_col"].get().strip(),
+                "debit_flag": self.entries_together["debit_flag"].get().strip(),
+                "credit_flag": self.entries_together["credit_flag"].get().strip(),
+                "credit_action": self.entries_together["credit_action"].get(),
+                "sheet_name": self.entries_together["sheet_name"].get().strip() or None,
+                "target_col": self.entries_together["target_col"].get().strip().upper(),
+                "extra_outputs": self.entries_together["extra_outputs"].get().strip()
+            }
+
+        # 获取文件列表
+        if self.file_mode_var.get() == "single":
+            inputs = [self.file_path.get()]
+        else:
+            inputs = [self.dir_path.get()]
+
+        workers = self.workers_var.get().strip() or "1"
+        if not workers.isdecimal() or int(workers) < 1:
+            raise ValueError("并行进程数必须是正整数")
+
+        options = {
+            "save_dir": self.save_path.get() or None,
+            "streaming": self.streaming_var.get(),
+            "workers": int(workers),
+            "force": self.force_var.get(),
+            "cache": self.cache_var.get(),
+            "cross_file": self.cross_file_var.get(),
+        }
+        return inputs, params, self.mode_var.get(), options
+
+    def process_files(self, inputs, params, mode, options):
+        """处理线程：结果和进度都通过 self.events 交给主线程"""
         try:
-            # 使用 win32com 取消筛选
-            self.remove_filters_with_win32com(file_path, params["sheet_name"])
-
-            # 更新进度
-            self.root.config(cursor="wait")
-            progress = int((current_num / total_files) * 100)
-            self.progress["value"] = progress
-            self.root.update_idletasks()
-
-            # 读取文件
-            if file_path.endswith('.xls'):
-                df = pd.read_excel(file_path, sheet_name=params["sheet_name"], engine='xlrd')
-            else:
-                wb = load_workbook(file_path, read_only=False, keep_vba=True, keep_links=False)
-                sheet_name = params["sheet_name"] or wb.sheetnames[0]
-                ws = wb[sheet_name]
-
-                data = ws.values
-                columns = next(data)
-                df = pd.DataFrame(data, columns=columns)
-                wb.close()
-
-            def excel_column_to_num(col_str):
-                """将Excel列字母转换为数字索引（如'A'->1, 'AI'->35）"""
-                num = 0
-                for i, c in enumerate(reversed(col_str.upper())):
-                    num += (ord(c) - 64) * (26 ** i)
-                return num
-
-            # 获取列名
-            def get_column_name(df, col_input):
-                if col_input.isalpha():
-                    col_idx = excel_column_to_num(col_input)  # 使用新函数
-                    return df.columns[col_idx - 1]
-                elif col_input.isdigit():
-                    col_idx = int(col_input)
-                    return df.columns[col_idx - 1]
-                else:
-                    return col_input
-
-            voucher_col = get_column_name(df, params["voucher_col"])
-            debit_col = get_column_name(df, params["debit_col"])
-            credit_col = get_column_name(df, params["credit_col"])
-            subject_col = get_column_name(df, params["subject_col"])
-
-            # 检查列名是否存在
-            required_columns = [voucher_col, debit_col, credit_col, subject_col]
-            missing_columns = [col for col in required_columns if col not in df.columns]
-
-            if missing_columns:
-                messagebox.showerror("错误", f"以下列不存在于文件中：{', '.join(missing_columns)}")
-                return
-
-            # 填充借方列和贷方列中的空值为 0
-            df[debit_col] = df[debit_col].fillna(0).astype(float)
-            df[credit_col] = df[credit_col].fillna(0).astype(float)
-
-            # 确保凭证字号列为字符串格式，并去掉 .0 后缀
-            df[voucher_col] = df[voucher_col].astype(str).apply(lambda x: x[:-2] if x.endswith('.0') else x)
-
-            # 清理 voucher_col 列
-            df[voucher_col] = df[voucher_col].astype(str).str.strip()
-
-            # 初始化结果列表
-            result_list = [""] * len(df)  # 创建一个与原始数据行数相同的空列表
-
-            # 按凭证字号分组
-            grouped = df.groupby(voucher_col)
-
-            # 遍历分组，计算每个凭证字号对应的对方科目
-            for voucher, group in grouped:
-                debit_subjects = []
-                credit_subjects = []
-
-                # 收集借方科目和贷方科目
-                for index, row in group.iterrows():
-                    subject = row[subject_col]
-                    debit = row[debit_col]
-                    credit = row[credit_col]
-                    if debit > 0:
-                        debit_subjects.append(subject)
-                    elif credit > 0:
-                        credit_subjects.append(subject)
-
-                # 去重并转换为字符串
-                debit_subjects = list(set(debit_subjects))
-                credit_subjects = list(set(credit_subjects))
-                debit_subjects_str = "、".join(debit_subjects)
-                credit_subjects_str = "、".join(credit_subjects)
-
-                # 根据每行的借贷方向，决定写入的内容
-                for index, row in group.iterrows():
-                    if row[debit_col] > 0:
-                        result_list[df.index.get_loc(index)] = credit_subjects_str
-                    elif row[credit_col] > 0:
-                        result_list[df.index.get_loc(index)] = debit_subjects_str
-
-            # 保存文件
-            save_dir = self.save_path.get() or os.path.dirname(file_path)
-            base_name = os.path.basename(file_path)
-            name, ext = os.path.splitext(base_name)
-            save_path = os.path.join(save_dir, f"{name}_处理后{ext}")
-
-            if file_path.endswith('.xls'):
-                # 保存为 .xlsx
-                save_path = save_path.replace('.xls', '.xlsx')
-                self.save_normal_file(file_path, save_path, result_list, params)
-            else:
-                # 使用 openpyxl 保存，保留格式和 VBA
-                self.save_with_vba(file_path, save_path, result_list, params)
-
+            if "processor" not in sys.modules:
+                self.events.put(("status", "正在加载处理组件……"))
+            import processor
+            from parse_cache import ParseCache
+
+            options = dict(options, cache=ParseCache() if options["cache"] else None)
+            report = processor.run(
+                inputs, params, mode, should_stop=lambda: not self.processing,
+                on_result=lambda *args: self.events.put(("file", args)),
+                on_progress=lambda *args: self.events.put(("progress", args)), **options)
+            self.events.put(("done", report))
         except Exception as e:
-            print(f"处理文件失败：{file_path}")  # 调试信息
-            print(f"错误详情：{str(e)}")  # 调试信息
-            messagebox.showerror("错误", f"处理文件失败：{file_path}\n{str(e)}")
-
-    def process_together_mode(self, file_path, params, current_num, total_files):
-        """处理借贷方在一起模式"""
-        try:
-            # 使用 win32com 取消筛选
-            self.remove_filters_with_win32com(file_path, params["sheet_name"])
-
-            # 更新进度
-            self.root.config(cursor="wait")
-            progress = int((current_num / total_files) * 100)
-            self.progress["value"] = progress
-            self.root.update_idletasks()
-
-            # 读取文件
-            if file_path.endswith('.xls'):
-                df = pd.read_excel(file_path, sheet_name=params["sheet_name"], engine='xlrd')
+            self.events.put(("failed", e))
+
+    def poll_events(self):
+        """主线程定时取出处理线程的事件并更新界面"""
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                self.on_progress(*payload)
+            elif kind == "status":
+                self.status_var.set(payload)
+            elif kind == "file":
+                self.on_file_done(*payload)
             else:
-                wb = load_workbook(file_path, read_only=False, keep_vba=True, keep_links=False)
-                sheet_name = params["sheet_name"] or wb.sheetnames[0]
-                ws = wb[sheet_name]
-
-                data = ws.values
-                columns = next(data)
-                df = pd.DataFrame(data, columns=columns)
-                wb.close()
-
-            def excel_column_to_num(col_str):
-                """将Excel列字母转换为数字索引（如'A'->1, 'AI'->35）"""
-                num = 0
-                for i, c in enumerate(reversed(col_str.upper())):
-                    num += (ord(c) - 64) * (26 ** i)
-                return num
-
-            # 获取列名
-            def get_column_name(df, col_input):
-                if col_input.isalpha():
-                    col_idx = excel_column_to_num(col_input)  # 使用新函数
-                    return df.columns[col_idx - 1]
-                elif col_input.isdigit():
-                    col_idx = int(col_input)
-                    return df.columns[col_idx - 1]
-                else:
-                    return col_input
-
-            voucher_col = get_column_name(df, params["voucher_col"])
-            subject_col = get_column_name(df, params["subject_col"])
-            amount_col = get_column_name(df, params["amount_col"])
-            direction_col = get_column_name(df, params["direction_col"])
-
-            # 检查列名是否存在
-            required_columns = [voucher_col, subject_col, amount_col, direction_col]
-            missing_columns = [col for col in required_columns if col not in df.columns]
-
-            if missing_columns:
-                messagebox.showerror("错误", f"以下列不存在于文件中：{', '.join(missing_columns)}")
+                self.finish_processing(kind, payload)
                 return
+        self.root.after(100, self.poll_events)
 
-            # 填充金额列中的空值为 0
-            df[amount_col] = df[amount_col].fillna(0).astype(float)
-
-            # 确保凭证字号列为字符串格式，并去掉 .0 后缀
-            df[voucher_col] = df[voucher_col].astype(str).apply(lambda x: x[:-2] if x.endswith('.0') else x)
-
-            # 清理 voucher_col 列
-            df[voucher_col] = df[voucher_col].astype(str).str.strip()
-
-            # 初始化结果列表
-            result_list = [""] * len(df)  # 创建一个与原始数据行数相同的空列表
-
-            # 按凭证字号分组
-            grouped = df.groupby(voucher_col)
-
-            # 遍历分组，计算每个凭证字号对应的对方科目
-            for voucher, group in grouped:
-                debit_subjects = []
-                credit_subjects = []
-
-                # 收集借方科目和贷方科目
-                for index, row in group.iterrows():
-                    subject = row[subject_col]
-                    amount = row[amount_col]
-                    direction = row[direction_col]
-                    if direction == params["debit_flag"]:
-                        debit_subjects.append(subject)
-                    elif direction == params["credit_flag"]:
-                        credit_subjects.append(subject)
-
-                # 去重并转换为字符串
-                debit_subjects = list(set(debit_subjects))
-                credit_subjects = list(set(credit_subjects))
-                debit_subjects_str = "、".join(debit_subjects)
-                credit_subjects_str = "、".join(credit_subjects)
-
-                # 根据每行的借贷方向，决定写入的内容
-                for index, row in group.iterrows():
-                    direction = row[direction_col]
-                    if direction == params["debit_flag"]:
-                        result_list[df.index.get_loc(index)] = credit_subjects_str
-                    elif direction == params["credit_flag"]:
-                        result_list[df.index.get_loc(index)] = debit_subjects_str
-
-            # 保存文件
-            save_dir = self.save_path.get() or os.path.dirname(file_path)
-            base_name = os.path.basename(file_path)
-            name, ext = os.path.splitext(base_name)
-            save_path = os.path.join(save_dir, f"{name}_处理后{ext}")
-
-            if file_path.endswith('.xls'):
-                # 保存为 .xlsx
-                save_path = save_path.replace('.xls', '.xlsx')
-                self.save_normal_file(file_path, save_path, result_list, params)
-            else:
-                # 使用 openpyxl 保存，保留格式和 VBA
-                self.save_with_vba(file_path, save_path, result_list, params)
-
-        except Exception as e:
-            print(f"处理文件失败：{file_path}")  # 调试信息
-            print(f"错误详情：{str(e)}")  # 调试信息
-            messagebox.showerror("错误", f"处理文件失败：{file_path}\n{str(e)}")
-
-    def save_normal_file(self, src_path, dst_path, result_list, params):
-        # 使用 openpyxl 处理非宏文件
-        wb = load_workbook(src_path)
-        sheet_name = params["sheet_name"] or wb.sheetnames[0]
-        ws = wb[sheet_name]
-
-        def excel_column_to_num(col_str):
-            """将Excel列字母转换为数字索引（如'A'->1, 'AI'->35）"""
-            num = 0
-            for i, c in enumerate(reversed(col_str.upper())):
-                num += (ord(c) - 64) * (26 ** i)
-            return num
-
-        # 在目标列写入数据
-        target_col = params["target_col"]
-        if target_col.isalpha():
-            col_idx = excel_column_to_num(target_col)
+    def finish_processing(self, kind, payload):
+        if kind == "done":
+            self.show_summary(payload)
         else:
-            col_idx = int(target_col)
-
-        # 写入标题
-        ws.cell(row=1, column=col_idx, value="对方科目")
-        ws.cell(1, col_idx).font = Font(bold=True)
-        ws.cell(1, col_idx).alignment = Alignment(horizontal='center', vertical='center')
-
-        # 写入数据
-        for idx, value in enumerate(result_list, start=2):
-            ws.cell(row=idx, column=col_idx, value=value)
-
-        # 保存文件
-        wb.save(dst_path)
-
-    def save_with_vba(self, src_path, dst_path, result_list, params):
-        # 使用 openpyxl 处理带宏文件
-        wb = load_workbook(src_path, keep_vba=True)
-        sheet_name = params["sheet_name"] or wb.sheetnames[0]
-        ws = wb[sheet_name]
-
-        def excel_column_to_num(col_str):
-            """将Excel列字母转换为数字索引（如'A'->1, 'AI'->35）"""
-            num = 0
-            for i, c in enumerate(reversed(col_str.upper())):
-                num += (ord(c) - 64) * (26 ** i)
-            return num
-
-        # 在目标列写入数据
-        target_col = params["target_col"]
-        if target_col.isalpha():
-            col_idx = excel_column_to_num(target_col)
+            messagebox.showerror("错误", str(payload))
+        self.processing = False
+        self.root.config(cursor="")
+        self.progress["value"] = 0
+        self.status_var.set("")
+
+    def on_progress(self, file_path, stage, rows, vouchers):
+        """文件内的进度：当前阶段和已处理行数"""
+        text = f"{os.path.basename(file_path)}：{STAGE_NAMES.get(stage, stage)}"
+        if rows:
+            text += f" {rows} 行"
+        if vouchers is not None:
+            text += f"，{vouchers} 个凭证"
+        self.status_var.set(text)
+
+    def on_file_done(self, record, done, total):
+        """单个文件处理完成，错误只记录，处理结束后统一提示"""
+        self.progress["value"] = int((done / total) * 100)
+        if record["status"] == "error":
+            print(f"处理文件失败：{record['file']}")  # 调试信息
+            print(f"错误详情：{record['error']}")  # 调试信息
+
+    def show_summary(self, report):
+        """处理结束后汇总提示"""
+        summary = report["summary"]
+        title = "处理完成！" if self.processing else "处理已中止"
+        message = f"{title}\n成功 {summary['ok']} 个，失败 {summary['error']} 个"
+        if summary["skipped"]:
+            message += f"，未变化跳过 {summary['skipped']} 个"
+        stages = format_stages(report["stages"])
+        if stages:
+            message += f"\n{stages}"
+        failed = [r for r in report["files"] if r["status"] == "error"]
+        if failed:
+            details = "\n".join(f"{os.path.basename(r['file'])}：{r['error']}" for r in failed[:10])
+            if len(failed) > 10:
+                details += f"\n……共 {len(failed)} 个文件失败"
+            messagebox.showwarning("完成", f"{message}\n\n{details}")
         else:
-            col_idx = int(target_col)
-
-        # 写入标题
-        ws.cell(row=1, column=col_idx, value="对方科目")
-        ws.cell(1, col_idx).font = Font(bold=True)
-        ws.cell(1, col_idx).alignment = Alignment(horizontal='center', vertical='center')
-
-        # 写入数据
-        for idx, value in enumerate(result_list, start=2):
-            ws.cell(row=idx, column=col_idx, value=value)
-
-        # 保存文件
-        wb.save(dst_path)
+            messagebox.showinfo("完成", message)
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    # 每个文件的处理统计以 JSON 行输出到控制台
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     root = tk.Tk()
     app = AdvancedAccountingProcessor(root)
     root.mainloop()
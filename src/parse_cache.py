@@ -0,0 +1,198 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""解析结果缓存：同一份账套换参数重新处理时跳过 Excel 解析
+
+缓存按文件内容哈希和工作表分目录保存，每列单独存为字典编码的 .npy 文件
+（整数编码 + 取值表），只缓存处理时实际读取过的列，读取时只需加载数组，不再解析 XML：
+
+    <缓存目录>/<文件 SHA-256>/sheets.json            工作簿的工作表名
+    <缓存目录>/<文件 SHA-256>/<工作表键>/meta.json  行数
+    <缓存目录>/<文件 SHA-256>/<工作表键>/header.npy
+    <缓存目录>/<文件 SHA-256>/<工作表键>/<列位置>.codes.npy / .values.npy
+
+总大小超过上限时按最近使用时间淘汰最久未用的文件。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+DEFAULT_CACHE_SIZE = 1 << 30  # 1GB
+META_FILE = "meta.json"
+SHEETS_FILE = "sheets.json"
+
+
+def default_cache_dir():
+    """默认缓存目录：Windows 为 %LOCALAPPDATA%，其他系统为 ~/.cache"""
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "counterparty", "parse_cache")
+
+
+def file_sha256(file_path):
+    """文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sheet_key(sheet_name):
+    # 工作表名可能含有文件名不允许的字符
+    return hashlib.sha256(sheet_name.encode("utf-8")).hexdigest()[:16]
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _save_array(path, array):
+    # 先写临时文件再替换，其他进程不会读到写了一半的数组
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array, allow_pickle=True)
+    os.replace(tmp_path, path)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ParseCache:
+    """按文件内容哈希缓存各工作表解析出的列
+
+    可以在多个进程中同时使用：写入先落在临时目录再整体改名，淘汰时忽略已被删除的文件。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._hashes = {}
+
+    def _file_dir(self, file_path):
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = file_sha256(file_path)
+        return os.path.join(self.cache_dir, self._hashes[key])
+
+    def _sheet_dir(self, file_path, sheet_name):
+        return os.path.join(self._file_dir(file_path), _sheet_key(sheet_name))
+
+    def sheetnames(self, file_path):
+        """缓存的工作表名列表，未缓存时返回 None"""
+        try:
+            with open(os.path.join(self._file_dir(file_path), SHEETS_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def header(self, file_path, sheet_name):
+        """缓存的表头，未缓存时返回 None"""
+        try:
+            return np.load(os.path.join(self._sheet_dir(file_path, sheet_name), "header.npy"),
+                           allow_pickle=True).tolist()
+        except (OSError, ValueError):
+            return None
+
+    def load(self, file_path, sheet_name, positions):
+        """读取缓存的列，返回 (行数, {列位置: (编码, 取值表)})；有任何一列未缓存时返回 None"""
+        sheet_dir = self._sheet_dir(file_path, sheet_name)
+        try:
+            with open(os.path.join(sheet_dir, META_FILE), encoding="utf-8") as f:
+                n_rows = json.load(f)["rows"]
+            columns = {}
+            for pos in positions:
+                # 编码最后写入，编码存在时取值表一定已经写好
+                codes = np.load(os.path.join(sheet_dir, f"{pos}.codes.npy"))
+                values = np.load(os.path.join(sheet_dir, f"{pos}.values.npy"), allow_pickle=True)
+                columns[pos] = (codes, values)
+            # 记录最近使用时间，供淘汰时参考
+            now = time.time()
+            os.utime(os.path.dirname(sheet_dir), (now, now))
+        except (OSError, ValueError, KeyError):
+            return None
+        return n_rows, columns
+
+    def store(self, file_path, sheet_name, header, n_rows, columns, sheetnames=None):
+        """写入一个工作表的表头和若干列（{列位置: (编码, 取值表)}），已缓存的列跳过；
+        传入 sheetnames 时一并记录工作簿的工作表名。超过大小上限时淘汰旧缓存
+
+        写入失败（如磁盘空间不足）只放弃缓存，不影响处理。
+        """
+        file_dir = self._file_dir(file_path)
+        sheet_dir = os.path.join(file_dir, _sheet_key(sheet_name))
+        try:
+            if not os.path.exists(sheet_dir):
+                os.makedirs(file_dir, exist_ok=True)
+                tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=file_dir)
+                try:
+                    np.save(os.path.join(tmp_dir, "header.npy"), np.array(list(header), dtype=object),
+                            allow_pickle=True)
+                    _write_json(os.path.join(tmp_dir, META_FILE), {"rows": n_rows})
+                    os.rename(tmp_dir, sheet_dir)
+                except OSError:
+                    # 其他进程已创建同一工作表的目录
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+            for pos, (codes, values) in columns.items():
+                codes_path = os.path.join(sheet_dir, f"{pos}.codes.npy")
+                if os.path.exists(codes_path):
+                    continue
+                _save_array(os.path.join(sheet_dir, f"{pos}.values.npy"),
+                            np.asarray(values, dtype=object))
+                _save_array(codes_path, np.asarray(codes, dtype=np.int32))
+            sheets_path = os.path.join(file_dir, SHEETS_FILE)
+            if sheetnames is not None and not os.path.exists(sheets_path):
+                _write_json(sheets_path, list(sheetnames))
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self):
+        """总大小超过上限时，从最久未使用的文件开始删除"""
+        try:
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+        except OSError:
+            return
+        sized = []
+        for path in entries:
+            try:
+                sized.append((os.path.getmtime(path), _dir_size(path), path))
+            except OSError:
+                continue
+        total = sum(size for _, size, _ in sized)
+        for _, size, path in sorted(sized):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
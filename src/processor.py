@@ -0,0 +1,878 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""账套处理流程：参数整理、单个文件的处理和批量运行
+
+    - 单个文件：按参数只读取需要的列（load_ledger / stream_sheet），计算对方科目
+      （compute_results），写回保存（save_output），入口为 process_file / process_one
+    - 批量：process_batch 把文件分给常驻进程池（start_pool），子进程异常退出的文件记为出错；
+      只有一个大文件时由 process_partitioned 按凭证分区交给 ComputePool 并行计算
+    - 跨文件：process_grouped 按凭证汇总多个文件（见 cross_file），分登记和写回两步
+    - 增量：Manifest 记录已处理文件的内容和参数指纹，未变化的文件跳过
+    - run 为命令行、界面和目录监视共用的入口：收集文件、选择以上方式处理，返回运行报告
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import signal
+import time
+import multiprocessing
+import queue
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from functools import partial
+
+import pandas as pd
+
+from engine import (
+    FULL_OUTPUT, UnsortedVouchersError, compact_ledger, compute_counterparty, compute_outputs,
+    encode_column, excel_column_to_num, ledger_sides, mode_column_keys, resolve_positions,
+    stream_counterparty,
+)
+from cross_file import DEFAULT_PARTITIONS, VoucherGroups
+from instrument import Stages, log_record, summarize_stages
+from parse_cache import file_sha256
+from xls_legacy import XlsReader, write_xlsx
+from xlsx_package import WorkbookReader, write_columns
+
+
+HEADER = "对方科目"
+EXCEL_EXTENSIONS = ('.xls', '.xlsx', '.xlsm')
+OUTPUT_SUFFIX = "_处理后"
+MANIFEST_NAME = ".counterparty_manifest.json"
+ALL_SHEETS = ("*", "全部")
+# 子进程异常退出（如内存不足被系统结束）时文件记录的错误前缀，见 crashed_files
+CRASHED_ERROR = "处理进程异常退出"
+
+# 两种模式的参数（与界面的 fields_separate / fields_together 一致）及必填项
+MODE_PARAMS = {
+    "separate": ["voucher_col", "subject_col", "debit_col", "credit_col", "sheet_name", "target_col",
+                 "extra_outputs"],
+    "together": ["voucher_col", "subject_col", "amount_col", "direction_col", "debit_flag",
+                 "credit_flag", "credit_action", "sheet_name", "target_col", "extra_outputs"],
+}
+REQUIRED_PARAMS = {
+    "separate": ["voucher_col", "subject_col", "debit_col", "credit_col"],
+    "together": ["voucher_col", "subject_col", "amount_col", "direction_col", "debit_flag", "credit_flag"],
+}
+
+# 附加输出的形式（可用 "+" 组合）：科目规则或附金额，见 engine.compute_outputs
+OUTPUT_RULES = {
+    "全称": ("subjects", "full"),
+    "full": ("subjects", "full"),
+    "一级科目": ("subjects", "first_level"),
+    "一级": ("subjects", "first_level"),
+    "first_level": ("subjects", "first_level"),
+    "金额": ("with_amount", True),
+    "amount": ("with_amount", True),
+    "with_amount": ("with_amount", True),
+}
+_OUTPUT_ITEM_RE = re.compile(r"([A-Za-z]+|\d+)\s*[:：=]\s*(.+)")
+
+
+def normalize_params(raw, mode):
+    """按界面的规则整理参数并检查必填项，参数不合法时抛出 ValueError"""
+    if mode not in MODE_PARAMS:
+        raise ValueError(f"未知的处理模式：{mode}")
+
+    params = {}
+    for key in MODE_PARAMS[mode]:
+        value = raw.get(key)
+        value = "" if value is None else str(value)
+        params[key] = value if key == "credit_action" else value.strip()
+    params["sheet_name"] = params["sheet_name"] or None
+    params["target_col"] = params["target_col"].upper()
+
+    missing = [key for key in REQUIRED_PARAMS[mode] if not params[key]]
+    if missing:
+        raise ValueError(f"必填字段不能为空：{', '.join(missing)}")
+    if not params["target_col"]:
+        raise ValueError("必填字段不能为空：target_col")
+    output_specs(params)
+    return params
+
+
+def collect_files(path):
+    """单个文件直接返回；目录则列出其中的 Excel 文件（跳过已处理的输出和 Excel 临时文件）"""
+    if not os.path.isdir(path):
+        return [path]
+    files = []
+    for name in sorted(os.listdir(path)):
+        stem = os.path.splitext(name)[0]
+        if (name.lower().endswith(EXCEL_EXTENSIONS) and not name.startswith("~$")
+                and not stem.endswith(OUTPUT_SUFFIX)):
+            files.append(os.path.join(path, name))
+    return files
+
+
+def target_column_index(target_col):
+    """目标列位置（列字母或列序号）转为数字索引"""
+    if target_col.isalpha():
+        return excel_column_to_num(target_col)
+    return int(target_col)
+
+
+def output_specs(params):
+    """各输出列：[{"target_col", "col_idx", "header", "subjects", "with_amount"}, ...]
+
+    第一个为目标列的对方科目；"附加输出"（extra_outputs）为逗号分隔的"列:形式"，
+    形式为 全称、一级科目、金额，可以用 "+" 组合，如 "I:一级科目, J:一级科目+金额"。
+    所有输出在同一次分组计算中得到（见 engine.compute_outputs）。格式不对或列重复时抛出 ValueError。
+    """
+    specs = [_output_spec(params["target_col"], FULL_OUTPUT)]
+    for item in re.split(r"[,，;；]", params.get("extra_outputs") or ""):
+        if not item.strip():
+            continue
+        match = _OUTPUT_ITEM_RE.fullmatch(item.strip())
+        if not match:
+            raise ValueError(f"附加输出格式应为 列:形式（如 I:一级科目），无法识别：{item.strip()}")
+        output = dict(FULL_OUTPUT)
+        for rule in re.split(r"[+＋]", match.group(2)):
+            key = OUTPUT_RULES.get(rule.strip().lower())
+            if key is None:
+                raise ValueError(f"附加输出的形式无法识别：{rule.strip()}（可用：全称、一级科目、金额）")
+            output[key[0]] = key[1]
+        specs.append(_output_spec(match.group(1).upper(), output))
+
+    cols = [spec["col_idx"] for spec in specs]
+    duplicates = [spec["target_col"] for i, spec in enumerate(specs) if spec["col_idx"] in cols[:i]]
+    if duplicates:
+        raise ValueError(f"输出列重复：{', '.join(duplicates)}")
+    return specs
+
+
+def _output_spec(target_col, output):
+    header = ("对方一级科目" if output["subjects"] == "first_level" else HEADER)
+    if output["with_amount"]:
+        header += "及金额"
+    return {"target_col": target_col, "col_idx": target_column_index(target_col), "header": header,
+            **output}
+
+
+def output_path(file_path, save_dir=None):
+    """生成输出文件路径：原文件名_处理后，.xls 输出为 .xlsx"""
+    save_dir = save_dir or os.path.dirname(file_path)
+    name, ext = os.path.splitext(os.path.basename(file_path))
+    if ext.lower() == ".xls":
+        ext = ".xlsx"
+    return os.path.join(save_dir, f"{name}{OUTPUT_SUFFIX}{ext}")
+
+
+def select_sheets(sheetnames, spec):
+    """按"工作表名称"选出要处理的工作表，保持工作簿中的顺序
+
+    为空时取第一个工作表；"*" 或 "全部" 取所有工作表；否则为逗号分隔的名称，
+    名称中可以使用通配符 * ? [ ]（Excel 工作表名不允许包含这些字符，不会混淆）。
+    与某个工作表名完全相同时按单个名称处理（工作表名本身可以包含逗号）。
+    """
+    if not spec:
+        return list(sheetnames[:1])
+    if spec in sheetnames:
+        return [spec]
+    if spec in ALL_SHEETS:
+        return list(sheetnames)
+
+    selected = set()
+    for pattern in re.split(r"[,，]", spec):
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        matched = [name for name in sheetnames if fnmatch.fnmatchcase(name, pattern)]
+        if not matched:
+            raise ValueError(f"工作表 {pattern} 不存在")
+        selected.update(matched)
+    return [name for name in sheetnames if name in selected]
+
+
+@contextmanager
+def sheet_errors(sheet_name):
+    """在错误信息前加上工作表名，多个工作表时便于定位"""
+    try:
+        yield
+    except UnsortedVouchersError:
+        raise
+    except ValueError as e:
+        raise ValueError(f"工作表 {sheet_name}：{e}") from e
+
+
+def is_legacy_xls(file_path):
+    """Excel 97-2003 工作簿（.xls），用 xlrd 读取"""
+    return file_path.lower().endswith(".xls")
+
+
+def open_book(file_path):
+    """只读打开工作簿：.xls 为 xls_legacy.XlsReader，其余为 xlsx_package.WorkbookReader，接口相同"""
+    if is_legacy_xls(file_path):
+        return XlsReader(file_path)
+    return WorkbookReader(file_path)
+
+
+class LazyBook:
+    """第一次读取工作表时才打开的工作簿（sheet / sheetnames 同 open_book 的返回值）
+
+    传入 cache（parse_cache.ParseCache）时工作表名优先取自缓存，
+    需要的列全部命中缓存时不打开工作簿。
+    """
+
+    def __init__(self, file_path, cache=None):
+        self.file_path = file_path
+        self.cache = cache
+        self.book = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def open(self):
+        """打开（或返回已打开的）工作簿"""
+        if self.book is None:
+            self.book = open_book(self.file_path)
+        return self.book
+
+    @property
+    def sheetnames(self):
+        if self.book is None and self.cache:
+            sheetnames = self.cache.sheetnames(self.file_path)
+            if sheetnames is not None:
+                return sheetnames
+        return self.open().sheetnames
+
+    def sheet(self, sheet_name=None):
+        return self.open().sheet(sheet_name)
+
+    def close(self):
+        if self.book is not None:
+            self.book.close()
+
+
+def read_columns(sheet, positions, track=None):
+    """读取工作表（xlsx_package.SheetReader 或 xls_legacy.XlsSheetReader）数据行中的指定列
+
+    返回 (行数, {列位置: (编码, 取值表)})，每列按 engine.encode_column 字典编码。
+    track 用于统计已读取的行数。
+    """
+    rows = sheet.rows(positions)
+    if track:
+        rows = track(rows)
+    columns = list(zip(*rows)) or [()] * len(positions)
+    return len(columns[0]), {pos: encode_column(values) for pos, values in zip(positions, columns)}
+
+
+def sheet_positions(header, params, mode, sheet):
+    """解析本模式需要的列位置，返回 (表头, 列位置)
+
+    表头只到第 1 行最后一个非空单元格；列字母或列序号超出表头时按工作表的最大列
+    （sheet() 取得的工作表读取器的 max_column）解析，此时返回的表头以 None 补齐到最大列。
+    """
+    try:
+        return header, resolve_positions(header, params, mode)
+    except ValueError:
+        width = sheet().max_column()
+        if width <= len(header):
+            raise
+    header = tuple(header) + (None,) * (width - len(header))
+    return header, resolve_positions(header, params, mode)
+
+
+def load_ledger(book, file_path, sheet_name, params, mode, stages=None, cache=None):
+    """按参数只读取工作表中需要的列，返回 engine.compact_ledger 构造的紧凑账套
+
+    book 为 open_book 打开的工作簿或 LazyBook。传入 cache（parse_cache.ParseCache）时
+    优先取缓存的列，缓存中没有的列解析后写入缓存；全部命中时不读取工作表。
+    """
+    stages = stages or Stages()
+    sheet = None
+    loaded = None
+    with stages.stage("read"):
+        header = cache.header(file_path, sheet_name) if cache else None
+        if header is None:
+            sheet = book.sheet(sheet_name)
+            header = sheet.header()
+        header, positions = sheet_positions(header, params, mode,
+                                            lambda: sheet or book.sheet(sheet_name))
+        wanted = sorted(set(positions.values()))
+        if cache:
+            # 缓存可能刚被其他进程淘汰，此时改为解析该工作表
+            loaded = cache.load(file_path, sheet_name, wanted)
+        n_rows, columns = loaded or read_columns(sheet or book.sheet(sheet_name), wanted, stages.track)
+        ledger = compact_ledger({key: columns[pos] for key, pos in positions.items()}, mode)
+    if cache and loaded is None:
+        with stages.stage("cache"):
+            cache.store(file_path, sheet_name, header, n_rows, columns, book.sheetnames)
+    return ledger
+
+
+def read_ledger(file_path, params, mode, sheet_name=None):
+    """读取单个工作表的紧凑账套（未指定工作表时取第一个）"""
+    with open_book(file_path) as book:
+        return load_ledger(book, file_path, sheet_name or book.sheetnames[0], params, mode)
+
+
+def stream_sheet(sheet, params, mode, stats=None):
+    """逐行读取工作表（open_book 打开的工作簿中的工作表）中需要的列并流式产出对方科目，
+    不在内存中保留整张表
+
+    凭证字号不连续时抛出 UnsortedVouchersError。
+    """
+    _, positions = sheet_positions(sheet.header(), params, mode, lambda: sheet)
+    wanted = sorted(set(positions.values()))
+    # 行元组只含需要的列，列位置换算为元组下标
+    index = {pos: i for i, pos in enumerate(wanted)}
+    rows = sheet.rows(wanted)
+    specs = output_specs(params)
+    yield from stream_counterparty(rows, {key: index[pos] for key, pos in positions.items()},
+                                   params, mode, stats, specs if len(specs) > 1 else None)
+
+
+def compute_results(df, params, mode, stats=None, columns=None, pool=None):
+    """计算一个工作表的结果：只有目标列时为对方科目列表，
+    有附加输出时为各行各输出列取值的元组（顺序同 output_specs）；pool 见 ComputePool"""
+    specs = output_specs(params)
+    if len(specs) == 1:
+        return compute_counterparty(df, params, mode, stats, columns, pool)
+    return list(zip(*compute_outputs(df, params, mode, specs, stats, columns, pool)))
+
+
+def save_output(src_path, dst_path, sheet_values, params, book=None):
+    """只改写各目标工作表写入结果（同时取消筛选），先写临时文件再替换，失败时不留下半成品
+
+    sheet_values 为 {工作表名: 结果}，工作表名为 None 表示第一个工作表；结果的形式见 compute_results。
+    .xls 转存为 xlsx（见 xls_legacy.write_xlsx），可以传入已打开的 book 避免重新解析。
+    """
+    tmp_path = dst_path + ".tmp"
+    specs = output_specs(params)
+    if len(specs) == 1:
+        col_idx, header = specs[0]["col_idx"], HEADER
+    else:
+        col_idx = [spec["col_idx"] for spec in specs]
+        header = [spec["header"] for spec in specs]
+    try:
+        if is_legacy_xls(src_path):
+            with nullcontext(book) if book else XlsReader(src_path) as xls:
+                write_xlsx(xls, tmp_path, col_idx, header, sheet_values)
+        else:
+            write_columns(src_path, tmp_path, col_idx, header, sheet_values)
+        os.replace(tmp_path, dst_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _stream_sheets(book, file_path, save_path, sheet_names, params, mode, stages):
+    """流式处理选中的各工作表，一次读取、一次写出"""
+    stats = {sheet_name: {} for sheet_name in sheet_names}
+
+    def stream(sheet_name):
+        with sheet_errors(sheet_name):
+            yield from stream_sheet(book.sheet(sheet_name), params, mode, stats[sheet_name])
+
+    save_output(file_path, save_path,
+                {sheet_name: stages.track(stream(sheet_name)) for sheet_name in sheet_names}, params,
+                book)
+    for sheet_stats in stats.values():
+        stages.count(**sheet_stats)
+
+
+def _sheet_ledgers(book, file_path, params, mode, stages, cache=None):
+    """逐个读取选中的工作表，产出 (工作表名, 紧凑账套, 列名映射)，紧凑账套见 load_ledger"""
+    columns = {key: key for key in mode_column_keys(mode)}
+    for sheet_name in select_sheets(book.sheetnames, params["sheet_name"]):
+        with sheet_errors(sheet_name):
+            ledger = load_ledger(book, file_path, sheet_name, params, mode, stages, cache)
+        yield sheet_name, ledger, columns
+
+
+def _save_results(file_path, save_path, results, params, stages, book=None):
+    """把 {工作表名: 结果列表} 写回输出文件"""
+    with stages.stage("write"):
+        save_output(file_path, save_path, _tracked(results, stages), params, book)
+
+
+def process_file(file_path, params, mode, save_dir=None, streaming=False, stages=None, cache=None,
+                 pool=None):
+    """处理单个文件，返回输出文件路径
+
+    params["sheet_name"] 可以选择多个工作表（见 select_sheets），工作簿只读取一次、写出一次。
+    只读取参数用到的列（见 load_ledger）；.xls 用 xlrd 读取一次，输出为 xlsx。
+    streaming=True 时按凭证流式读取和计算，凭证字号不连续时自动回退到整表计算。
+    传入 stages（instrument.Stages）时记录各阶段耗时和行数/凭证数。
+    传入 cache（parse_cache.ParseCache）时优先从缓存读取需要的列，未命中的解析后写入缓存，
+    选中的工作表全部命中时不打开工作簿（流式处理不使用缓存）。
+    传入 pool（ComputePool）时，大表的计算按凭证分区并行（见 engine.compute_outputs）。
+    """
+    stages = stages or Stages()
+    save_path = output_path(file_path, save_dir)
+
+    with LazyBook(file_path, cache) as book:
+        if streaming:
+            # 边读边写：写出一行才向后读取一行，凭证不连续时回退到整表计算
+            try:
+                with stages.stage("stream"):
+                    opened = book.open()
+                    sheet_names = select_sheets(opened.sheetnames, params["sheet_name"])
+                    _stream_sheets(opened, file_path, save_path, sheet_names, params, mode, stages)
+                return save_path
+            except UnsortedVouchersError:
+                pass
+
+        results = {}
+        for sheet_name, df, columns in _sheet_ledgers(book, file_path, params, mode, stages, cache):
+            stats = {}
+            with stages.stage("compute"), sheet_errors(sheet_name):
+                results[sheet_name] = compute_results(df, params, mode, stats, columns, pool)
+            del df
+            stages.count(**stats)
+        _save_results(file_path, save_path, results, params, stages, book.book)
+    return save_path
+
+
+def scan_grouped(groups, file_path, params, mode, save_dir=None, streaming=False, stages=None,
+                 cache=None):
+    """跨文件汇总的第一步：读取文件选中的各工作表，登记到 groups（cross_file.VoucherGroups）"""
+    stages = stages or Stages()
+    with LazyBook(file_path, cache) as book:
+        for sheet_idx, (sheet_name, df, columns) in enumerate(
+                _sheet_ledgers(book, file_path, params, mode, stages, cache)):
+            with stages.stage("compute"), sheet_errors(sheet_name):
+                sides = ledger_sides(df, params, mode, columns)
+                groups.add(file_path, sheet_idx, sheet_name, *sides)
+            stages.count(rows=len(df), vouchers=len(sides[1]))
+            del df, sides
+
+
+def write_grouped(groups, file_path, params, mode, save_dir=None, streaming=False, stages=None,
+                  cache=None):
+    """跨文件汇总的最后一步：取出文件各工作表的汇总结果并写回，返回输出文件路径"""
+    stages = stages or Stages()
+    save_path = output_path(file_path, save_dir)
+    with stages.stage("compute"):
+        voucher_results = groups.file_results(file_path)
+        results = {sheet_name: groups.results(file_path, sheet_idx, voucher_results)
+                   for sheet_idx, sheet_name in groups.sheets(file_path)}
+    _save_results(file_path, save_path, results, params, stages)
+    return save_path
+
+
+def _tracked(results, stages):
+    """写回时统计已写出的行数"""
+    return {sheet_name: stages.track(values) for sheet_name, values in results.items()}
+
+
+def process_one(file_path, params, mode, save_dir, streaming, trace_memory=False, cache=None,
+                progress=None, handler=None):
+    """处理单个文件（批量处理或服务模式的一个任务），异常转为附带各阶段统计的结果记录
+
+    progress 接收 (文件, 阶段, 行数, 凭证数) 元组，可以是跨进程队列的 put。
+    handler 为与 process_file 参数相同的处理函数，默认 process_file。
+    """
+    handler = handler or process_file
+    record = {"file": file_path, "status": "ok", "output": None, "error": None}
+    report = None
+    if progress:
+        def report(stage, rows, vouchers):
+            progress((file_path, stage, rows, vouchers))
+
+    with Stages(trace_memory, report) as stages:
+        try:
+            record["output"] = handler(file_path, params, mode, save_dir, streaming=streaming,
+                                       stages=stages, cache=cache)
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+    record.update(stages.as_dict())
+    return record
+
+
+def process_batch(files, params, mode, save_dir=None, streaming=False, workers=None,
+                  should_stop=None, on_result=None, trace_memory=False, cache=None,
+                  on_progress=None, handler=None, executor=None):
+    """多进程批量处理文件，返回与 files 顺序一致的结果记录列表
+
+    workers 为进程数（默认 CPU 核数，1 表示在当前进程内依次处理）；
+    executor 为常驻进程池（见 start_pool）时改用该进程池，用完不关闭，workers 应与其进程数一致；
+    只有一个文件时大表的计算按凭证分区交给 workers 个进程（见 process_partitioned），
+    传入 executor 时文件仍在它的子进程中处理，由该子进程启动分区进程；
+    should_stop() 返回 True 时取消尚未开始的文件；
+    子进程异常退出导致进程池损坏时，未完成的文件记为错误（见 crashed_files），不抛出异常；
+    on_result(record, done, total) 在每个文件完成时调用；
+    trace_memory=True 时统计各阶段峰值内存（较慢）；cache 为 ParseCache 时使用解析缓存；
+    on_progress(file, stage, rows, vouchers) 报告文件内的进度（经过节流，多进程时由队列转回
+    调用 process_batch 的线程）；handler 替换单个文件的处理函数（见 process_one）。
+    """
+    total = len(files)
+    requested = workers or os.cpu_count() or 1
+    workers = min(requested, total) or 1
+    records = {}
+
+    if total == 1 and handler is None and requested > 1:
+        # 其余进程空闲：处理这个文件时把大表的计算分区并行
+        handler = partial(process_partitioned, requested)
+
+    def finish(record):
+        records[record["file"]] = record
+        if on_result:
+            on_result(record, len(records), total)
+
+    def cancelled(file_path):
+        return {"file": file_path, "status": "cancelled", "output": None, "error": None}
+
+    def crashed(file_path, e):
+        return {"file": file_path, "status": "error", "output": None,
+                "error": f"{CRASHED_ERROR}：{e}"}
+
+    if executor is None and workers == 1:
+        progress = (lambda event: on_progress(*event)) if on_progress else None
+        for file_path in files:
+            if should_stop and should_stop():
+                records.setdefault(file_path, cancelled(file_path))
+                continue
+            finish(process_one(file_path, params, mode, save_dir, streaming, trace_memory, cache,
+                               progress, handler))
+        return [records[f] for f in files]
+
+    # 子进程的进度经 Manager 队列传回，在下面的等待循环中转交 on_progress
+    manager = multiprocessing.Manager() if on_progress else None
+    progress_queue = manager.Queue() if manager else None
+
+    def drain_progress():
+        while progress_queue is not None:
+            try:
+                event = progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            on_progress(*event)
+
+    try:
+        with nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for file_path in files:
+                try:
+                    future = pool.submit(process_one, file_path, params, mode, save_dir, streaming,
+                                         trace_memory, cache,
+                                         progress_queue.put if progress_queue else None, handler)
+                except BrokenProcessPool as e:
+                    # 传入的进程池已经损坏（如上一批中有子进程异常退出）
+                    finish(crashed(file_path, e))
+                    continue
+                futures[future] = file_path
+            pending = set(futures)
+            stopping = False
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                drain_progress()
+                for future in done:
+                    if future.cancelled():
+                        records[futures[future]] = cancelled(futures[future])
+                        continue
+                    try:
+                        record = future.result()
+                    except BrokenProcessPool as e:
+                        record = crashed(futures[future], e)
+                    finish(record)
+                if not stopping and should_stop and should_stop():
+                    # 已在运行的文件会处理完，排队中的直接取消
+                    stopping = True
+                    for future in pending:
+                        future.cancel()
+    finally:
+        if manager:
+            manager.shutdown()
+    return [records[f] for f in files]
+
+
+def crashed_files(report):
+    """运行报告中因子进程异常退出而失败的文件"""
+    return [record["file"] for record in report["files"]
+            if record["status"] == "error" and (record["error"] or "").startswith(CRASHED_ERROR)]
+
+
+def _warm_worker():
+    """进程池子进程的初始化：载入本模块（连同 pandas、openpyxl）后再算一遍小账套，
+    让 pandas 延迟导入的部分也提前载入"""
+    # Ctrl+C 由主进程处理并关闭进程池，子进程忽略，避免打印一堆中断堆栈
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    df = pd.DataFrame({"voucher": ["1", "1"], "subject": ["a", "b"], "debit": [1.0, 0.0],
+                       "credit": [0.0, 1.0]})
+    compute_counterparty(df, {}, "separate", columns={
+        "voucher_col": "voucher", "subject_col": "subject", "debit_col": "debit", "credit_col": "credit"})
+
+
+def start_pool(workers=None):
+    """启动常驻进程池并等全部子进程预热完成，供多次 process_batch / run 复用（用完需 shutdown）"""
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+    # 同时提交 workers 个短任务，促使进程池立即启动全部子进程
+    for future in [pool.submit(time.sleep, 0.1) for _ in range(workers)]:
+        future.result()
+    return pool
+
+
+def process_partitioned(workers, file_path, params, mode, save_dir=None, streaming=False,
+                        stages=None, cache=None):
+    """同 process_file，大表的计算按凭证分区交给 workers 个进程（见 ComputePool）
+
+    供 process_batch 在只有一个文件时作为 handler（可以在常驻进程池的子进程中运行）。
+    """
+    with ComputePool(workers) as pool:
+        return process_file(file_path, params, mode, save_dir, streaming, stages, cache, pool)
+
+
+class ComputePool:
+    """单个大文件按凭证分区并行计算（见 engine.compute_outputs）用的进程池
+
+    第一次提交任务时才启动 workers 个进程，小文件不分区，也就不必启动进程。
+    """
+
+    def __init__(self, workers):
+        # 守护进程不能再启动子进程（如 multiprocessing.Pool 的子进程，以及 Python 3.8 及以前
+        # ProcessPoolExecutor 的子进程），此时不分区；在其他进程中都按 workers 分区
+        self.workers = 1 if multiprocessing.current_process().daemon else workers
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def submit(self, fn, *args):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor.submit(fn, *args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def _merge_records(scanned, written):
+    """合并同一文件登记和写回两步的结果记录：状态取写回的，阶段耗时累加，行数/凭证数取登记的"""
+    stages = {name: dict(entry) for name, entry in scanned.get("stages", {}).items()}
+    for name, entry in written.get("stages", {}).items():
+        total = stages.setdefault(name, {"seconds": 0.0})
+        total["seconds"] = round(total["seconds"] + entry["seconds"], 4)
+        if "peak_mb" in entry:
+            total["peak_mb"] = max(total.get("peak_mb", 0.0), entry["peak_mb"])
+    counts = {key: value for key, value in scanned.items() if key in ("rows", "vouchers")}
+    return {**written, "stages": stages, **counts}
+
+
+def process_grouped(files, params, mode, save_dir=None, workers=None, should_stop=None,
+                    on_result=None, trace_memory=False, cache=None, on_progress=None,
+                    partitions=DEFAULT_PARTITIONS, spill_dir=None, executor=None):
+    """跨文件按凭证汇总后批量处理，返回 (与 files 顺序一致的结果记录列表, 汇总阶段统计)
+
+    同一凭证分散在多个文件或工作表中时，合并所有借贷行计算对方科目（见 cross_file）。
+    先并行读取登记各文件，再按分区汇总，最后并行写回；读取失败的文件不参与汇总。
+    中间结果写在 spill_dir（默认系统临时目录）下的临时目录中，结束后删除。
+    其余参数同 process_batch；不支持流式处理。
+    """
+    total = len(files)
+    group_stages = Stages(trace_memory)
+    with tempfile.TemporaryDirectory(prefix="counterparty_group_", dir=spill_dir) as tmp_dir:
+        groups = VoucherGroups(tmp_dir, files, partitions)
+        scanned = process_batch(files, params, mode, save_dir, workers=workers,
+                                should_stop=should_stop, trace_memory=trace_memory, cache=cache,
+                                on_progress=on_progress, handler=partial(scan_grouped, groups),
+                                executor=executor)
+        records = {}
+        for record in scanned:
+            if record["status"] == "error":
+                records[record["file"]] = record
+                if on_result:
+                    on_result(record, len(records), total)
+        ready = [record["file"] for record in scanned if record["status"] == "ok"]
+
+        if should_stop and should_stop():
+            # 汇总需要全部文件，中途停止时不再写回任何文件
+            for file_path in ready:
+                records[file_path] = {"file": file_path, "status": "cancelled", "output": None,
+                                      "error": None}
+            return [records[f] for f in files], group_stages.as_dict()
+
+        with group_stages, group_stages.stage("group"):
+            groups.reduce()
+
+        scanned = {record["file"]: record for record in scanned}
+
+        def done(record, *_):
+            record = _merge_records(scanned[record["file"]], record)
+            records[record["file"]] = record
+            if on_result:
+                on_result(record, len(records), total)
+
+        process_batch(ready, params, mode, save_dir, workers=workers, should_stop=should_stop,
+                      on_result=done, trace_memory=trace_memory, on_progress=on_progress,
+                      handler=partial(write_grouped, groups), executor=executor)
+    for file_path in files:
+        records.setdefault(file_path, {"file": file_path, "status": "cancelled", "output": None,
+                                       "error": None})
+    return [records[f] for f in files], group_stages.as_dict()
+
+
+def params_fingerprint(params, mode):
+    """处理参数的指纹，参数变化后需要重新处理"""
+    if not params.get("extra_outputs"):
+        # 没有附加输出时与加入该参数之前的指纹相同，已有的增量清单仍然有效
+        params = {key: value for key, value in params.items() if key != "extra_outputs"}
+    text = json.dumps({"mode": mode, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """增量处理清单：记录每个输入文件的内容哈希、处理参数和输出路径
+
+    清单保存在输出目录下，文件大小和修改时间未变时直接沿用上次的哈希，不重新读取文件。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f).get("files", {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def content_hash(self, file_path):
+        stat = os.stat(file_path)
+        entry = self.entries.get(os.path.abspath(file_path), {})
+        if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return entry["sha256"], stat
+        return file_sha256(file_path), stat
+
+    def is_current(self, file_path, sha256, fingerprint):
+        entry = self.entries.get(os.path.abspath(file_path))
+        return (entry is not None and entry["sha256"] == sha256
+                and entry["params"] == fingerprint and os.path.exists(entry["output"]))
+
+    def record(self, file_path, sha256, stat, fingerprint, output):
+        self.entries[os.path.abspath(file_path)] = {
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "params": fingerprint,
+            "output": os.path.abspath(output),
+            "processed": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def summarize(records):
+    """统计各状态的文件数"""
+    summary = {"total": len(records), "ok": 0, "error": 0, "skipped": 0, "cancelled": 0}
+    for record in records:
+        summary[record["status"]] = summary.get(record["status"], 0) + 1
+    return summary
+
+
+def run(inputs, params, mode, save_dir=None, streaming=False, workers=None,
+        should_stop=None, on_result=None, force=False, trace_memory=False, cache=None,
+        on_progress=None, cross_file=False, executor=None):
+    """处理若干文件或目录，返回可直接序列化为 JSON 的运行报告
+
+    单个文件的错误记录在报告中，不会中断其余文件。内容和参数都未变化、
+    且输出仍然存在的文件直接跳过（状态 skipped），force=True 时全部重新处理。
+    每个文件的记录带有各阶段耗时和行数/凭证数，报告的 stages 为整批汇总。
+    cache 为 ParseCache 时，同一文件换参数重新处理可以跳过 Excel 解析。
+    on_progress(file, stage, rows, vouchers) 报告文件内的进度，见 process_batch。
+    cross_file=True 时把这批文件当作一套账，跨文件合并凭证（见 process_grouped），
+    任何一个文件有变化都会重新处理全部文件。executor 为常驻进程池（见 start_pool）。
+    """
+    params = normalize_params(params, mode)
+    if cross_file and params["extra_outputs"]:
+        raise ValueError("跨文件合并凭证暂不支持附加输出")
+    files = []
+    for path in inputs:
+        files.extend(collect_files(path))
+
+    started = time.time()
+    fingerprint = params_fingerprint({**params, "cross_file": True} if cross_file else params, mode)
+    manifests = {}
+    hashed = {}  # 文件 -> (清单, 哈希, 文件状态)
+    pending = {}
+    records = {}
+    for file_path in files:
+        manifest_path = os.path.join(save_dir or os.path.dirname(file_path), MANIFEST_NAME)
+        if manifest_path not in manifests:
+            manifests[manifest_path] = Manifest(manifest_path)
+        manifest = manifests[manifest_path]
+        try:
+            sha256, stat = manifest.content_hash(file_path)
+        except OSError as e:
+            records[file_path] = {"file": file_path, "status": "error", "output": None, "error": str(e)}
+            continue
+        hashed[file_path] = (manifest, sha256, stat)
+        if not force and manifest.is_current(file_path, sha256, fingerprint):
+            output = manifest.entries[os.path.abspath(file_path)]["output"]
+            records[file_path] = {"file": file_path, "status": "skipped", "output": output, "error": None}
+        else:
+            pending[file_path] = hashed[file_path]
+    if cross_file and pending:
+        # 跨文件汇总的结果取决于整批文件，有一个文件变化就全部重新处理
+        pending = hashed
+        records = {f: record for f, record in records.items() if record["status"] == "error"}
+
+    def done(record, count, total):
+        log_record(record)
+        if record["status"] == "ok":
+            manifest, sha256, stat = pending[record["file"]]
+            manifest.record(record["file"], sha256, stat, fingerprint, record["output"])
+            manifest.save()
+        if on_result:
+            on_result(record, count, total)
+
+    group_stages = None
+    if cross_file:
+        processed, group_stages = process_grouped(
+            list(pending), params, mode, save_dir, workers=workers, should_stop=should_stop,
+            on_result=done, trace_memory=trace_memory, cache=cache, on_progress=on_progress,
+            executor=executor)
+    else:
+        processed = process_batch(list(pending), params, mode, save_dir, streaming=streaming,
+                                  workers=workers, should_stop=should_stop, on_result=done,
+                                  trace_memory=trace_memory, cache=cache, on_progress=on_progress,
+                                  executor=executor)
+    for record in processed:
+        records[record["file"]] = record
+    records = [records[f] for f in files]
+
+    return {
+        "mode": mode,
+        "params": params,
+        "save_dir": save_dir,
+        "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+        "elapsed": round(time.time() - started, 3),
+        "summary": summarize(records),
+        "stages": summarize_stages(records + [group_stages] if group_stages else records),
+        "files": records,
+    }
@@ -0,0 +1,470 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""服务模式：在一台机器上常驻运行 HTTP 服务，排队处理整个团队提交的账套
+
+接口（除上传和下载外，响应均为 JSON）：
+    POST   /jobs?filename=账套.xlsx&mode=separate&voucher_col=B&...   请求体为文件内容
+    GET    /jobs                 全部任务
+    GET    /jobs/<编号>           任务状态和耗时
+    GET    /jobs/<编号>/result    下载处理结果
+    DELETE /jobs/<编号>           取消排队中的任务，或删除已结束任务的文件
+    GET    /health               进程数和排队情况
+处理参数的键与界面字段（fields_separate / fields_together）一致，streaming=1 为流式处理。
+任务交给常驻的预热进程池；处理中和排队的任务达到上限时拒绝新任务（503，带 Retry-After），
+由提交方稍后重试。用法：
+    python src/service.py --port 8765 --workers 8 --work-dir 任务目录
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from functools import partial
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+import processor
+from instrument import log_record
+from parse_cache import DEFAULT_CACHE_SIZE, ParseCache
+
+
+logger = logging.getLogger("counterparty")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_UPLOAD = 512 << 20  # 512MB
+DEFAULT_RETENTION = 24 * 3600  # 已结束的任务保留多少秒
+RETRY_AFTER = 5  # 秒，队列满时建议提交方等待的时间
+CHUNK_SIZE = 1 << 20
+
+FINISHED = ("ok", "error")
+CONTENT_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".xlsm": "application/vnd.ms-excel.sheet.macroEnabled.12",
+}
+
+
+class QueueFullError(RuntimeError):
+    """处理中和排队的任务已达上限"""
+
+
+def _timestamp(seconds):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(seconds)) if seconds else None
+
+
+def _run_job(file_path, params, mode, streaming, cache):
+    """子进程中处理一个任务，记录附上开始处理的时刻"""
+    started = time.time()
+    record = processor.process_one(file_path, params, mode, None, streaming, cache=cache)
+    record["started"] = started
+    return record
+
+
+def _error_record(job, message):
+    return {"file": job["input"], "status": "error", "output": None, "error": message}
+
+
+class JobQueue:
+    """有界的任务队列：上传的文件存到 work_dir/<编号>/，交给 workers 个常驻进程处理
+
+    同时只向进程池提交 workers 个任务，其余在本队列中按提交顺序等待（可以取消）；
+    处理中和排队的任务（含正在上传的）最多 max_pending 个，超出时 reserve 抛出 QueueFullError。
+    已结束的任务保留 retention 秒后连同文件一起删除。服务重启后不恢复之前的任务。
+    """
+
+    def __init__(self, work_dir, workers=None, max_pending=None, cache=None,
+                 retention=DEFAULT_RETENTION):
+        self.work_dir = work_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.cache = cache
+        self.retention = retention
+        os.makedirs(work_dir, exist_ok=True)
+        # 已完成的 Future 在 add_done_callback 时立即回调 _finish，因而用可重入锁
+        self._lock = threading.RLock()
+        self._jobs = {}  # 编号 -> 任务字典，按提交顺序
+        self._waiting = deque()  # 排队中的任务编号
+        self._futures = {}  # 编号 -> 处理中任务的 Future
+        self._pool = processor.start_pool(self.workers)
+        self._broken = False
+
+    def close(self):
+        with self._lock:
+            self._waiting.clear()
+            self._pool.shutdown(wait=False)
+
+    def _pending(self):
+        return sum(job["status"] not in FINISHED for job in self._jobs.values())
+
+    def _purge(self, now):
+        """删除超过保留时间的已结束任务"""
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in FINISHED and now - job["finished"] > self.retention]
+        for job_id in expired:
+            self._remove(job_id)
+
+    def _remove(self, job_id):
+        job = self._jobs.pop(job_id)
+        shutil.rmtree(job["dir"], ignore_errors=True)
+
+    def reserve(self, filename, params, mode, streaming=False):
+        """登记一个待上传的任务并返回它，之后把文件写入 job["input"] 再调用 start
+
+        文件名不是 Excel 文件或参数不合法时抛出 ValueError，队列已满时抛出 QueueFullError。
+        """
+        filename = os.path.basename(filename.replace("\\", "/")).strip()
+        if not filename.lower().endswith(processor.EXCEL_EXTENSIONS) or filename.startswith("~$"):
+            raise ValueError(f"不是 Excel 文件：{filename or '（未指定文件名）'}")
+        params = processor.normalize_params(params, mode)
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            if self._pending() >= self.max_pending:
+                raise QueueFullError(f"处理中和排队的任务已达上限（{self.max_pending} 个），请稍后重试")
+            job_id = uuid.uuid4().hex
+            job_dir = os.path.join(self.work_dir, job_id)
+            os.makedirs(job_dir)
+            job = {"id": job_id, "file": filename, "mode": mode, "params": params,
+                   "streaming": streaming, "status": "uploading", "error": None,
+                   "submitted": now, "started": None, "finished": None, "record": None,
+                   "dir": job_dir, "input": os.path.join(job_dir, filename)}
+            self._jobs[job_id] = job
+        return job
+
+    def discard(self, job_id):
+        """上传失败时撤销 reserve 登记的任务"""
+        with self._lock:
+            if job_id in self._jobs:
+                self._remove(job_id)
+
+    def start(self, job_id):
+        """文件上传完成，排队等待处理"""
+        with self._lock:
+            self._jobs[job_id]["status"] = "queued"
+            self._waiting.append(job_id)
+            self._dispatch()
+
+    def _dispatch(self):
+        """有空闲进程时按顺序把排队的任务提交给进程池"""
+        while self._waiting and len(self._futures) < self.workers and not self._broken:
+            job_id = self._waiting.popleft()
+            job = self._jobs[job_id]
+            job["status"] = "running"
+            try:
+                future = self._pool.submit(_run_job, job["input"], job["params"], job["mode"],
+                                           job["streaming"], self.cache)
+            except BrokenProcessPool as e:
+                # 进程池在 _finish 察觉之前已经损坏
+                self._record(job, _error_record(job, f"{processor.CRASHED_ERROR}：{e}"))
+                self._pool_broken()
+                break
+            self._futures[job_id] = future
+            future.add_done_callback(partial(self._finish, job_id))
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            del self._futures[job_id]
+            job = self._jobs[job_id]
+            try:
+                record = future.result()
+            except BrokenProcessPool as e:
+                record = _error_record(job, f"{processor.CRASHED_ERROR}：{e}")
+                self._pool_broken()
+            except Exception as e:
+                record = _error_record(job, str(e))
+            self._record(job, record)
+            self._dispatch()
+
+    def _record(self, job, record):
+        """任务结束：记下 process_one 的结果记录"""
+        job["finished"] = time.time()
+        job["started"] = record.pop("started", None)
+        job["status"] = record["status"]
+        job["error"] = record["error"]
+        job["record"] = record
+        log_record(record)
+
+    def _pool_broken(self):
+        """进程池不能在它自己的管理线程中重建，另起线程重建后继续处理排队的任务"""
+        if not self._broken:
+            self._broken = True
+            threading.Thread(target=self._restart, daemon=True).start()
+
+    def _restart(self):
+        with self._lock:
+            self._pool.shutdown(wait=False)
+            self._pool = processor.start_pool(self.workers)
+            self._broken = False
+            self._dispatch()
+
+    def status(self, job_id):
+        """任务的状态字典（可直接序列化为 JSON），任务不存在时为 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._describe(job) if job else None
+
+    def list_jobs(self):
+        with self._lock:
+            return [self._describe(job) for job in self._jobs.values()]
+
+    def health(self):
+        with self._lock:
+            return {"workers": self.workers, "max_pending": self.max_pending,
+                    "running": len(self._futures), "queued": len(self._waiting),
+                    "jobs": len(self._jobs)}
+
+    def _describe(self, job):
+        record = job["record"] or {}
+        submitted, started, finished = job["submitted"], job["started"], job["finished"]
+        seconds = {}
+        if started:
+            seconds["queued"] = round(started - submitted, 3)
+            if finished:
+                seconds["processing"] = round(finished - started, 3)
+        if finished:
+            seconds["total"] = round(finished - submitted, 3)
+        return {
+            "id": job["id"], "file": job["file"], "mode": job["mode"], "params": job["params"],
+            "streaming": job["streaming"], "status": job["status"], "error": job["error"],
+            "submitted": _timestamp(submitted), "started": _timestamp(started),
+            "finished": _timestamp(finished), "seconds": seconds,
+            "stages": record.get("stages"), "rows": record.get("rows"),
+            "vouchers": record.get("vouchers"),
+            "result": f"/jobs/{job['id']}/result" if job["status"] == "ok" else None,
+        }
+
+    def result_path(self, job_id):
+        """已完成任务的输出文件路径；任务不存在时抛出 KeyError，没有结果时抛出 ValueError"""
+        with self._lock:
+            job = self._jobs[job_id]
+            if job["status"] != "ok":
+                raise ValueError(f"任务没有可下载的结果（{job['status']}）")
+            return job["record"]["output"]
+
+    def delete(self, job_id):
+        """取消排队中的任务或删除已结束的任务；不存在时抛出 KeyError，正在上传或处理时抛出 ValueError"""
+        with self._lock:
+            job = self._jobs[job_id]
+            if job["status"] in ("uploading", "running"):
+                raise ValueError("任务正在上传或处理，不能删除")
+            if job["status"] == "queued":
+                self._waiting.remove(job_id)
+            self._remove(job_id)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP 接口，任务队列为 self.server.jobs，单个文件上限为 self.server.max_upload 字节"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {"error": message}, headers)
+
+    def _route(self):
+        """路径拆为 (任务编号, 子资源)，如 /jobs/abc/result -> ("abc", "result")"""
+        parts = [part for part in urlsplit(self.path).path.split("/") if part]
+        if not parts or parts[0] != "jobs" or len(parts) > 3:
+            return None
+        return (parts[1] if len(parts) > 1 else None), (parts[2] if len(parts) > 2 else None)
+
+    def do_GET(self):
+        jobs = self.server.jobs
+        if urlsplit(self.path).path == "/health":
+            return self._send_json(HTTPStatus.OK, jobs.health())
+        route = self._route()
+        if route is None or route[1] not in (None, "result"):
+            return self._send_error(HTTPStatus.NOT_FOUND, "没有这个接口")
+        job_id, sub = route
+        if job_id is None:
+            return self._send_json(HTTPStatus.OK, {"jobs": jobs.list_jobs()})
+        if sub is None:
+            status = jobs.status(job_id)
+            if status is None:
+                return self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+            return self._send_json(HTTPStatus.OK, status)
+        try:
+            path = jobs.result_path(job_id)
+        except KeyError:
+            return self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+        except ValueError as e:
+            return self._send_error(HTTPStatus.CONFLICT, str(e))
+        self._send_file(path)
+
+    def _send_file(self, path):
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", CONTENT_TYPES.get(os.path.splitext(name)[1].lower(),
+                                                               "application/octet-stream"))
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(name)}")
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    def do_POST(self):
+        route = self._route()
+        if route != (None, None):
+            return self._send_error(HTTPStatus.NOT_FOUND, "没有这个接口")
+        query = {key: values[-1] for key, values in
+                 parse_qs(urlsplit(self.path).query, keep_blank_values=True).items()}
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            return self._send_error(HTTPStatus.LENGTH_REQUIRED, "需要 Content-Length")
+        length = int(length)
+        if length > self.server.max_upload:
+            self.close_connection = True
+            return self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                    f"文件超过上限（{self.server.max_upload >> 20} MB）")
+
+        jobs = self.server.jobs
+        mode = query.pop("mode", "separate")
+        streaming = query.pop("streaming", "").lower() in ("1", "true", "yes")
+        try:
+            job = jobs.reserve(query.pop("filename", ""), query, mode, streaming)
+        except QueueFullError as e:
+            # 读完（丢弃）请求体再答复，否则仍在发送文件的客户端收不到响应
+            self._receive(None, length)
+            return self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, str(e),
+                                    {"Retry-After": str(RETRY_AFTER)})
+        except ValueError as e:
+            self._receive(None, length)
+            return self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+
+        try:
+            received = self._receive(job["input"], length)
+        except BaseException:
+            jobs.discard(job["id"])
+            raise
+        if received < length:
+            jobs.discard(job["id"])
+            return self._send_error(HTTPStatus.BAD_REQUEST, "文件上传不完整")
+        jobs.start(job["id"])
+        self._send_json(HTTPStatus.ACCEPTED, jobs.status(job["id"]),
+                        {"Location": f"/jobs/{job['id']}"})
+
+    def _receive(self, path, length):
+        """把请求体逐块写入文件（path 为 None 时丢弃），返回实际收到的字节数"""
+        received = 0
+        with open(path, "wb") if path else nullcontext() as out:
+            while received < length:
+                chunk = self.rfile.read(min(CHUNK_SIZE, length - received))
+                if not chunk:
+                    break
+                if out:
+                    out.write(chunk)
+                received += len(chunk)
+        if received < length:
+            self.close_connection = True
+        return received
+
+    def do_DELETE(self):
+        route = self._route()
+        if route is None or route[0] is None or route[1] is not None:
+            return self._send_error(HTTPStatus.NOT_FOUND, "没有这个接口")
+        try:
+            self.server.jobs.delete(route[0])
+        except KeyError:
+            return self._send_error(HTTPStatus.NOT_FOUND, "任务不存在")
+        except ValueError as e:
+            return self._send_error(HTTPStatus.CONFLICT, str(e))
+        self._send_json(HTTPStatus.OK, {"deleted": route[0]})
+
+
+def make_server(jobs, host=DEFAULT_HOST, port=DEFAULT_PORT, max_upload=DEFAULT_MAX_UPLOAD):
+    """创建 HTTP 服务（尚未开始监听循环，调用 serve_forever 开始），port 为 0 时自动选择端口"""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.jobs = jobs
+    server.max_upload = max_upload
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="对方科目处理器（服务模式）")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="监听地址，默认只接受本机访问；供局域网使用时填 0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--work-dir", default="counterparty_jobs", help="保存上传文件和处理结果的目录")
+    parser.add_argument("--workers", type=int, help="并行进程数，默认CPU核数")
+    parser.add_argument("--max-pending", type=int,
+                        help="处理中和排队的任务上限，超出时拒绝新任务，默认为进程数的 2 倍")
+    parser.add_argument("--max-upload", type=int, default=DEFAULT_MAX_UPLOAD >> 20,
+                        help="单个文件大小上限（MB）")
+    parser.add_argument("--retention", type=float, default=DEFAULT_RETENTION / 3600,
+                        help="已结束的任务及其文件保留多少小时")
+    parser.add_argument("--cache", action="store_true",
+                        help="缓存解析结果，同一文件换参数重新处理时跳过 Excel 解析")
+    parser.add_argument("--cache-dir", help="解析缓存目录（指定后自动启用缓存），默认在用户缓存目录下")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE >> 20,
+                        help="解析缓存大小上限（MB），超出时淘汰最久未用的文件")
+    parser.add_argument("--verbose", action="store_true", help="每个任务完成时向标准错误输出一行 JSON 统计")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(message)s", stream=sys.stderr)
+    cache = None
+    if args.cache or args.cache_dir:
+        cache = ParseCache(args.cache_dir, args.cache_size << 20)
+    try:
+        jobs = JobQueue(args.work_dir, args.workers, args.max_pending, cache,
+                        retention=args.retention * 3600)
+        server = make_server(jobs, args.host, args.port, args.max_upload << 20)
+    except (OSError, ValueError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+
+    host, port = server.server_address[:2]
+    print(f"服务已启动：http://{host}:{port}/（Ctrl+C 退出）", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        jobs.close()
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""监视模式：常驻运行，处理放入共享文件夹的新账套
+
+按间隔轮询目录（共享盘上文件系统通知并不可靠），文件大小和修改时间连续 settle 秒
+不变、且能以读方式打开时才认为已写完。处理交给常驻的预热进程池，每个文件只花处理本身的时间；
+已处理过的文件由输出目录下的增量清单跳过，重启后也不会重复处理。
+"""
+
+import logging
+import os
+import time
+
+import processor
+
+
+logger = logging.getLogger("counterparty")
+
+DEFAULT_INTERVAL = 2.0  # 秒
+DEFAULT_SETTLE = 3.0  # 秒
+
+
+class FolderWatcher:
+    """轮询目录，返回已经写完、且自上次返回后有变化的 Excel 文件"""
+
+    def __init__(self, folder, settle=DEFAULT_SETTLE):
+        self.folder = folder
+        self.settle = settle
+        self._pending = {}  # 文件 -> ((大小, 修改时间), 最近一次变化的时刻)
+        self._handed = {}  # 文件 -> 交出处理时的 (大小, 修改时间)
+
+    def poll(self, now=None):
+        """检查一次目录，返回可以处理的文件列表"""
+        now = time.monotonic() if now is None else now
+        ready = []
+        current = set()
+        for file_path in processor.collect_files(self.folder):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            current.add(file_path)
+            if self._handed.get(file_path) == signature:
+                continue
+            previous = self._pending.get(file_path)
+            if previous is None or previous[0] != signature:
+                self._pending[file_path] = (signature, now)
+                continue
+            if now - previous[1] >= self.settle and _readable(file_path):
+                del self._pending[file_path]
+                self._handed[file_path] = signature
+                ready.append(file_path)
+        # 被删除或改名的文件不再跟踪
+        for file_path in list(self._pending):
+            if file_path not in current:
+                del self._pending[file_path]
+        for file_path in list(self._handed):
+            if file_path not in current:
+                del self._handed[file_path]
+        return ready
+
+
+def _readable(file_path):
+    """Windows 上仍在复制或被 Excel 占用的文件无法打开"""
+    try:
+        with open(file_path, "rb"):
+            return True
+    except OSError:
+        return False
+
+
+def watch(folder, params, mode, save_dir=None, streaming=False, workers=None, cache=None,
+          interval=DEFAULT_INTERVAL, settle=DEFAULT_SETTLE, should_stop=None, on_report=None,
+          trace_memory=False):
+    """监视 folder 并处理新放入或被更新的文件，直到 should_stop() 返回 True
+
+    每一批就绪的文件调用一次 processor.run，运行报告交给 on_report(report)。
+    参数不合法或目录不存在时抛出 ValueError / OSError；单个文件的错误只记录在报告中。
+    """
+    params = processor.normalize_params(params, mode)
+    if not os.path.isdir(folder):
+        raise OSError(f"目录不存在：{folder}")
+    watcher = FolderWatcher(folder, settle)
+    pool = processor.start_pool(workers)
+
+    def run(files):
+        return processor.run(files, params, mode, save_dir=save_dir, streaming=streaming, cache=cache,
+                             workers=workers, trace_memory=trace_memory, executor=pool)
+
+    try:
+        while not (should_stop and should_stop()):
+            ready = watcher.poll()
+            if ready:
+                reports = [run(ready)]
+                # 子进程异常退出（如内存不足被系统结束）：重建进程池，逐个文件重试，
+                # 仍然失败的文件只记录错误，文件再次变化时才会重新处理
+                crashed = processor.crashed_files(reports[0])
+                broken = bool(crashed)
+                for file_path in crashed:
+                    if broken:
+                        pool.shutdown(wait=False)
+                        pool = processor.start_pool(workers)
+                    reports.append(run([file_path]))
+                    broken = bool(processor.crashed_files(reports[-1]))
+                    if broken:
+                        logger.error("%s：%s", processor.CRASHED_ERROR, file_path)
+                if on_report:
+                    for report in reports:
+                        on_report(report)
+            time.sleep(interval)
+    finally:
+        pool.shutdown()
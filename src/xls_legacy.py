@@ -0,0 +1,170 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""旧版 .xls 账套：用 xlrd 读取一次，结果随全部单元格流式写入新的 .xlsx
+
+读取接口与 xlsx_package.WorkbookReader / SheetReader 相同，处理流程可以共用。
+输出逐行写出（见 xlsx_package.write_workbook），只保留单元格的值（日期仍为日期），
+不保留字体、列宽等格式。
+"""
+
+import xlrd
+
+from xlsx_package import target_columns, write_workbook
+
+
+_TEXT_TYPES = (xlrd.XL_CELL_TEXT, xlrd.XL_CELL_NUMBER)
+
+
+def _convert(cell_type, value, datemode):
+    """xlrd 单元格的值转为与 openpyxl 读取 xlsx 时一致的类型"""
+    if cell_type == xlrd.XL_CELL_NUMBER:
+        return int(value) if value.is_integer() else value
+    if cell_type == xlrd.XL_CELL_DATE:
+        try:
+            return xlrd.xldate_as_datetime(value, datemode)
+        except (OverflowError, ValueError, xlrd.xldate.XLDateError):
+            return "#VALUE!"
+    if cell_type == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    if cell_type == xlrd.XL_CELL_ERROR:
+        return xlrd.error_text_from_code.get(value, "#VALUE!")
+    if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+        return None
+    return value
+
+
+class XlsReader:
+    """只读打开 .xls，工作表在第一次读取时才解析"""
+
+    def __init__(self, src):
+        self.book = xlrd.open_workbook(src, on_demand=True, ragged_rows=True)
+        self.sheetnames = self.book.sheet_names()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.book.release_resources()
+
+    def sheet(self, sheet_name=None):
+        """工作表读取器，未指定时取第一个工作表"""
+        sheet_name = self.sheetnames[0] if sheet_name is None else sheet_name
+        if sheet_name not in self.sheetnames:
+            raise ValueError(f"工作表 {sheet_name} 不存在")
+        return XlsSheetReader(self, sheet_name)
+
+
+class XlsSheetReader:
+    """逐行读取一个工作表中指定的列"""
+
+    def __init__(self, book, sheet_name):
+        self.book = book
+        self.sheet_name = sheet_name
+        self._sheet = None
+
+    @property
+    def sheet(self):
+        if self._sheet is None:
+            self._sheet = self.book.book.sheet_by_name(self.sheet_name)
+        return self._sheet
+
+    def _cells(self, row_idx):
+        sheet = self.sheet
+        return sheet.row_types(row_idx), sheet.row_values(row_idx)
+
+    def header(self):
+        """第 1 行各列的值，没有第 1 行时为空元组"""
+        if self.sheet.nrows == 0:
+            return ()
+        datemode = self.book.book.datemode
+        types, values = self._cells(0)
+        header = [_convert(t, v, datemode) for t, v in zip(types, values)]
+        while header and header[-1] is None:
+            header.pop()
+        return tuple(header)
+
+    def max_column(self):
+        """工作表的最大列号（从 1 开始）"""
+        return self.sheet.ncols
+
+    def rows(self, positions, min_row=2):
+        """逐行产出指定列（从 0 开始的列位置）的值元组，从 min_row 行到最后一行"""
+        positions = list(positions)
+        sheet = self.sheet
+        datemode = self.book.book.datemode
+        for row_idx in range(min_row - 1, sheet.nrows):
+            types, values = self._cells(row_idx)
+            width = len(values)
+            yield tuple(_convert(types[pos], values[pos], datemode) if pos < width else None
+                        for pos in positions)
+
+    def all_rows(self):
+        """逐行产出整行的值列表（写出用：文本和数字原样保留）"""
+        sheet = self.sheet
+        datemode = self.book.book.datemode
+        for row_idx in range(sheet.nrows):
+            types, values = self._cells(row_idx)
+            for i, cell_type in enumerate(types):
+                if cell_type not in _TEXT_TYPES:
+                    values[i] = _convert(cell_type, values[i], datemode)
+            yield values
+
+
+def write_xlsx(book, dst, col_idx, header, sheet_values):
+    """把 .xls（XlsReader）的全部工作表写为 xlsx，并在目标工作表的第 col_idx 列写入结果
+
+    sheet_values 为 {工作表名: 结果}，结果从第 2 行开始依次写入，可以是迭代器；
+    第 1 行写入加粗居中的标题 header。同时写入多列时 col_idx、header 为等长的列表，
+    结果为各行取值的元组（同 xlsx_package.write_columns）。
+    """
+    columns, sheet_values = target_columns(col_idx, header, sheet_values)
+
+    def sheets():
+        for sheet_name in book.sheetnames:
+            rows = book.sheet(sheet_name).all_rows()
+            values = sheet_values.get(sheet_name)
+            if values is None:
+                yield sheet_name, rows, ()
+            else:
+                yield (sheet_name, _with_columns(rows, columns, values),
+                       [col_idx for col_idx, _ in columns])
+
+    write_workbook(dst, sheets(), date1904=book.book.datemode == 1)
+
+
+def _with_columns(rows, columns, values):
+    """在各行的目标列（从 1 开始）放入标题和结果，行不够长时补空"""
+    width = max(col_idx for col_idx, _ in columns)
+    empty = ("",) * len(columns)
+    headers = [header for _, header in columns]
+    values = iter(values)
+    row_num = 0
+    for row_num, row in enumerate(rows, start=1):
+        if len(row) < width:
+            row.extend([None] * (width - len(row)))
+        row_values = headers if row_num == 1 else next(values, empty)
+        for (col_idx, _), value in zip(columns, row_values):
+            row[col_idx - 1] = value if value != "" else None
+        yield row
+    if row_num == 0:
+        row = [None] * width
+        for col_idx, header in columns:
+            row[col_idx - 1] = header
+        yield row
@@ -0,0 +1,1006 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""直接操作 xlsx/xlsm 压缩包（不经过 Excel，也不经过 openpyxl 整体解析）"""
+
+import copy
+import datetime
+import io
+import posixpath
+import re
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, unescape
+
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE
+from openpyxl.reader.strings import read_string_table
+from openpyxl.styles.numbers import builtin_format_code, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import MAC_EPOCH, WINDOWS_EPOCH, from_excel, from_ISO8601, to_excel
+
+
+WORKBOOK_PART = "xl/workbook.xml"
+WORKBOOK_RELS_PART = "xl/_rels/workbook.xml.rels"
+STYLES_PART = "xl/styles.xml"
+CALC_CHAIN_PART = "xl/calcChain.xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+CHUNK_SIZE = 1 << 20
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+SHARED_STRINGS_REL = "/sharedStrings"
+SHARED_STRINGS_PART = "xl/sharedStrings.xml"
+SHARED_STRINGS_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+
+# 工作表 XML 中与筛选相关的片段，允许带命名空间前缀（如 x:autoFilter）
+_AUTOFILTER_RE = re.compile(
+    rb"<(?P<p>(?:\w+:)?)autoFilter\b(?:[^>]*?/>|.*?</(?P=p)autoFilter>)", re.S)
+_HIDDEN_ATTR_RE = re.compile(rb"\s+hidden=\"(?:1|true)\"")
+_FILTER_MODE_RE = re.compile(rb"(<(?:\w+:)?sheetPr\b[^>]*?)\s+filterMode=\"(?:1|true)\"")
+_FILTERED_RE = re.compile(rb"<(?:\w+:)?autoFilter\b|\sfilterMode=\"(?:1|true)\"")
+
+# 流式改写 sheetData 用到的片段
+_SHEET_DATA_OPEN_RE = re.compile(rb"<(?P<p>(?:\w+:)?)sheetData\b[^>]*?(?P<empty>/?)>")
+_SHEET_DATA_CLOSE_RE = re.compile(rb"\s*</(?:\w+:)?sheetData>")
+_ROW_RE = re.compile(
+    rb"(?P<ws>\s*)<(?P<p>(?:\w+:)?)row\b(?P<attrs>[^>]*?)(?:/>|>(?P<body>.*?)</(?P=p)row>)", re.S)
+_CELL_RE = re.compile(rb"<(?P<p>(?:\w+:)?)c\b(?P<attrs>[^>]*?)(?:/>|>.*?</(?P=p)c>)", re.S)
+_ROW_NUM_RE = re.compile(rb"\br=\"(\d+)\"")
+_CELL_REF_RE = re.compile(rb"\br=\"([A-Z]+)\d+\"")
+_STYLE_ATTR_RE = re.compile(rb"\bs=\"(\d+)\"")
+_SPANS_RE = re.compile(rb"\s+spans=\"(\d+):(\d+)\"")
+_ANY_SPANS_RE = re.compile(rb"\s+spans=\"[^\"]*\"")
+_DIMENSION_RE = re.compile(rb"(<(?:\w+:)?dimension\b[^>]*?\bref=\")([^\"]*)(\")")
+_REF_END_RE = re.compile(rb"([A-Z]+)(\d+)$")
+
+# 共享字符串表的根元素和条目
+_SST_OPEN_RE = re.compile(rb"<(?P<p>(?:\w+:)?)sst\b(?P<attrs>[^>]*?)(?P<empty>/?)>")
+_SST_CLOSE_RE = re.compile(rb"</(?:\w+:)?sst>\s*$")
+_SI_RE = re.compile(rb"<(?:\w+:)?si(?=[\s/>])")
+_COUNT_ATTR_RE = re.compile(rb"\b(count|uniqueCount)=\"(\d+)\"")
+
+# 读取单元格取值用到的片段
+_CELL_TYPE_RE = re.compile(rb"\bt=\"(\w+)\"")
+_VALUE_RE = re.compile(rb"<(?:\w+:)?v\b[^>/]*>([^<]*)</(?:\w+:)?v>")
+_INLINE_RE = re.compile(rb"<(?P<p>(?:\w+:)?)is>(?P<body>.*?)</(?P=p)is>", re.S)
+_PHONETIC_RE = re.compile(rb"<(?P<p>(?:\w+:)?)rPh\b.*?</(?P=p)rPh>", re.S)
+_TEXT_RE = re.compile(rb"<(?P<p>(?:\w+:)?)t\b[^>]*?(?:/>|>(?P<text>.*?)</(?P=p)t>)", re.S)
+_CHAR_REF_RE = re.compile(r"&#(x[0-9a-fA-F]+|\d+);")
+# Excel 保存的常见单元格形式，一次匹配取出样式、类型和值；其他形式走通用解析
+_PLAIN_CELL_RE = re.compile(
+    rb"<(?P<p>(?:\w+:)?)c r=\"[A-Z]+\d+\"(?: s=\"(?P<s>\d+)\")?(?: t=\"(?P<t>\w+)\")?>"
+    rb"(?:<(?P=p)f\b[^>]*?(?:/>|>[^<]*</(?P=p)f>))?<(?P=p)v>(?P<v>[^<]*)</(?P=p)v></(?P=p)c>")
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _workbook_rels(zf):
+    """工作簿关系：{关系 Id: (类型, 成员路径)}"""
+    rels = {}
+    for rel in ET.fromstring(zf.read(WORKBOOK_RELS_PART)):
+        target = rel.get("Target")
+        if target.startswith("/"):
+            target = target.lstrip("/")
+        else:
+            target = posixpath.normpath(posixpath.join("xl", target))
+        rels[rel.get("Id")] = (rel.get("Type", ""), target)
+    return rels
+
+
+def sheet_parts(zf):
+    """按工作簿顺序返回 [(工作表名, 工作表 XML 路径), ...]"""
+    rels = {rel_id: target for rel_id, (_, target) in _workbook_rels(zf).items()}
+
+    parts = []
+    for node in ET.fromstring(zf.read(WORKBOOK_PART)).iter():
+        if _local_name(node.tag) == "sheet":
+            rel_id = node.get(f"{{{REL_NS}}}id")
+            if rel_id is None:
+                # Strict OOXML 使用不同的关系命名空间
+                rel_id = next(v for k, v in node.attrib.items() if _local_name(k) == "id")
+            parts.append((node.get("name"), rels[rel_id]))
+    return parts
+
+
+def sheet_part_path(zf, sheet_name=None):
+    """返回工作表对应的 XML 路径，未指定时取第一个工作表"""
+    parts = sheet_parts(zf)
+    if not sheet_name:
+        return parts[0][1]
+    for name, path in parts:
+        if name == sheet_name:
+            return path
+    raise KeyError(f"工作表 {sheet_name} 不存在")
+
+
+def column_letter(col_idx):
+    """列序号转为列字母（1->'A'）"""
+    letters = ""
+    while col_idx:
+        col_idx, rem = divmod(col_idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _column_num(letters):
+    num = 0
+    for c in letters:
+        num = num * 26 + c - 64
+    return num
+
+
+def read_raw(zin, info):
+    """读取成员压缩后的原始字节，不解压"""
+    fp = zin.fp
+    fp.seek(info.header_offset)
+    header = fp.read(zipfile.sizeFileHeader)
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    fp.seek(info.header_offset + zipfile.sizeFileHeader + name_len + extra_len)
+    return fp.read(info.compress_size)
+
+
+def write_raw(zout, info, raw):
+    """把原始压缩字节原样写入新压缩包，省去解压和重新压缩"""
+    zinfo = copy.copy(info)
+    zinfo.flag_bits &= ~0x08  # 大小和 CRC 已知，不需要数据描述符
+    zinfo.header_offset = zout.fp.tell()
+    zout.fp.write(zinfo.FileHeader())
+    zout.fp.write(raw)
+    zout.filelist.append(zinfo)
+    zout.NameToInfo[zinfo.filename] = zinfo
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+
+class _ColumnPatcher:
+    """逐行改写工作表 XML：在目标列写入标题和对方科目
+
+    columns 为 [(列序号, 标题), ...]，values 逐行产出与之对应的取值元组。
+    """
+
+    def __init__(self, columns, values, header_style, clear_filters, strings, filtered=False):
+        self.col_idxs = [col_idx for col_idx, _ in columns]
+        self.letters = [column_letter(col_idx).encode() for col_idx in self.col_idxs]
+        self.headers = tuple(header for _, header in columns)
+        self.targets = set(self.col_idxs)
+        self.first_col = min(self.col_idxs)
+        self.last_col = max(self.col_idxs)
+        self.values = iter(values)
+        self.empty = ("",) * len(columns)
+        self.header_style = header_style
+        self.clear_filters = clear_filters
+        # 只有筛选隐藏的行才取消隐藏，手动隐藏和折叠的分组保持不变
+        self.unhide_rows = clear_filters and filtered
+        self.strings = strings
+        self.next_row = 2  # 下一个待取结果的行号
+        self.last_row = 0
+        self.header_written = False
+
+    def value_for(self, row_num):
+        """取该行的结果；没有 row 元素的空行其结果必然为空，直接跳过"""
+        values = self.empty
+        while self.next_row <= row_num:
+            values = next(self.values, self.empty)
+            self.next_row += 1
+        return values
+
+    def drain(self):
+        """消费剩余结果，让流式计算把整张表读完"""
+        for _ in self.values:
+            pass
+
+    def cell(self, prefix, letter, row_num, value, style=None):
+        """生成引用共享字符串的单元格"""
+        style = b' s="%s"' % style if style is not None else b""
+        return b'<%sc r="%s%d"%s t="s"><%sv>%d</%sv></%sc>' % (
+            prefix, letter, row_num, style, prefix, self.strings.ref(value), prefix, prefix)
+
+    def new_cells(self, prefix, row_num, values, style, kept_styles):
+        """该行要写入的单元格，按列排序：[(列序号, 单元格 XML), ...]"""
+        return sorted((col_idx, self.cell(prefix, letter, row_num, value,
+                                          style or kept_styles.get(col_idx)))
+                      for col_idx, letter, value in zip(self.col_idxs, self.letters, values) if value)
+
+    def head(self, xml):
+        """sheetData 之前的部分：扩展 dimension，取消筛选标记"""
+        def widen(m):
+            start, _, end = m.group(2).partition(b":")
+            end = _REF_END_RE.search(end or start)
+            if not end:
+                return m.group(0)
+            end_col = max(_column_num(end.group(1)), self.last_col)
+            return m.group(1) + start + b":" + column_letter(end_col).encode() + end.group(2) + m.group(3)
+
+        xml = _DIMENSION_RE.sub(widen, xml, count=1)
+        if self.clear_filters:
+            xml = _FILTER_MODE_RE.sub(rb"\1", xml)
+        return xml
+
+    def tail(self, xml):
+        """sheetData 之后的部分：去掉 autoFilter"""
+        if self.clear_filters:
+            xml = _AUTOFILTER_RE.sub(b"", xml)
+        return xml
+
+    def header_row(self, prefix):
+        self.header_written = True
+        cells = self.new_cells(prefix, 1, self.headers, self.header_style, {})
+        return (b"<" + prefix + b'row r="1">' + b"".join(cell for _, cell in cells)
+                + b"</" + prefix + b"row>")
+
+    def row(self, m):
+        prefix = m.group("p")
+        attrs = m.group("attrs")
+        body = m.group("body") or b""
+
+        num = _ROW_NUM_RE.search(attrs)
+        row_num = int(num.group(1)) if num else self.last_row + 1
+        self.last_row = row_num
+
+        out = b""
+        if row_num > 1 and not self.header_written:
+            out += self.header_row(prefix)
+
+        if row_num == 1:
+            self.header_written = True
+            values, style = self.headers, self.header_style
+        else:
+            values, style = self.value_for(row_num), None
+
+        if self.unhide_rows:
+            attrs = _HIDDEN_ATTR_RE.sub(b"", attrs)
+
+        body, kept_styles, at_end = self.patch_cells(prefix, body)
+        new_cells = self.new_cells(prefix, row_num, values, style, kept_styles)
+        if new_cells:
+            if at_end:
+                body += b"".join(cell for _, cell in new_cells)
+            else:
+                body = self.insert_cells(body, new_cells)
+            attrs = self.widen_spans(attrs)
+
+        return out + m.group("ws") + b"<" + prefix + b"row" + attrs + b">" + body + b"</" + prefix + b"row>"
+
+    def patch_cells(self, prefix, body):
+        """去掉目标列原有的单元格，返回 (新内容, {列序号: 原单元格样式}, 新单元格是否直接追加在末尾)"""
+        if not body.strip():
+            return body, {}, True
+        # 常见情况：目标列都在最后一个单元格之后，无需逐个解析
+        last = body.rfind(b"<" + prefix + b"c ")
+        ref = _CELL_REF_RE.search(body, last) if last >= 0 else None
+        if ref and _column_num(ref.group(1)) < self.first_col:
+            return body, {}, True
+
+        kept_styles = {}
+        pieces = []
+        col = 0
+        for cell in _CELL_RE.finditer(body):
+            ref = _CELL_REF_RE.search(cell.group("attrs"))
+            col = _column_num(ref.group(1)) if ref else col + 1
+            if col in self.targets:
+                style = _STYLE_ATTR_RE.search(cell.group("attrs"))
+                if style:
+                    kept_styles[col] = style.group(1)
+                continue
+            pieces.append(cell.group(0))
+        return b"".join(pieces), kept_styles, False
+
+    def insert_cells(self, body, new_cells):
+        """按列顺序插入新单元格（new_cells 已按列排序）"""
+        pieces = []
+        pending = iter(new_cells)
+        next_cell = next(pending, None)
+        col = 0
+        for cell in _CELL_RE.finditer(body):
+            ref = _CELL_REF_RE.search(cell.group("attrs"))
+            col = _column_num(ref.group(1)) if ref else col + 1
+            while next_cell is not None and next_cell[0] < col:
+                pieces.append(next_cell[1])
+                next_cell = next(pending, None)
+            pieces.append(cell.group(0))
+        while next_cell is not None:
+            pieces.append(next_cell[1])
+            next_cell = next(pending, None)
+        return b"".join(pieces)
+
+    def widen_spans(self, attrs):
+        spans = _SPANS_RE.search(attrs)
+        if spans:
+            low = min(int(spans.group(1)), self.first_col)
+            high = max(int(spans.group(2)), self.last_col)
+            return attrs[:spans.start()] + f' spans="{low}:{high}"'.encode() + attrs[spans.end():]
+        return _ANY_SPANS_RE.sub(b"", attrs)
+
+
+class _SharedStrings:
+    """写入结果时新增的共享字符串，接在原有 base 个条目之后；相同的字符串只占一个条目"""
+
+    def __init__(self, base):
+        self.base = base
+        self.index = {}
+        self.refs = 0
+
+    def ref(self, value):
+        """字符串在共享字符串表中的序号"""
+        self.refs += 1
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = self.base + len(self.index)
+        return idx
+
+    def items(self, prefix):
+        """新增条目的 XML"""
+        pieces = []
+        for value in self.index:
+            # 首尾空白需要 xml:space 保留
+            space = b' xml:space="preserve"' if value != value.strip() else b""
+            pieces.append(b"<%ssi><%st%s>%s</%st></%ssi>" % (
+                prefix, prefix, space, escape(value).encode("utf-8"), prefix, prefix))
+        return b"".join(pieces)
+
+
+def _count_shared_strings(zin, part):
+    """分块统计共享字符串表的条目数，不整体载入内存"""
+    count = 0
+    tail = b""
+    with zin.open(part) as src:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            data = tail + chunk
+            # 末尾可能截断一个标签，留到下一块再统计
+            cut = max(len(data) - 32, 0)
+            count += sum(1 for m in _SI_RE.finditer(data) if m.start() < cut)
+            tail = data[cut:]
+    return count + len(_SI_RE.findall(tail))
+
+
+def _write_shared_strings(src, dst, strings):
+    """复制原有共享字符串表并在末尾追加新条目，同时更新 count / uniqueCount"""
+    def counts(m):
+        added = strings.refs if m.group(1) == b"count" else len(strings.index)
+        return m.group(1) + b'="%d"' % (int(m.group(2)) + added)
+
+    buf = src.read(CHUNK_SIZE)
+    while True:
+        opening = _SST_OPEN_RE.search(buf)
+        chunk = b"" if opening else src.read(CHUNK_SIZE)
+        if opening or not chunk:
+            break
+        buf += chunk
+    if not opening:
+        raise ValueError("共享字符串表中没有 sst")
+    prefix = opening.group("p")
+    attrs = _COUNT_ATTR_RE.sub(counts, opening.group("attrs"))
+    if opening.group("empty"):
+        dst.write(buf[:opening.start()] + b"<" + prefix + b"sst" + attrs + b">"
+                  + strings.items(prefix) + b"</" + prefix + b"sst>" + buf[opening.end():])
+        return
+    dst.write(buf[:opening.start()] + b"<" + prefix + b"sst" + attrs + b">")
+    buf = buf[opening.end():]
+    # 始终留住末尾一段（结束标签可能跨块），读完后在结束标签前插入新条目
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+        buf += chunk
+        dst.write(buf[:-64])
+        buf = buf[-64:]
+    closing = _SST_CLOSE_RE.search(buf)
+    if not closing:
+        raise ValueError("共享字符串表不完整")
+    dst.write(buf[:closing.start()] + strings.items(prefix) + buf[closing.start():])
+
+
+def _is_filtered(src):
+    """工作表是否设置了筛选（有 autoFilter 或 filterMode）；autoFilter 在 sheetData 之后，需要先扫描一遍"""
+    tail = b""
+    for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+        data = tail + chunk
+        # 先做字节查找，只在可能命中时才用正则确认
+        if (b"autoFilter" in data or b"filterMode" in data) and _FILTERED_RE.search(data):
+            return True
+        tail = chunk[-64:]
+    return False
+
+
+def _patch_sheet(src, dst, patcher):
+    """分块读取工作表 XML，逐行改写后写出，内存只与单行大小有关"""
+    buf = b""
+    eof = False
+
+    def fill(data):
+        chunk = src.read(CHUNK_SIZE)
+        return data + chunk, not chunk
+
+    # sheetData 之前
+    while True:
+        opening = _SHEET_DATA_OPEN_RE.search(buf)
+        if opening or eof:
+            break
+        buf, eof = fill(buf)
+    if not opening:
+        raise ValueError("工作表 XML 中没有 sheetData")
+
+    # 逐行结果先攒成块再写，减少压缩调用次数
+    pending = []
+    pending_size = 0
+
+    prefix = opening.group("p")
+    dst.write(patcher.head(buf[:opening.start()]))
+    if opening.group("empty"):
+        dst.write(b"<" + prefix + b"sheetData>" + patcher.header_row(prefix)
+                  + b"</" + prefix + b"sheetData>")
+        buf = buf[opening.end():]
+    else:
+        dst.write(buf[opening.start():opening.end()])
+        pos = opening.end()
+        while True:
+            row = _ROW_RE.match(buf, pos)
+            if row:
+                piece = patcher.row(row)
+                pending.append(piece)
+                pending_size += len(piece)
+                if pending_size >= CHUNK_SIZE:
+                    dst.write(b"".join(pending))
+                    pending = []
+                    pending_size = 0
+                pos = row.end()
+                continue
+            closing = _SHEET_DATA_CLOSE_RE.match(buf, pos)
+            if closing:
+                dst.write(b"".join(pending))
+                if not patcher.header_written:
+                    dst.write(patcher.header_row(prefix))
+                buf = buf[pos:]
+                break
+            if eof:
+                raise ValueError("工作表 XML 不完整")
+            buf, eof = fill(buf[pos:])
+            pos = 0
+
+    # sheetData 之后的部分通常很小，整体处理
+    while not eof:
+        buf, eof = fill(buf)
+    dst.write(patcher.tail(buf))
+    patcher.drain()
+
+
+def add_header_style(styles_xml):
+    """在 styles.xml 中追加"加粗 + 居中"的单元格格式，返回 (新内容, 格式序号)"""
+    fonts = re.search(rb"<(?P<p>(?:\w+:)?)fonts\b[^>]*>(?P<body>.*?)</(?P=p)fonts>", styles_xml, re.S)
+    xfs = re.search(rb"<(?P<p>(?:\w+:)?)cellXfs\b[^>]*>(?P<body>.*?)</(?P=p)cellXfs>", styles_xml, re.S)
+    if not fonts or not xfs:
+        return styles_xml, None
+
+    p = fonts.group("p")
+    font_re = re.compile(rb"<" + p + rb"font\b[^>]*?(?:/>|>.*?</" + p + rb"font>)", re.S)
+    font_list = font_re.findall(fonts.group("body"))
+    base = font_list[0] if font_list else b"<" + p + b"font/>"
+    if base.endswith(b"/>"):
+        bold = base[:-2] + b"><" + p + b"b/></" + p + b"font>"
+    else:
+        head_end = base.index(b">") + 1
+        bold = base[:head_end] + b"<" + p + b"b/>" + base[head_end:]
+    font_id = len(font_list)
+
+    p = xfs.group("p")
+    xf_count = len(re.findall(rb"<" + p + rb"xf\b", xfs.group("body")))
+    new_xf = (b"<" + p + b'xf numFmtId="0" fontId="' + str(font_id).encode()
+              + b'" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1"><'
+              + p + b'alignment horizontal="center" vertical="center"/></' + p + b"xf>")
+
+    def append(match, new, count):
+        block = match.group(0)
+        close = block.rindex(b"</")
+        block = block[:close] + new + block[close:]
+        return re.sub(rb'\bcount="\d+"', b'count="' + str(count).encode() + b'"', block, count=1)
+
+    # 先改后面的 cellXfs，避免偏移失效
+    styles_xml = (styles_xml[:xfs.start()] + append(xfs, new_xf, xf_count + 1)
+                  + styles_xml[xfs.end():])
+    styles_xml = (styles_xml[:fonts.start()] + append(fonts, bold, font_id + 1)
+                  + styles_xml[fonts.end():])
+    return styles_xml, str(xf_count).encode()
+
+
+def _drop_calc_chain(content_types, rels):
+    """删除计算链引用；被覆盖的目标列可能原来是公式，交给 Excel 重建"""
+    content_types = re.sub(rb"<Override\b[^>]*?PartName=\"/xl/calcChain\.xml\"[^>]*/>", b"", content_types)
+    rels = re.sub(rb"<Relationship\b[^>]*?Target=\"[^\"]*calcChain\.xml\"[^>]*/>", b"", rels)
+    return content_types, rels
+
+
+def _add_shared_strings(zin, content_types, rels):
+    """工作簿没有共享字符串表时登记一个，返回 (新 [Content_Types].xml, 新关系, 新表的空 XML)"""
+    rel_types = [rel_type for rel_type, _ in _workbook_rels(zin).values()]
+    # 关系类型和命名空间沿用工作簿自身的写法（Transitional 或 Strict）
+    sheet_type = next((t for t in rel_types if t.endswith("/worksheet")), REL_NS + "/worksheet")
+    rel_type = sheet_type[:-len("/worksheet")] + SHARED_STRINGS_REL
+    ids = set(re.findall(rb"\bId=\"([^\"]*)\"", rels))
+    n = len(ids) + 1
+    while b"rId%d" % n in ids:
+        n += 1
+    relationship = b'<Relationship Id="rId%d" Type="%s" Target="sharedStrings.xml"/>' % (
+        n, rel_type.encode())
+    rels = re.sub(rb"(</(?:\w+:)?Relationships>)", lambda m: relationship + m.group(1), rels, count=1)
+    override = b'<Override PartName="/%s" ContentType="%s"/>' % (
+        SHARED_STRINGS_PART.encode(), SHARED_STRINGS_TYPE.encode())
+    content_types = re.sub(rb"(</(?:\w+:)?Types>)", lambda m: override + m.group(1), content_types,
+                           count=1)
+    main_ns = ET.fromstring(zin.read(WORKBOOK_PART)).tag[1:].split("}")[0]
+    empty = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+             b'<sst xmlns="%s" count="0" uniqueCount="0"/>' % main_ns.encode())
+    return content_types, rels, empty
+
+
+def target_columns(col_idx, header, sheet_values):
+    """统一为多列的形式：([(列序号, 标题), ...], {工作表名: 各行取值元组})"""
+    if isinstance(col_idx, int):
+        return [(col_idx, header)], {name: ((value,) for value in values)
+                                     for name, values in sheet_values.items()}
+    if len(set(col_idx)) != len(col_idx):
+        raise ValueError("目标列不能重复")
+    return list(zip(col_idx, header)), sheet_values
+
+
+def write_columns(src, dst, col_idx, header, sheet_values, clear_filters=True):
+    """把结果列写入一个或多个工作表，只改写这些工作表、styles.xml 和共享字符串表，
+    其余成员逐字节复制
+
+    sheet_values 为 {工作表名: 第 2 行起各行的值}，值可以是生成器（边读边写），
+    工作表名为 None 表示第一个工作表。写入的字符串追加到共享字符串表，相同的值只存一份。
+    同时写入多列时 col_idx、header 为等长的列表，各行的值为与之对应的元组。
+    clear_filters=True 时取消目标工作表的筛选，设置了筛选的工作表同时显示被筛选隐藏的行。
+    dst 为输出路径或文件对象。
+    """
+    columns, sheet_values = target_columns(col_idx, header, sheet_values)
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as zout:
+        names = zin.namelist()
+        parts = {sheet_part_path(zin, name): values for name, values in sheet_values.items()}
+
+        header_style = None
+        styles_xml = None
+        if STYLES_PART in names:
+            styles_xml, header_style = add_header_style(zin.read(STYLES_PART))
+
+        content_types = zin.read(CONTENT_TYPES_PART)
+        rels = zin.read(WORKBOOK_RELS_PART)
+        sst_part = next((target for rel_type, target in _workbook_rels(zin).values()
+                         if rel_type.endswith(SHARED_STRINGS_REL) and target in zin.NameToInfo), None)
+        new_sst = None
+        if sst_part is None:
+            content_types, rels, new_sst = _add_shared_strings(zin, content_types, rels)
+            sst_part = SHARED_STRINGS_PART
+            strings = _SharedStrings(0)
+        else:
+            strings = _SharedStrings(_count_shared_strings(zin, sst_part))
+        if CALC_CHAIN_PART in names:
+            content_types, rels = _drop_calc_chain(content_types, rels)
+
+        filtered = {}
+        if clear_filters:
+            for part in parts:
+                with zin.open(part) as sheet_src:
+                    filtered[part] = _is_filtered(sheet_src)
+        patchers = {part: _ColumnPatcher(columns, values, header_style, clear_filters, strings,
+                                         filtered.get(part, False))
+                    for part, values in parts.items()}
+
+        for info in zin.infolist():
+            name = info.filename
+            if name in patchers:
+                with zin.open(info) as sheet_src, zout.open(name, "w", force_zip64=True) as sheet_dst:
+                    _patch_sheet(sheet_src, sheet_dst, patchers[name])
+            elif name == STYLES_PART:
+                zout.writestr(name, styles_xml)
+            elif name in (CALC_CHAIN_PART, sst_part):
+                # 共享字符串表等所有工作表写完、新增的字符串确定后再写
+                continue
+            elif name == CONTENT_TYPES_PART:
+                zout.writestr(name, content_types)
+            elif name == WORKBOOK_RELS_PART:
+                zout.writestr(name, rels)
+            else:
+                write_raw(zout, info, read_raw(zin, info))
+
+        with (io.BytesIO(new_sst) if new_sst else zin.open(sst_part)) as sst_src, \
+                zout.open(sst_part, "w", force_zip64=True) as sst_dst:
+            _write_shared_strings(sst_src, sst_dst, strings)
+
+
+def write_column(src, dst, col_idx, header, values, sheet_name=None, clear_filters=True):
+    """把一列结果写入单个工作表，见 write_columns"""
+    write_columns(src, dst, col_idx, header, {sheet_name: values}, clear_filters)
+
+
+# 新建工作簿用到的固定部件
+_XML_DECL = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NS = b"http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_DOC_REL_NS = REL_NS.encode()
+_PACKAGE_REL_NS = b"http://schemas.openxmlformats.org/package/2006/relationships"
+_ROOT_RELS = (_XML_DECL + b'<Relationships xmlns="' + _PACKAGE_REL_NS + b'">'
+              b'<Relationship Id="rId1" Type="' + _DOC_REL_NS + b'/officeDocument" Target="xl/workbook.xml"/>'
+              b"</Relationships>")
+# 单元格格式：0 常规，1 日期，2 日期时间，3 加粗居中的标题
+_DATE_STYLE, _DATETIME_STYLE, _HEADER_STYLE = 1, 2, 3
+_NEW_STYLES = (
+    _XML_DECL + b'<styleSheet xmlns="' + _MAIN_NS + b'">'
+    b'<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    b'<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    b'<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    b'<fill><patternFill patternType="gray125"/></fill></fills>'
+    b'<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    b'<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    b'<cellXfs count="4"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    b'<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    b'<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    b'<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+    b'<alignment horizontal="center" vertical="center"/></xf></cellXfs>'
+    b'<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    b"</styleSheet>")
+_NEW_CONTENT_TYPES = {
+    "xl/workbook.xml": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml",
+    "xl/styles.xml": "application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml",
+    SHARED_STRINGS_PART: SHARED_STRINGS_TYPE,
+}
+_WORKSHEET_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+_ROWS_PER_WRITE = 1000
+
+
+class _SheetWriter:
+    """逐行生成新工作表的 sheetData，字符串写入共享字符串表"""
+
+    def __init__(self, strings, epoch, header_cols):
+        self.strings = strings
+        self.epoch = epoch
+        self.header_cols = header_cols
+        self.letters = []
+
+    def cell(self, ref, value, row_num, col):
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            if value in ERROR_CODES:
+                return f'<c r="{ref}" t="e"><v>{value}</v></c>'
+            style = f' s="{_HEADER_STYLE}"' if row_num == 1 and col in self.header_cols else ""
+            return f'<c r="{ref}"{style} t="s"><v>{self.strings.ref(value)}</v></c>'
+        if isinstance(value, bool):
+            return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+        if isinstance(value, (int, float)):
+            return f'<c r="{ref}"><v>{value!r}</v></c>'
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            serial = to_excel(value, self.epoch)
+            style = _DATE_STYLE if float(serial).is_integer() else _DATETIME_STYLE
+            return f'<c r="{ref}" s="{style}"><v>{serial!r}</v></c>'
+        return f'<c r="{ref}" t="s"><v>{self.strings.ref(str(value))}</v></c>'
+
+    def row(self, row_num, values):
+        """一行的 XML，整行为空时返回空字符串"""
+        while len(self.letters) < len(values):
+            self.letters.append(column_letter(len(self.letters) + 1))
+        cells = "".join(self.cell(f"{letter}{row_num}", value, row_num, col)
+                        for col, (letter, value) in enumerate(zip(self.letters, values), start=1)
+                        if value is not None)
+        return f'<row r="{row_num}">{cells}</row>' if cells else ""
+
+
+def _new_shared_strings(strings):
+    """新建工作簿的共享字符串表；去掉 XML 不允许的控制字符"""
+    items = strings.items(b"")
+    if ILLEGAL_CHARACTERS_RE.search(items.decode("utf-8")):
+        items = ILLEGAL_CHARACTERS_RE.sub("", items.decode("utf-8")).encode("utf-8")
+    return (_XML_DECL + b'<sst xmlns="' + _MAIN_NS + b'" count="%d" uniqueCount="%d">'
+            % (strings.refs, len(strings.index)) + items + b"</sst>")
+
+
+def write_workbook(dst, sheets, date1904=False):
+    """新建只含单元格值的 xlsx，不经过 openpyxl（只写模式在没有 lxml 时逐个单元格生成 XML，很慢）
+
+    sheets 为 [(工作表名, 行, 标题列), ...]，行为从第 1 行起各行的值列表，可以是生成器；
+    值可以是 None、字符串、数字、布尔值和日期，与 Excel 错误值同名的字符串写为错误值。
+    标题列为列序号（从 1 开始）的集合，这些列第 1 行的单元格加粗居中。dst 为输出路径或文件对象。
+    """
+    strings = _SharedStrings(0)
+    epoch = MAC_EPOCH if date1904 else WINDOWS_EPOCH
+    names = []
+    with zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as zout:
+        for idx, (name, rows, header_cols) in enumerate(sheets, start=1):
+            names.append(name)
+            writer = _SheetWriter(strings, epoch, set(header_cols))
+            with zout.open(f"xl/worksheets/sheet{idx}.xml", "w", force_zip64=True) as out:
+                out.write(_XML_DECL + b'<worksheet xmlns="' + _MAIN_NS + b'"><sheetData>')
+                pieces = []
+                for row_num, values in enumerate(rows, start=1):
+                    pieces.append(writer.row(row_num, values))
+                    if len(pieces) == _ROWS_PER_WRITE:
+                        out.write("".join(pieces).encode("utf-8"))
+                        pieces = []
+                out.write(("".join(pieces) + "</sheetData></worksheet>").encode("utf-8"))
+
+        sheet_entries = "".join(
+            '<sheet name="%s" sheetId="%d" r:id="rId%d"/>' % (escape(name, {'"': "&quot;"}), i, i)
+            for i, name in enumerate(names, start=1))
+        zout.writestr("xl/workbook.xml", _XML_DECL + (
+            '<workbook xmlns="%s" xmlns:r="%s">%s<sheets>%s</sheets></workbook>' % (
+                _MAIN_NS.decode(), REL_NS, '<workbookPr date1904="1"/>' if date1904 else "",
+                sheet_entries)).encode("utf-8"))
+        n = len(names)
+        rels = "".join('<Relationship Id="rId%d" Type="%s/worksheet" Target="worksheets/sheet%d.xml"/>'
+                       % (i, REL_NS, i) for i in range(1, n + 1))
+        rels += ('<Relationship Id="rId%d" Type="%s/styles" Target="styles.xml"/>'
+                 '<Relationship Id="rId%d" Type="%s%s" Target="sharedStrings.xml"/>'
+                 % (n + 1, REL_NS, n + 2, REL_NS, SHARED_STRINGS_REL))
+        zout.writestr(WORKBOOK_RELS_PART, _XML_DECL + (
+            '<Relationships xmlns="%s">%s</Relationships>' % (
+                _PACKAGE_REL_NS.decode(), rels)).encode("utf-8"))
+        zout.writestr(STYLES_PART, _NEW_STYLES)
+        zout.writestr(SHARED_STRINGS_PART, _new_shared_strings(strings))
+        zout.writestr("_rels/.rels", _ROOT_RELS)
+
+        overrides = dict(_NEW_CONTENT_TYPES)
+        overrides.update({f"xl/worksheets/sheet{i}.xml": _WORKSHEET_TYPE for i in range(1, n + 1)})
+        zout.writestr(CONTENT_TYPES_PART, _XML_DECL + (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            + "".join('<Override PartName="/%s" ContentType="%s"/>' % item for item in overrides.items())
+            + "</Types>").encode("utf-8"))
+
+
+def _unescape(text):
+    """还原 XML 转义（包括数字字符引用）"""
+    if "&" not in text:
+        return text
+    text = _CHAR_REF_RE.sub(
+        lambda m: chr(int(m.group(1)[1:], 16) if m.group(1)[0] == "x" else int(m.group(1))), text)
+    return unescape(text, {"&quot;": '"', "&apos;": "'"})
+
+
+def _text_content(xml):
+    """富文本/内联字符串的纯文本：拼接各段 <t>，不含拼音注释 <rPh>"""
+    xml = _PHONETIC_RE.sub(b"", xml)
+    return _unescape(b"".join(m.group("text") or b"" for m in _TEXT_RE.finditer(xml)).decode("utf-8"))
+
+
+def _cast_number(value):
+    # 与 openpyxl 一致：带小数点或指数的为浮点数，否则为整数
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+class WorkbookReader:
+    """只读打开 xlsx/xlsm，按列投影读取工作表
+
+    与 openpyxl 只读模式得到的值一致（数字、共享字符串、日期格式转为 datetime 等），
+    但只解码需要的列，其余单元格只做字符串查找；公式单元格取 Excel 保存的计算结果。
+    共享字符串表和日期格式在第一次用到时才读取。
+    """
+
+    def __init__(self, src):
+        self.zf = zipfile.ZipFile(src)
+        self._rels = _workbook_rels(self.zf)
+        self._parts = dict(sheet_parts(self.zf))
+        self.sheetnames = list(self._parts)
+        self._shared_strings = None
+        self._date_styles = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.zf.close()
+
+    @property
+    def shared_strings(self):
+        if self._shared_strings is None:
+            self._shared_strings = []
+            for rel_type, target in self._rels.values():
+                if rel_type.endswith(SHARED_STRINGS_REL) and target in self.zf.NameToInfo:
+                    with self.zf.open(target) as f:
+                        self._shared_strings = read_string_table(f)
+                    break
+        return self._shared_strings
+
+    @property
+    def date_styles(self):
+        """(日期格式的样式序号集合, 时长格式的样式序号集合, 日期起点)"""
+        if self._date_styles is None:
+            dates, timedeltas = set(), set()
+            if STYLES_PART in self.zf.NameToInfo:
+                styles = ET.fromstring(self.zf.read(STYLES_PART))
+                custom = {}
+                xfs = []
+                for node in styles:
+                    if _local_name(node.tag) == "numFmts":
+                        custom = {int(fmt.get("numFmtId")): fmt.get("formatCode") for fmt in node}
+                    elif _local_name(node.tag) == "cellXfs":
+                        xfs = [int(xf.get("numFmtId", 0)) for xf in node]
+                for idx, fmt_id in enumerate(xfs):
+                    fmt = custom[fmt_id] if fmt_id in custom else builtin_format_code(fmt_id)
+                    if is_date_format(fmt):
+                        dates.add(idx)
+                    if is_timedelta_format(fmt):
+                        timedeltas.add(idx)
+            epoch = WINDOWS_EPOCH
+            for node in ET.fromstring(self.zf.read(WORKBOOK_PART)):
+                if _local_name(node.tag) == "workbookPr" and node.get("date1904") in ("1", "true"):
+                    epoch = MAC_EPOCH
+            self._date_styles = (dates, timedeltas, epoch)
+        return self._date_styles
+
+    def sheet(self, sheet_name=None):
+        """工作表读取器，未指定时取第一个工作表"""
+        return SheetReader(self, sheet_part_path(self.zf, sheet_name))
+
+
+class SheetReader:
+    """逐行读取一个工作表中指定的列"""
+
+    def __init__(self, book, part):
+        self.book = book
+        self.part = part
+
+    def _iter_rows(self):
+        """逐行产出 (行号, 命名空间前缀, 行内容)，行号缺省时按顺序递增"""
+        with self.book.zf.open(self.part) as src:
+            buf = b""
+            eof = False
+            while True:
+                opening = _SHEET_DATA_OPEN_RE.search(buf)
+                if opening or eof:
+                    break
+                chunk = src.read(CHUNK_SIZE)
+                buf, eof = buf + chunk, not chunk
+            if not opening or opening.group("empty"):
+                return
+
+            prefix = opening.group("p")
+            pos = opening.end()
+            row_num = 0
+            while True:
+                row = _ROW_RE.match(buf, pos)
+                if row:
+                    num = _ROW_NUM_RE.search(row.group("attrs"))
+                    row_num = int(num.group(1)) if num else row_num + 1
+                    yield row_num, prefix, row.group("body") or b""
+                    pos = row.end()
+                    continue
+                if _SHEET_DATA_CLOSE_RE.match(buf, pos) or eof:
+                    return
+                chunk = src.read(CHUNK_SIZE)
+                buf, eof = buf[pos:] + chunk, not chunk
+                pos = 0
+
+    def _cell_at(self, body, start):
+        """解析从 start 开始的单元格的值"""
+        plain = _PLAIN_CELL_RE.match(body, start)
+        if plain:
+            value = plain.group("v")
+            return self._convert(plain.group("t") or b"n", value, plain.group("s")) if value else None
+        return self._value(_CELL_RE.match(body, start))
+
+    def _value(self, cell):
+        """单元格的值，规则与 openpyxl 只读模式相同（公式取缓存的计算结果）"""
+        attrs = cell.group("attrs")
+        data_type = _CELL_TYPE_RE.search(attrs)
+        data_type = data_type.group(1) if data_type else b"n"
+        xml = cell.group(0)
+
+        if data_type == b"inlineStr":
+            inline = _INLINE_RE.search(xml)
+            return _text_content(inline.group("body")) if inline else None
+        value = _VALUE_RE.search(xml)
+        if not value or not value.group(1):
+            return None
+        style = _STYLE_ATTR_RE.search(attrs)
+        return self._convert(data_type, value.group(1), style.group(1) if style else None)
+
+    def _convert(self, data_type, value, style):
+        """按单元格类型转换 <v> 中的原始值"""
+        if data_type == b"n":
+            number = _cast_number(value.decode("ascii"))
+            if style:
+                dates, timedeltas, epoch = self.book.date_styles
+                style = int(style)
+                if style in dates:
+                    try:
+                        return from_excel(number, epoch, timedelta=style in timedeltas)
+                    except (OverflowError, ValueError):
+                        return "#VALUE!"
+            return number
+        if data_type == b"s":
+            return self.book.shared_strings[int(value)]
+        if data_type == b"b":
+            return bool(int(value))
+        text = _unescape(value.decode("utf-8"))
+        if data_type == b"d":
+            return from_ISO8601(text)
+        return text
+
+    def _all_cells(self, body):
+        """行内所有单元格：{列序号(从 1 开始): 单元格匹配}"""
+        cells = {}
+        col = 0
+        for cell in _CELL_RE.finditer(body):
+            ref = _CELL_REF_RE.search(cell.group("attrs"))
+            col = _column_num(ref.group(1)) if ref else col + 1
+            cells[col] = cell
+        return cells
+
+    def header(self):
+        """第 1 行各列的值（到最后一个单元格为止），没有第 1 行时为空元组"""
+        for row_num, _, body in self._iter_rows():
+            if row_num != 1:
+                break
+            cells = self._all_cells(body)
+            return tuple(self._value(cells[col]) if col in cells else None
+                         for col in range(1, max(cells, default=0) + 1))
+        return ()
+
+    def max_column(self):
+        """工作表的最大列号（从 1 开始）：取 dimension 的范围，没有 dimension 时逐行查找"""
+        with self.book.zf.open(self.part) as src:
+            buf = b""
+            while not _SHEET_DATA_OPEN_RE.search(buf):
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                buf += chunk
+        dimension = _DIMENSION_RE.search(buf)
+        if dimension:
+            start, _, end = dimension.group(2).partition(b":")
+            end = _REF_END_RE.search(end or start)
+            if end:
+                return _column_num(end.group(1))
+        return max((max(self._all_cells(body), default=0) for _, _, body in self._iter_rows()),
+                   default=0)
+
+    def rows(self, positions, min_row=2):
+        """逐行产出指定列（从 0 开始的列位置）的值元组
+
+        从 min_row 行到最后一行，中间缺失的行产出全为 None 的元组（与 openpyxl 只读模式一致）。
+        """
+        positions = list(positions)
+        letters = [column_letter(pos + 1).encode() for pos in positions]
+        empty = (None,) * len(positions)
+        next_row = min_row
+        needles = {}
+        for row_num, prefix, body in self._iter_rows():
+            if row_num < next_row:
+                continue
+            while next_row < row_num:
+                yield empty
+                next_row += 1
+            next_row += 1
+
+            if prefix not in needles:
+                open_tag = b"<" + prefix + b"c"
+                needles[prefix] = (open_tag + b' r="', open_tag + b" ", open_tag + b">",
+                                   [open_tag + b' r="' + letter for letter in letters])
+            open_ref, open_attrs, open_bare, cell_refs = needles[prefix]
+            tagged = body.count(open_ref)
+            if tagged and tagged == body.count(open_attrs) + body.count(open_bare):
+                # 常见情况：每个单元格都以 r 属性开头，直接按单元格引用查找
+                row_ref = str(row_num).encode() + b'"'
+                values = []
+                for cell_ref in cell_refs:
+                    start = body.find(cell_ref + row_ref)
+                    values.append(self._cell_at(body, start) if start >= 0 else None)
+                yield tuple(values)
+            else:
+                cells = self._all_cells(body)
+                yield tuple(self._value(cells[pos + 1]) if pos + 1 in cells else None
+                            for pos in positions)
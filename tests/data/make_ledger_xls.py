@@ -0,0 +1,69 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""生成 tests/data/ledger.xls（需要 xlwt，处理器本身不依赖它）：
+
+    pip install xlwt
+    python tests/data/make_ledger_xls.py
+
+三个工作表：序时账、二月（借贷分离的账套，含日期、浮点凭证号、空行、参差不齐的行）
+和 说明（只有文字，不参与处理）。
+"""
+
+import datetime
+import os
+
+import xlwt
+
+HEADER = ["日期", "凭证字号", "科目", "借方", "贷方"]
+SHEETS = {
+    "序时账": [
+        [datetime.date(2024, 1, 5), 1.0, "管理费用", 100, None],
+        [datetime.date(2024, 1, 5), 1, "银行存款", None, 100],
+        [],
+        [datetime.date(2024, 1, 6), "记-2", "应收账款", 50.5, None, None, "备注"],
+        [datetime.date(2024, 1, 6), "记-2 ", "主营业务收入", None, 50.5, True],
+    ],
+    "二月": [
+        [datetime.datetime(2024, 2, 1, 9, 30), "记-1", "应付账款", 30, None],
+        [datetime.datetime(2024, 2, 1, 9, 30), "记-1", "银行存款", None, 30],
+    ],
+}
+
+
+def main():
+    book = xlwt.Workbook(encoding="utf-8")
+    date_style = xlwt.easyxf(num_format_str="YYYY-MM-DD")
+    time_style = xlwt.easyxf(num_format_str="YYYY-MM-DD HH:MM")
+    for name, rows in SHEETS.items():
+        sheet = book.add_sheet(name)
+        for col, value in enumerate(HEADER):
+            sheet.write(0, col, value)
+        for row_idx, row in enumerate(rows, start=1):
+            for col, value in enumerate(row):
+                if value is None:
+                    continue
+                if isinstance(value, datetime.datetime):
+                    sheet.write(row_idx, col, value, time_style)
+                elif isinstance(value, datetime.date):
+                    sheet.write(row_idx, col, value, date_style)
+                else:
+                    sheet.write(row_idx, col, value)
+    book.add_sheet("说明").write(0, 0, "测试用账套")
+    book.save(os.path.join(os.path.dirname(os.path.abspath(__file__)), "ledger.xls"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""跨文件合并凭证：分散在多个文件中的凭证与合并成一个文件处理的结果相同"""
+
+import random
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import processor
+from test_processor import PARAMS, random_rows, write_ledger
+
+
+def result_column(path):
+    ws = load_workbook(path).active
+    return [ws.cell(row, 5).value or "" for row in range(2, ws.max_row + 1)]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_voucher_split_across_files(tmp_path, workers):
+    first = write_ledger(tmp_path / "一月.xlsx", [["记-1", "管理费用", 100, None],
+                                                ["记-2", "应收账款", 50, None],
+                                                ["记-2", "主营业务收入", None, 50]])
+    second = write_ledger(tmp_path / "二月.xlsx", [["记-1", "银行存款", None, 60],
+                                                 ["记-1", "应付账款", None, 40]])
+    report = processor.run([first, second], PARAMS, "separate", workers=workers, cross_file=True)
+    assert report["summary"]["ok"] == 2
+    outputs = [record["output"] for record in report["files"]]
+    assert result_column(outputs[0]) == ["银行存款、应付账款", "主营业务收入", "应收账款"]
+    assert result_column(outputs[1]) == ["管理费用", "管理费用"]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_single_file(tmp_path, seed):
+    rows = random_rows(seed, n_vouchers=60, shuffle=True)
+    # 随机拆成三个文件，各文件内保持原来的先后顺序
+    rng = random.Random(seed)
+    parts = [[], [], []]
+    owners = [rng.randrange(3) for _ in rows]
+    for owner, row in zip(owners, rows):
+        parts[owner].append(row)
+    files = [write_ledger(tmp_path / f"part{i}.xlsx", part) for i, part in enumerate(parts)]
+    params = processor.normalize_params(PARAMS, "separate")
+    records, _ = processor.process_grouped(files, params, "separate", workers=1, partitions=3)
+
+    whole = processor.run([write_ledger(tmp_path / "whole.xlsx", [
+        row for part in parts for row in part])], PARAMS, "separate", workers=1)
+    expected = iter(result_column(whole["files"][0]["output"]))
+    for record, part in zip(records, parts):
+        assert record["status"] == "ok", record["error"]
+        assert result_column(record["output"]) == [next(expected) for _ in part]
+
+
+def test_failed_file_left_out(tmp_path):
+    first = write_ledger(tmp_path / "一月.xlsx", [["记-1", "管理费用", 100, None]])
+    broken = tmp_path / "损坏.xlsx"
+    broken.write_bytes(b"not a workbook")
+    # 没有贷方列的文件登记时报错
+    missing = str(tmp_path / "缺列.xlsx")
+    wb = Workbook()
+    wb.active.append(["凭证字号", "科目", "借方"])
+    wb.active.append(["记-1", "财务费用", 5])
+    wb.save(missing)
+    second = write_ledger(tmp_path / "二月.xlsx", [["记-1", "银行存款", None, 100]])
+    files = [first, str(broken), missing, second]
+
+    report = processor.run(files, PARAMS, "separate", workers=1, cross_file=True)
+    status = [record["status"] for record in report["files"]]
+    assert status == ["ok", "error", "error", "ok"]
+    assert result_column(report["files"][0]["output"]) == ["银行存款"]
+    assert result_column(report["files"][3]["output"]) == ["管理费用"]
@@ -0,0 +1,175 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""engine.compute_counterparty 与原界面中 groupby + iterrows 循环的差分测试
+
+原循环用 set 去重，科目顺序不确定，因此逐行按科目集合比较。
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import SEPARATOR, compute_counterparty, first_level_subject
+
+COLUMNS = ["凭证字号", "科目", "借方", "贷方"]
+TOGETHER_COLUMNS = ["凭证字号", "科目", "金额", "方向"]
+SEPARATE_PARAMS = {"voucher_col": "A", "subject_col": "B", "debit_col": "C", "credit_col": "D"}
+TOGETHER_PARAMS = {"voucher_col": "A", "subject_col": "B", "amount_col": "C", "direction_col": "D",
+                   "debit_flag": "借", "credit_flag": "贷", "credit_action": "保持原值"}
+
+VOUCHERS = [1, 1.0, 2.0, "2", " 3 ", "3", "记-4", "记-4 ", 5, "6.0", None]
+SUBJECTS = ["银行存款", "应收账款-甲公司", "应收账款-乙公司", "管理费用", "主营业务收入", "应交税费"]
+
+
+def _normalize_vouchers(df, voucher_col):
+    # 确保凭证字号列为字符串格式，并去掉 .0 后缀
+    # （原代码为 astype(str)；新版 pandas 的 astype(str) 保留空值，这里用 map(str) 保持当时的结果）
+    df[voucher_col] = df[voucher_col].map(str).apply(lambda x: x[:-2] if x.endswith('.0') else x)
+    df[voucher_col] = df[voucher_col].astype(str).str.strip()
+
+
+def baseline_separate(df, voucher_col, subject_col, debit_col, credit_col):
+    """原 process_separate_mode 中的计算部分"""
+    df = df.copy()
+    df[debit_col] = df[debit_col].fillna(0).astype(float)
+    df[credit_col] = df[credit_col].fillna(0).astype(float)
+    _normalize_vouchers(df, voucher_col)
+    result_list = [""] * len(df)
+    for voucher, group in df.groupby(voucher_col):
+        debit_subjects = []
+        credit_subjects = []
+        for index, row in group.iterrows():
+            if row[debit_col] > 0:
+                debit_subjects.append(row[subject_col])
+            elif row[credit_col] > 0:
+                credit_subjects.append(row[subject_col])
+        debit_subjects_str = "、".join(list(set(debit_subjects)))
+        credit_subjects_str = "、".join(list(set(credit_subjects)))
+        for index, row in group.iterrows():
+            if row[debit_col] > 0:
+                result_list[df.index.get_loc(index)] = credit_subjects_str
+            elif row[credit_col] > 0:
+                result_list[df.index.get_loc(index)] = debit_subjects_str
+    return result_list
+
+
+def baseline_together(df, voucher_col, subject_col, amount_col, direction_col, params):
+    """原 process_together_mode 中的计算部分"""
+    df = df.copy()
+    df[amount_col] = df[amount_col].fillna(0).astype(float)
+    _normalize_vouchers(df, voucher_col)
+    result_list = [""] * len(df)
+    for voucher, group in df.groupby(voucher_col):
+        debit_subjects = []
+        credit_subjects = []
+        for index, row in group.iterrows():
+            direction = row[direction_col]
+            if direction == params["debit_flag"]:
+                debit_subjects.append(row[subject_col])
+            elif direction == params["credit_flag"]:
+                credit_subjects.append(row[subject_col])
+        debit_subjects_str = "、".join(list(set(debit_subjects)))
+        credit_subjects_str = "、".join(list(set(credit_subjects)))
+        for index, row in group.iterrows():
+            direction = row[direction_col]
+            if direction == params["debit_flag"]:
+                result_list[df.index.get_loc(index)] = credit_subjects_str
+            elif direction == params["credit_flag"]:
+                result_list[df.index.get_loc(index)] = debit_subjects_str
+    return result_list
+
+
+def _amount(rng):
+    """随机金额：正数、0、负数或空单元格"""
+    return rng.choice([round(float(rng.uniform(1, 10000)), 2), 0, -50.0, None], p=[0.7, 0.1, 0.1, 0.1])
+
+
+def random_ledger(rng, n, mode):
+    """随机序时账：含整行空白、1.0 这样的浮点凭证号、借贷混合的行和重复科目"""
+    rows = []
+    for _ in range(n):
+        if rng.random() < 0.05:
+            rows.append([None, None, None, None])
+            continue
+        voucher = VOUCHERS[rng.integers(len(VOUCHERS))]
+        subject = SUBJECTS[rng.integers(len(SUBJECTS))]
+        if mode == "separate":
+            # 借贷两列都可能有值（借方优先）或都没有
+            rows.append([voucher, subject, _amount(rng), _amount(rng)])
+        else:
+            direction = ["借", "贷", "贷", "借", "", None, "其他"][rng.integers(7)]
+            rows.append([voucher, subject, _amount(rng), direction])
+    # 原循环读到的是对象列（openpyxl 的取值），保持相同的类型
+    return pd.DataFrame(rows, columns=COLUMNS if mode == "separate" else TOGETHER_COLUMNS,
+                        dtype=object)
+
+
+def assert_same(expected, actual):
+    assert len(expected) == len(actual)
+    for row, (want, got) in enumerate(zip(expected, actual)):
+        items = got.split(SEPARATOR)
+        assert len(items) == len(set(items)), f"第 {row} 行科目重复：{got}"
+        assert set(want.split(SEPARATOR)) == set(items), f"第 {row} 行：{want!r} != {got!r}"
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_separate_matches_baseline(seed):
+    rng = np.random.default_rng(seed)
+    df = random_ledger(rng, int(rng.integers(1, 300)), "separate")
+    expected = baseline_separate(df, *COLUMNS)
+    assert_same(expected, compute_counterparty(df, SEPARATE_PARAMS, "separate"))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_together_matches_baseline(seed):
+    rng = np.random.default_rng(seed)
+    df = random_ledger(rng, int(rng.integers(1, 300)), "together")
+    expected = baseline_together(df, *TOGETHER_COLUMNS, TOGETHER_PARAMS)
+    assert_same(expected, compute_counterparty(df, TOGETHER_PARAMS, "together"))
+
+
+def test_subjects_in_first_appearance_order():
+    df = pd.DataFrame([["1", "管理费用", 10, None], ["1", "银行存款", 10, None],
+                       ["1", "管理费用", 5, None], ["1", "应付账款", None, 25]],
+                      columns=COLUMNS, dtype=object)
+    result = compute_counterparty(df, SEPARATE_PARAMS, "separate")
+    assert result == ["应付账款", "应付账款", "应付账款", "管理费用、银行存款"]
+
+
+@pytest.mark.parametrize("subject, expected", [
+    # 纯编码：前 4 位；带点的编码取第一段
+    ("100201", "1002"),
+    ("1002", "1002"),
+    ("1122.01.03", "1122"),
+    (" 6602 ", "6602"),
+    # 编码加名称：取开头的编码
+    ("1002.01 银行存款", "1002"),
+    ("100201 银行存款-工商银行", "1002"),
+    ("1122-甲公司", "1122"),
+    ("2221_01 应交增值税", "2221"),
+    # 科目名：第一个分隔符之前（含全角）
+    ("应收账款-甲公司", "应收账款"),
+    ("管理费用_办公费", "管理费用"),
+    ("应付账款－乙公司", "应付账款"),
+    ("其他应付款＿押金", "其他应付款"),
+    ("应交税费 - 增值税", "应交税费"),
+    ("主营业务收入", "主营业务收入"),
+    # 以数字开头的科目名不是编码
+    ("1年内到期的非流动负债", "1年内到期的非流动负债"),
+    ("1年内到期的非流动负债-长期借款", "1年内到期的非流动负债"),
+])
+def test_first_level_subject(subject, expected):
+    assert first_level_subject(subject) == expected
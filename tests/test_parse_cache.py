@@ -0,0 +1,73 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""解析缓存：命中时不打开工作簿，结果与不使用缓存时一致"""
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import processor
+from parse_cache import ParseCache
+
+SEPARATE = {"voucher_col": "A", "subject_col": "B", "debit_col": "C", "credit_col": "D",
+            "target_col": "E", "sheet_name": "*"}
+TOGETHER = {"voucher_col": "A", "subject_col": "B", "amount_col": "C", "direction_col": "F",
+            "debit_flag": "借", "credit_flag": "贷", "target_col": "G", "sheet_name": "*"}
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    wb = Workbook()
+    for ws in (wb.active, wb.create_sheet("二月")):
+        ws.append(["凭证字号", "科目", "借方", "贷方", None, "方向"])
+        ws.append(["记-1", "管理费用", 100, None, None, "借"])
+        ws.append(["记-1", "银行存款", None, 100, None, "贷"])
+        ws.append(["记-2", "应收账款", 50, None, None, "借"])
+        ws.append(["记-2", "主营业务收入", None, 50, None, "贷"])
+    path = str(tmp_path / "账套.xlsx")
+    wb.save(path)
+    return path
+
+
+def sheet_values(path):
+    wb = load_workbook(path)
+    return {ws.title: [list(row) for row in ws.iter_rows(values_only=True)] for ws in wb}
+
+
+def run(path, params, mode, out_dir, cache=None):
+    params = processor.normalize_params(params, mode)
+    out_dir.mkdir()
+    return sheet_values(processor.process_file(path, params, mode, str(out_dir), cache=cache))
+
+
+def test_hit_skips_workbook(ledger, tmp_path, monkeypatch):
+    cache = ParseCache(str(tmp_path / "cache"))
+    expected = run(ledger, SEPARATE, "separate", tmp_path / "plain")
+    assert run(ledger, SEPARATE, "separate", tmp_path / "first", cache) == expected
+    assert cache.sheetnames(ledger) == ["Sheet", "二月"]
+
+    def no_open(file_path):
+        raise AssertionError("缓存命中时不应打开工作簿")
+
+    monkeypatch.setattr(processor, "open_book", no_open)
+    assert run(ledger, SEPARATE, "separate", tmp_path / "hit", cache) == expected
+
+
+def test_missing_columns_are_parsed(ledger, tmp_path):
+    cache = ParseCache(str(tmp_path / "cache"))
+    run(ledger, SEPARATE, "separate", tmp_path / "first", cache)
+    # 方向列未缓存：打开工作簿补充解析
+    expected = run(ledger, TOGETHER, "together", tmp_path / "plain")
+    assert run(ledger, TOGETHER, "together", tmp_path / "second", cache) == expected
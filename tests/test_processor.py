@@ -0,0 +1,285 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""processor：流式处理、批量处理、运行报告"""
+
+import json
+import multiprocessing
+import os
+import random
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import cli
+import engine
+import processor
+
+PARAMS = {"voucher_col": "A", "subject_col": "B", "debit_col": "C", "credit_col": "D",
+          "target_col": "E"}
+ROWS = [["记-1", "管理费用", 100, None], ["记-1", "银行存款", None, 100],
+        ["记-2", "应收账款", 50, None], ["记-2", "主营业务收入", None, 50]]
+
+# 替换 process_file 的模拟崩溃依赖 fork 启动的子进程继承父进程的内存
+needs_fork = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                                reason="需要 fork 启动子进程")
+
+
+SUBJECTS = ["银行存款", "应收账款-甲公司", "应收账款-乙公司", "管理费用-办公费", "主营业务收入"]
+
+
+def write_ledger(path, rows=ROWS):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["凭证字号", "科目", "借方", "贷方"])
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return str(path)
+
+
+def sheet_values(path):
+    wb = load_workbook(path)
+    return {ws.title: [list(row) for row in ws.iter_rows(values_only=True)] for ws in wb}
+
+
+def random_rows(seed, n_vouchers=40, shuffle=False):
+    """随机序时账各行；默认同一凭证的行连续，shuffle=True 时打乱（凭证不连续）"""
+    rng = random.Random(seed)
+    rows = []
+    for voucher in range(1, n_vouchers + 1):
+        for _ in range(rng.randint(1, 5)):
+            amount = round(rng.uniform(1, 1000), 2)
+            debit = rng.random() < 0.5
+            rows.append([f"记-{voucher}", rng.choice(SUBJECTS), amount if debit else None,
+                         None if debit else amount])
+        if rng.random() < 0.1:
+            rows.append([None, None, None, None])
+    if shuffle:
+        rng.shuffle(rows)
+    return rows
+
+
+def process(tmp_path, name, source, streaming, extra="", **params):
+    save_dir = tmp_path / name
+    save_dir.mkdir()
+    params = processor.normalize_params({**PARAMS, "extra_outputs": extra, **params}, "separate")
+    record = processor.process_one(source, params, "separate", str(save_dir), streaming)
+    assert record["status"] == "ok", record["error"]
+    return record, save_dir
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("credit_col", ["D", "4"])
+def test_columns_beyond_header(tmp_path, streaming, credit_col):
+    # 贷方列没有标题：列字母和列序号按工作表的最大列解析
+    source = str(tmp_path / "账套.xlsx")
+    wb = Workbook()
+    wb.active.append(["凭证字号", "科目", "借方"])
+    for row in ROWS:
+        wb.active.append(row)
+    wb.save(source)
+    record, _ = process(tmp_path, "out", source, streaming, extra="", credit_col=credit_col)
+    assert [row[4] for row in sheet_values(record["output"])["Sheet"]] == [
+        "对方科目", "银行存款", "管理费用", "主营业务收入", "应收账款"]
+
+    params = processor.normalize_params({**PARAMS, "credit_col": "贷方"}, "separate")
+    with pytest.raises(ValueError, match="以下列不存在于文件中：贷方"):
+        processor.read_ledger(source, params, "separate")
+    params = processor.normalize_params({**PARAMS, "credit_col": "F"}, "separate")
+    with pytest.raises(ValueError, match="以下列不存在于文件中：F"):
+        processor.read_ledger(source, params, "separate")
+
+
+def test_output_specs():
+    specs = processor.output_specs({"target_col": "H", "extra_outputs":
+                                    "I:一级科目， j：一级科目＋金额; 11=全称+amount"})
+    assert [(s["target_col"], s["col_idx"], s["header"], s["subjects"], s["with_amount"])
+            for s in specs] == [
+        ("H", 8, "对方科目", "full", False),
+        ("I", 9, "对方一级科目", "first_level", False),
+        ("J", 10, "对方一级科目及金额", "first_level", True),
+        ("11", 11, "对方科目及金额", "full", True),
+    ]
+    assert len(processor.output_specs({"target_col": "H", "extra_outputs": " , "})) == 1
+    assert len(processor.output_specs({"target_col": "H"})) == 1
+
+
+@pytest.mark.parametrize("extra, message", [
+    ("I", "附加输出格式应为"),
+    ("I:", "附加输出格式应为"),
+    ("I:二级科目", "形式无法识别"),
+    ("I:一级科目+", "形式无法识别"),
+    ("H:一级科目", "输出列重复：H"),
+    ("I:一级科目, 9:金额", "输出列重复：9"),
+])
+def test_output_specs_rejects(extra, message):
+    with pytest.raises(ValueError, match=message):
+        processor.output_specs({"target_col": "H", "extra_outputs": extra})
+
+
+@pytest.mark.parametrize("extra", ["", "F:一级科目, G:一级科目+金额"])
+def test_streaming_matches_in_memory(tmp_path, extra):
+    source = write_ledger(tmp_path / "账套.xlsx", random_rows(0))
+    streamed, _ = process(tmp_path, "stream", source, True, extra)
+    in_memory, _ = process(tmp_path, "memory", source, False, extra)
+    assert set(streamed["stages"]) == {"stream"}
+    assert sheet_values(streamed["output"]) == sheet_values(in_memory["output"])
+
+
+def test_unsorted_vouchers_fall_back(tmp_path):
+    source = write_ledger(tmp_path / "账套.xlsx", random_rows(1, shuffle=True))
+    streamed, save_dir = process(tmp_path, "stream", source, True)
+    in_memory, _ = process(tmp_path, "memory", source, False)
+    # 流式读到不连续的凭证后改为整表计算
+    assert {"stream", "compute"} <= set(streamed["stages"])
+    assert sheet_values(streamed["output"]) == sheet_values(in_memory["output"])
+    assert os.listdir(save_dir) == [os.path.basename(streamed["output"])]
+
+
+class CountingPool(processor.ComputePool):
+    """记录提交的分区任务数"""
+
+    submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        return super().submit(fn, *args)
+
+
+@pytest.mark.parametrize("extra", ["", "F:一级科目, G:一级科目+金额"])
+def test_partitioned_matches_serial(tmp_path, monkeypatch, extra):
+    source = write_ledger(tmp_path / "账套.xlsx", random_rows(2, n_vouchers=200, shuffle=True))
+    params = processor.normalize_params({**PARAMS, "extra_outputs": extra}, "separate")
+    df = pd.DataFrame(random_rows(3, n_vouchers=200), columns=["凭证字号", "科目", "借方", "贷方"],
+                      dtype=object)
+    serial = processor.compute_results(df, params, "separate")
+    serial_dir = tmp_path / "serial"
+    serial_dir.mkdir()
+    serial_output = processor.process_file(source, params, "separate", str(serial_dir))
+
+    monkeypatch.setattr(engine, "PARALLEL_MIN_ROWS", 1)
+    with CountingPool(2) as pool:
+        assert processor.compute_results(df, params, "separate", pool=pool) == serial
+        assert pool.submitted > 1
+    partitioned_dir = tmp_path / "partitioned"
+    partitioned_dir.mkdir()
+    output = processor.process_partitioned(2, source, params, "separate", str(partitioned_dir))
+    assert sheet_values(output) == sheet_values(serial_output)
+
+
+@pytest.fixture
+def crashing_file(monkeypatch):
+    """文件名含 crash 的文件在子进程中直接退出，模拟被系统结束"""
+    process_file = processor.process_file
+
+    def crash(file_path, *args, **kwargs):
+        if "crash" in os.path.basename(file_path):
+            os._exit(1)
+        return process_file(file_path, *args, **kwargs)
+
+    monkeypatch.setattr(processor, "process_file", crash)
+
+
+@needs_fork
+def test_crashed_worker_recorded_as_error(tmp_path, crashing_file):
+    files = [write_ledger(tmp_path / "crash.xlsx"), write_ledger(tmp_path / "ok.xlsx")]
+    report = processor.run(files, PARAMS, "separate", workers=2)
+    by_file = {record["file"]: record for record in report["files"]}
+    assert by_file[files[0]]["status"] == "error"
+    assert processor.crashed_files(report)[:1] == [files[0]]
+    # 同一进程池中的其他文件可能一并失败，但都有记录
+    assert report["summary"]["total"] == 2 and report["summary"]["error"] >= 1
+
+
+@needs_fork
+def test_cli_writes_report_when_worker_crashes(tmp_path, crashing_file):
+    config = tmp_path / "params.json"
+    config.write_text(json.dumps(PARAMS), encoding="utf-8")
+    report_path = tmp_path / "report.json"
+    files = [write_ledger(tmp_path / "crash.xlsx"), write_ledger(tmp_path / "ok.xlsx")]
+
+    assert cli.main(files + ["--config", str(config), "--workers", "2",
+                             "--report", str(report_path)]) == 1
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    assert report["files"][0]["error"].startswith(processor.CRASHED_ERROR)
+
+
+@needs_fork
+def test_broken_executor_fails_files_without_raising(tmp_path, crashing_file):
+    files = [write_ledger(tmp_path / "ok.xlsx")]
+    pool = processor.start_pool(2)
+    try:
+        processor.process_batch([write_ledger(tmp_path / "crash.xlsx")], processor.normalize_params(
+            PARAMS, "separate"), "separate", executor=pool)
+        # 进程池已损坏：提交时即失败
+        records = processor.process_batch(files, processor.normalize_params(PARAMS, "separate"),
+                                          "separate", executor=pool)
+    finally:
+        pool.shutdown()
+    assert records[0]["status"] == "error"
+    assert records[0]["error"].startswith(processor.CRASHED_ERROR)
+
+
+def statuses(report):
+    return [record["status"] for record in report["files"]]
+
+
+def test_manifest_skips_unchanged_files(tmp_path):
+    files = [write_ledger(tmp_path / "一月.xlsx"), write_ledger(tmp_path / "二月.xlsx")]
+    first = processor.run(files, PARAMS, "separate", workers=1)
+    assert statuses(first) == ["ok", "ok"]
+    assert os.path.exists(tmp_path / processor.MANIFEST_NAME)
+
+    second = processor.run(files, PARAMS, "separate", workers=1)
+    assert statuses(second) == ["skipped", "skipped"]
+    assert [r["output"] for r in second["files"]] == [os.path.abspath(r["output"])
+                                                      for r in first["files"]]
+    # 只改修改时间、内容不变时仍然跳过
+    os.utime(files[0], (0, 0))
+    assert statuses(processor.run(files, PARAMS, "separate", workers=1)) == ["skipped", "skipped"]
+    assert statuses(processor.run(files, PARAMS, "separate", workers=1, force=True)) == ["ok", "ok"]
+
+
+def test_manifest_invalidated_by_params_content_and_output(tmp_path):
+    files = [write_ledger(tmp_path / "一月.xlsx"), write_ledger(tmp_path / "二月.xlsx")]
+    report = processor.run(files, PARAMS, "separate", workers=1)
+
+    # 参数变化：全部重新处理；没有附加输出时与不带该参数的指纹相同
+    changed = {**PARAMS, "target_col": "F"}
+    assert statuses(processor.run(files, changed, "separate", workers=1)) == ["ok", "ok"]
+    assert statuses(processor.run(files, {**changed, "extra_outputs": ""}, "separate",
+                                  workers=1)) == ["skipped", "skipped"]
+
+    # 内容变化：只重新处理改过的文件
+    write_ledger(files[0], ROWS[:2])
+    assert statuses(processor.run(files, changed, "separate", workers=1)) == ["ok", "skipped"]
+
+    # 输出被删除：重新处理
+    os.remove(report["files"][1]["output"])
+    assert statuses(processor.run(files, changed, "separate", workers=1)) == ["skipped", "ok"]
+
+
+def test_manifest_cross_file_reprocesses_whole_batch(tmp_path):
+    files = [write_ledger(tmp_path / "一月.xlsx"), write_ledger(tmp_path / "二月.xlsx")]
+    processor.run(files, PARAMS, "separate", workers=1, cross_file=True)
+    assert statuses(processor.run(files, PARAMS, "separate", workers=1,
+                                  cross_file=True)) == ["skipped", "skipped"]
+    # 跨文件与单文件处理的结果不同，指纹也不同
+    assert statuses(processor.run(files, PARAMS, "separate", workers=1)) == ["ok", "ok"]
+    write_ledger(files[1], ROWS[:2])
+    assert statuses(processor.run(files, PARAMS, "separate", workers=1,
+                                  cross_file=True)) == ["ok", "ok"]
@@ -0,0 +1,154 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""服务模式：在本机的临时端口上启动服务，走一遍提交、状态、下载和拒绝新任务"""
+
+import io
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlencode
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import service
+
+PARAMS = {"mode": "separate", "voucher_col": "A", "subject_col": "B", "debit_col": "C",
+          "credit_col": "D", "target_col": "E"}
+
+
+def ledger_bytes():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["凭证字号", "科目", "借方", "贷方"])
+    ws.append(["记-1", "管理费用", 100, None])
+    ws.append(["记-1", "银行存款", None, 100])
+    ws.append(["记-2", "应收账款", 50, None])
+    ws.append(["记-2", "主营业务收入", None, 50])
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+@pytest.fixture
+def server(tmp_path):
+    jobs = service.JobQueue(str(tmp_path / "jobs"), workers=1, max_pending=1)
+    httpd = service.make_server(jobs, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    jobs.close()
+
+
+def call(url, method="GET", data=None):
+    request = urllib.request.Request(url, data=data, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def submit(base, data, **params):
+    return call(f"{base}/jobs?" + urlencode({**PARAMS, "filename": "账套.xlsx", **params}),
+                "POST", data)
+
+
+def wait_finished(base, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = json.loads(call(f"{base}/jobs/{job_id}")[2])
+        if status["status"] in service.FINISHED:
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"任务未在 {timeout} 秒内结束")
+
+
+def test_submit_status_result(server):
+    _, base = server
+    code, headers, body = submit(base, ledger_bytes())
+    assert code == 202
+    job_id = json.loads(body)["id"]
+    assert headers["Location"] == f"/jobs/{job_id}"
+
+    status = wait_finished(base, job_id)
+    assert status["status"] == "ok", status["error"]
+    assert status["rows"] == 4 and status["vouchers"] == 2
+    assert set(status["seconds"]) == {"queued", "processing", "total"}
+    assert "compute" in status["stages"]
+
+    code, headers, body = call(f"{base}{status['result']}")
+    assert code == 200
+    assert "attachment" in headers["Content-Disposition"]
+    ws = load_workbook(io.BytesIO(body)).active
+    assert [ws.cell(row, 5).value for row in range(1, 6)] == [
+        "对方科目", "银行存款", "管理费用", "主营业务收入", "应收账款"]
+
+    assert call(f"{base}/jobs/{job_id}", "DELETE")[0] == 200
+    assert call(f"{base}/jobs/{job_id}")[0] == 404
+
+
+def test_queue_full_returns_503(server):
+    httpd, base = server
+    # 占住唯一的名额（相当于另一个正在上传的任务）
+    held = httpd.jobs.reserve("占位.xlsx", PARAMS, "separate")
+    code, headers, body = submit(base, ledger_bytes())
+    assert code == 503
+    assert headers["Retry-After"] == str(service.RETRY_AFTER)
+    assert "上限" in json.loads(body)["error"]
+
+    httpd.jobs.discard(held["id"])
+    assert submit(base, ledger_bytes())[0] == 202
+
+
+def test_bad_params_return_400(server):
+    _, base = server
+    code, _, body = submit(base, ledger_bytes(), debit_col="")
+    assert code == 400
+    assert "debit_col" in json.loads(body)["error"]
+    assert submit(base, b"x", filename="账套.txt")[0] == 400
+    assert json.loads(call(f"{base}/jobs")[2]) == {"jobs": []}
+
+
+class _BrokenPool:
+    def submit(self, *args):
+        raise BrokenProcessPool("测试")
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def test_broken_pool_on_submit_fails_job_and_recovers(server):
+    httpd, base = server
+    httpd.jobs._pool.shutdown()
+    httpd.jobs._pool = _BrokenPool()
+    code, _, body = submit(base, ledger_bytes())
+    assert code == 202
+    status = wait_finished(base, json.loads(body)["id"])
+    assert status["status"] == "error" and "处理进程异常退出" in status["error"]
+
+    # 进程池在后台重建后继续接收任务
+    deadline = time.monotonic() + 60
+    while isinstance(httpd.jobs._pool, _BrokenPool) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    code, _, body = submit(base, ledger_bytes())
+    assert code == 202
+    assert wait_finished(base, json.loads(body)["id"])["status"] == "ok"
@@ -0,0 +1,41 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""界面启动时不载入处理组件（耗时见 benchmarks/bench_startup.py）"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SRC_DIR
+
+# 只在开始处理时才载入的模块
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "xlrd", "processor", "parse_cache"]
+
+CHILD = """
+import json, sys
+sys.path.insert(0, {src!r})
+import main
+print(json.dumps([m for m in {heavy!r} if m in sys.modules]))
+"""
+
+
+def test_import_main_skips_heavy_modules():
+    pytest.importorskip("tkinter")
+    code = CHILD.format(src=SRC_DIR, heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,97 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""".xls 账套：读取的值与转存的 xlsx 与原来 xlrd 读取、openpyxl 写出的结果一致
+
+tests/data/ledger.xls 由同目录的 make_ledger_xls.py 生成。
+"""
+
+import datetime
+import os
+
+import pytest
+import xlrd
+from openpyxl import load_workbook
+
+import processor
+from xls_legacy import XlsReader
+
+LEDGER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ledger.xls")
+PARAMS = {"voucher_col": "B", "subject_col": "C", "debit_col": "D", "credit_col": "E",
+          "target_col": "H", "sheet_name": "序时账, 二月"}
+RESULTS = {
+    "序时账": ["银行存款", "管理费用", None, "主营业务收入", "应收账款"],
+    "二月": ["银行存款", "应付账款"],
+}
+
+
+def old_values():
+    """原来的做法：xlrd 读出各单元格，日期转为 datetime，交给 openpyxl 写出"""
+    book = xlrd.open_workbook(LEDGER)
+    sheets = {}
+    for sheet in book.sheets():
+        rows = []
+        for row_idx in range(sheet.nrows):
+            row = []
+            for cell in sheet.row(row_idx):
+                if cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(xlrd.xldate_as_datetime(cell.value, book.datemode))
+                elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                    row.append(bool(cell.value))
+                elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    row.append(None)
+                else:
+                    row.append(cell.value)
+            rows.append(row)
+        sheets[sheet.name] = rows
+    return sheets
+
+
+def test_reader_values():
+    expected = old_values()["序时账"]
+    with XlsReader(LEDGER) as book:
+        assert book.sheetnames == ["序时账", "二月", "说明"]
+        sheet = book.sheet("序时账")
+        assert sheet.header() == ("日期", "凭证字号", "科目", "借方", "贷方")
+        assert sheet.max_column() == 7
+        rows = list(sheet.rows(range(7)))
+    assert rows == [tuple(row) for row in expected[1:]]
+    assert rows[0][:2] == (datetime.datetime(2024, 1, 5), 1)
+    assert isinstance(rows[0][1], int)
+    assert rows[2] == (None,) * 7 and rows[4][5] is True
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_convert_to_xlsx(tmp_path, streaming):
+    params = processor.normalize_params(PARAMS, "separate")
+    output = processor.process_file(LEDGER, params, "separate", str(tmp_path), streaming=streaming)
+    assert output == str(tmp_path / "ledger_处理后.xlsx")
+
+    wb = load_workbook(output)
+    assert wb.sheetnames == ["序时账", "二月", "说明"]
+    for name, rows in old_values().items():
+        ws = wb[name]
+        values = [list(row) for row in ws.iter_rows(values_only=True)]
+        if name in RESULTS:
+            # 目标列写入标题和结果，其余单元格与原来相同
+            assert [row[7] for row in values] == ["对方科目"] + RESULTS[name]
+            header = ws["H1"]
+            assert header.font.b and header.alignment.horizontal == "center"
+            values = [row[:7] for row in values]
+            rows = [row + [None] * (7 - len(row)) for row in rows]
+        assert values == rows
+    # 日期仍为日期格式
+    assert wb["序时账"]["A2"].is_date and wb["二月"]["A2"].value == datetime.datetime(2024, 2, 1, 9, 30)
+    assert wb["说明"].max_column == 1
@@ -0,0 +1,375 @@
+# Copyright 2023 agenius666
+# GitHub: https://github.com/agenius666/Counterparty-Account-Processor
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""xlsx_package 直接读写工作簿：与 openpyxl 读到的值一致，未改动的成员逐字节保留
+
+手工拼出的工作簿覆盖 openpyxl 不会生成的写法（内联字符串、没有共享字符串表、计算链、宏）。
+"""
+
+import datetime
+import os
+import zipfile
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import xlsx_package
+from xlsx_package import WorkbookReader, write_columns
+
+ROWS = [["凭证字号", "科目"], ["记-1", "管理费用"], ["记-1", "银行存款"], ["记-2", "应收账款"],
+        ["记-2", "主营业务收入"]]
+VALUES = ["银行存款", "管理费用", "主营业务收入", "应收账款"]
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+SML_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+
+# 样式 0 默认，1 斜体，2 日期（numFmtId 14）
+STYLES = (
+    f'<styleSheet xmlns="{MAIN_NS}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><i/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs><cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+ALWAYS_CHANGED = {"xl/worksheets/sheet1.xml", "xl/styles.xml", "xl/sharedStrings.xml"}
+REGISTRY = {"[Content_Types].xml", "xl/_rels/workbook.xml.rels"}
+
+
+def ledger_sheet(ws):
+    for row in ROWS:
+        ws.append(row)
+    return ws
+
+
+def hidden_rows(path):
+    ws = load_workbook(path).active
+    return {row for row, dim in ws.row_dimensions.items() if dim.hidden}
+
+
+def inline(ref, text, style=None):
+    style = f' s="{style}"' if style is not None else ""
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t>{text}</t></is></c>'
+
+
+def number(ref, value, style=None):
+    style = f' s="{style}"' if style is not None else ""
+    return f'<c r="{ref}"{style}><v>{value}</v></c>'
+
+
+def shared(ref, idx):
+    return f'<c r="{ref}" t="s"><v>{idx}</v></c>'
+
+
+def ledger_rows(extra=None):
+    """内联字符串写成的账套各行，extra(行号) 返回追加在行末的单元格"""
+    rows = []
+    for n, (voucher, subject) in enumerate(ROWS, 1):
+        rows.append([inline(f"A{n}", voucher), inline(f"B{n}", subject)] + (extra(n) if extra else []))
+    return rows
+
+
+def make_xlsx(path, rows, shared_strings=None, calc_chain=False, vba=None, dimension=None):
+    """手工拼出只有一个工作表的工作簿；rows 为各行单元格 XML 的列表（第 1 行起，空列表表示缺失的行）"""
+    workbook_type = ("application/vnd.ms-excel.sheet.macroEnabled.main+xml" if vba
+                     else f"{SML_TYPE}.sheet.main+xml")
+    overrides = [("/xl/workbook.xml", workbook_type),
+                 ("/xl/worksheets/sheet1.xml", f"{SML_TYPE}.worksheet+xml"),
+                 ("/xl/styles.xml", f"{SML_TYPE}.styles+xml"),
+                 ("/docProps/app.xml",
+                  "application/vnd.openxmlformats-officedocument.extended-properties+xml")]
+    rels = [("rId1", f"{REL_NS}/worksheet", "worksheets/sheet1.xml"),
+            ("rId2", f"{REL_NS}/styles", "styles.xml")]
+    defaults = ('<Default Extension="rels" '
+                'ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                '<Default Extension="xml" ContentType="application/xml"/>')
+    members = {}
+    if shared_strings is not None:
+        overrides.append(("/xl/sharedStrings.xml", f"{SML_TYPE}.sharedStrings+xml"))
+        rels.append(("rId3", f"{REL_NS}/sharedStrings", "sharedStrings.xml"))
+        count = len(shared_strings)
+        members["xl/sharedStrings.xml"] = (
+            f'<sst xmlns="{MAIN_NS}" count="{count}" uniqueCount="{count}">'
+            + "".join(f"<si>{item}</si>" for item in shared_strings) + "</sst>")
+    if calc_chain:
+        overrides.append(("/xl/calcChain.xml", f"{SML_TYPE}.calcChain+xml"))
+        rels.append(("rId4", f"{REL_NS}/calcChain", "calcChain.xml"))
+        members["xl/calcChain.xml"] = f'<calcChain xmlns="{MAIN_NS}"><c r="C2" i="1"/></calcChain>'
+    if vba:
+        defaults += '<Default Extension="bin" ContentType="application/vnd.ms-office.vbaProject"/>'
+        rels.append(("rId5", "http://schemas.microsoft.com/office/2006/relationships/vbaProject",
+                     "vbaProject.bin"))
+        members["xl/vbaProject.bin"] = vba
+
+    sheet_rows = "".join(f'<row r="{n}">{"".join(cells)}</row>'
+                         for n, cells in enumerate(rows, 1) if cells)
+    dim = f'<dimension ref="{dimension}"/>' if dimension else ""
+    members.update({
+        "[Content_Types].xml": f'<Types xmlns="{CT_NS}">{defaults}' + "".join(
+            f'<Override PartName="{part}" ContentType="{ct}"/>' for part, ct in overrides) + "</Types>",
+        "_rels/.rels": (f'<Relationships xmlns="{PKG_REL_NS}"><Relationship Id="rId1" '
+                        f'Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'),
+        "docProps/app.xml": ('<Properties xmlns="http://schemas.openxmlformats.org/officeDocument/'
+                             '2006/extended-properties"><Application>Microsoft Excel</Application>'
+                             '</Properties>'),
+        "xl/workbook.xml": (f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>'
+                            '<sheet name="序时账" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+        "xl/_rels/workbook.xml.rels": f'<Relationships xmlns="{PKG_REL_NS}">' + "".join(
+            f'<Relationship Id="{rid}" Type="{rel_type}" Target="{target}"/>'
+            for rid, rel_type, target in rels) + "</Relationships>",
+        "xl/styles.xml": STYLES,
+        "xl/worksheets/sheet1.xml": (f'<worksheet xmlns="{MAIN_NS}">{dim}<sheetData>{sheet_rows}'
+                                     '</sheetData></worksheet>'),
+    })
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data if isinstance(data, bytes) else data.encode("utf-8"))
+    return path
+
+
+def assert_untouched(src, dst, changed):
+    """除 changed 和计算链外的成员逐字节相同"""
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dst) as zout:
+        kept = set(zin.namelist()) - {"xl/calcChain.xml"}
+        assert kept <= set(zout.namelist())
+        for name in kept - changed:
+            assert zin.read(name) == zout.read(name), name
+
+
+def column(ws, col, rows=5):
+    return [ws.cell(row, col).value for row in range(1, rows + 1)]
+
+
+def assert_header_style(ws, col):
+    cell = ws.cell(1, col)
+    assert cell.font.b and cell.alignment.horizontal == "center"
+
+
+def test_filtered_sheet_unhides_rows(tmp_path):
+    src, dst = str(tmp_path / "src.xlsx"), str(tmp_path / "dst.xlsx")
+    wb = Workbook()
+    ws = ledger_sheet(wb.active)
+    ws.auto_filter.ref = "A1:B5"
+    ws.row_dimensions[3].hidden = True
+    wb.save(src)
+
+    write_columns(src, dst, 3, "对方科目", {None: VALUES})
+    ws = load_workbook(dst).active
+    assert ws.auto_filter.ref is None
+    assert hidden_rows(dst) == set()
+
+
+def test_unfiltered_sheet_keeps_hidden_rows(tmp_path):
+    src, dst = str(tmp_path / "src.xlsx"), str(tmp_path / "dst.xlsx")
+    wb = Workbook()
+    ws = ledger_sheet(wb.active)
+    ws.row_dimensions[2].hidden = True  # 手动隐藏
+    ws.row_dimensions.group(4, 5, outline_level=1, hidden=True)  # 折叠的分组
+    wb.save(src)
+
+    write_columns(src, dst, 3, "对方科目", {None: VALUES})
+    assert hidden_rows(dst) == {2, 4, 5}
+    ws = load_workbook(dst).active
+    assert column(ws, 3) == ["对方科目"] + VALUES
+
+
+def test_inline_strings_without_shared_strings(tmp_path):
+    src = make_xlsx(str(tmp_path / "src.xlsx"), ledger_rows())
+    dst = str(tmp_path / "dst.xlsx")
+
+    write_columns(src, dst, 3, "对方科目", {None: VALUES})
+    # 新增的共享字符串表需要登记
+    assert_untouched(src, dst, ALWAYS_CHANGED | REGISTRY)
+    with zipfile.ZipFile(dst) as zf:
+        assert b"sharedStrings" in zf.read("[Content_Types].xml")
+        assert b"sharedStrings" in zf.read("xl/_rels/workbook.xml.rels")
+    ws = load_workbook(dst).active
+    assert column(ws, 1) == [row[0] for row in ROWS]
+    assert column(ws, 2) == [row[1] for row in ROWS]
+    assert column(ws, 3) == ["对方科目"] + VALUES
+    assert_header_style(ws, 3)
+
+
+def test_existing_shared_strings(tmp_path):
+    items = ["<t>凭证字号</t>", "<t>科目</t>", "<r><t>银行</t></r><r><t>存款</t></r>"]
+    rows = [[shared("A1", 0), shared("B1", 1)], [number("A2", 1), shared("B2", 2)],
+            [number("A3", 1), inline("B3", "管理费用")], [number("A4", 2), shared("B4", 2)],
+            [number("A5", 2), inline("B5", "管理费用")]]
+    src = make_xlsx(str(tmp_path / "src.xlsx"), rows, shared_strings=items)
+    dst = str(tmp_path / "dst.xlsx")
+
+    write_columns(src, dst, 3, "对方科目", {"序时账": ["管理费用", "银行存款", " 管理费用", ""]})
+    assert_untouched(src, dst, ALWAYS_CHANGED)
+    ws = load_workbook(dst).active
+    assert column(ws, 2) == ["科目", "银行存款", "管理费用", "银行存款", "管理费用"]
+    assert column(ws, 3) == ["对方科目", "管理费用", "银行存款", " 管理费用", None]
+    assert_header_style(ws, 3)
+    # 原有条目不变，新字符串追加在后面，相同的只追加一次
+    with zipfile.ZipFile(dst) as zf:
+        sst = zf.read("xl/sharedStrings.xml").decode("utf-8")
+    assert sst.startswith(f'<sst xmlns="{MAIN_NS}" count="7" uniqueCount="7">'
+                          + "".join(f"<si>{item}</si>" for item in items))
+    assert sst.count("<t>管理费用</t>") == 1
+
+
+def test_target_between_existing_cells(tmp_path):
+    rows = ledger_rows(lambda n: [number(f"D{n}", 10), number(f"E{n}", n)])
+    src = make_xlsx(str(tmp_path / "src.xlsx"), rows, dimension="A1:E5")
+    dst = str(tmp_path / "dst.xlsx")
+
+    write_columns(src, dst, 3, "对方科目", {None: VALUES})
+    assert_untouched(src, dst, ALWAYS_CHANGED | REGISTRY)
+    ws = load_workbook(dst).active
+    assert column(ws, 3) == ["对方科目"] + VALUES
+    assert column(ws, 4) == [10] * 5
+    assert column(ws, 5) == [1, 2, 3, 4, 5]
+    assert_header_style(ws, 3)
+    assert ws.dimensions == "A1:E5"
+    # 单元格按列顺序排列（Excel 要求）
+    with zipfile.ZipFile(dst) as zf:
+        xml = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    for n in range(1, 6):
+        order = [xml.find(f'r="{letter}{n}"') for letter in "ABCDE"]
+        assert -1 not in order and order == sorted(order)
+
+
+def test_target_cell_with_value_and_style(tmp_path):
+    rows = ledger_rows(lambda n: [inline("C1", "旧标题", 1) if n == 1 else number(f"C{n}", 99, 1)])
+    src = make_xlsx(str(tmp_path / "src.xlsx"), rows)
+    dst = str(tmp_path / "dst.xlsx")
+
+    write_columns(src, dst, 3, "对方科目", {None: VALUES[:3] + [""]})
+    assert_untouched(src, dst, ALWAYS_CHANGED | REGISTRY)
+    ws = load_workbook(dst).active
+    assert column(ws, 3) == ["对方科目"] + VALUES[:3] + [None]
+    assert_header_style(ws, 3)
+    # 原单元格的样式保留
+    assert all(ws.cell(row, 3).font.i for row in range(2, 5))
+
+
+def test_calc_chain_dropped(tmp_path):
+    rows = ledger_rows(lambda n: ['<c r="C2"><f>1+1</f><v>2</v></c>'] if n == 2 else [])
+    src = make_xlsx(str(tmp_path / "src.xlsx"), rows, shared_strings=[], calc_chain=True)
+    dst = str(tmp_path / "dst.xlsx")
+
+    write_columns(src, dst, 4, "对方科目", {None: VALUES})
+    assert_untouched(src, dst, ALWAYS_CHANGED | REGISTRY)
+    with zipfile.ZipFile(dst) as zf:
+        assert "xl/calcChain.xml" not in zf.namelist()
+        assert b"calcChain" not in zf.read("[Content_Types].xml")
+        assert b"calcChain" not in zf.read("xl/_rels/workbook.xml.rels")
+    ws = load_workbook(dst).active
+    assert ws["C2"].value == "=1+1"
+    assert column(ws, 4) == ["对方科目"] + VALUES
+    assert_header_style(ws, 4)
+
+
+def test_xlsm_keeps_vba_project(tmp_path):
+    vba = os.urandom(4096)
+    src = make_xlsx(str(tmp_path / "src.xlsm"), ledger_rows(), shared_strings=[], vba=vba)
+    dst = str(tmp_path / "dst.xlsm")
+
+    write_columns(src, dst, 3, "对方科目", {None: VALUES})
+    assert_untouched(src, dst, ALWAYS_CHANGED)
+    with zipfile.ZipFile(dst) as zf:
+        assert zf.read("xl/vbaProject.bin") == vba
+    ws = load_workbook(dst).active
+    assert column(ws, 3) == ["对方科目"] + VALUES
+    assert_header_style(ws, 3)
+
+
+@pytest.mark.parametrize("rows", [[], [[], [inline("B2", "只有数据")]]])
+def test_header_row_added_when_missing(tmp_path, rows):
+    src = make_xlsx(str(tmp_path / "src.xlsx"), rows)
+    dst = str(tmp_path / "dst.xlsx")
+
+    write_columns(src, dst, 3, "对方科目", {None: ["银行存款"]})
+    ws = load_workbook(dst).active
+    assert ws.cell(1, 3).value == "对方科目"
+    assert_header_style(ws, 3)
+    assert ws.cell(2, 3).value == ("银行存款" if rows else None)
+
+
+@pytest.mark.parametrize("dimension, expected", [("A1:F3", 6), ("B2", 2), (None, 5)])
+def test_reader_max_column(tmp_path, dimension, expected):
+    # 数据列 E 没有标题：表头只到 C 列，最大列取 dimension 或逐行查找
+    rows = [[inline("A1", "凭证字号"), inline("C1", "借方")],
+            [inline("A2", "记-1"), number("E2", 5)],
+            ['<c t="inlineStr"><is><t>记-2</t></is></c>', "<c><v>1</v></c>"]]
+    src = make_xlsx(str(tmp_path / "src.xlsx"), rows, dimension=dimension)
+    with WorkbookReader(src) as book:
+        sheet = book.sheet()
+        assert sheet.header() == ("凭证字号", None, "借方")
+        assert sheet.max_column() == expected
+
+
+def test_reader_matches_openpyxl(tmp_path):
+    items = ["<t>凭证字号</t>",
+             '<r><t>应收</t></r><r><t>账款</t></r><rPh sb="0" eb="1"><t>x</t></rPh>',
+             '<t xml:space="preserve"> 空格 </t>']
+    rows = [
+        [shared("A1", 0), inline("B1", "科目"), inline("D1", "日期")],
+        [number("A2", 1), shared("B2", 1), number("C2", "1.5"), number("D2", 45292, 2)],
+        [],
+        ['<c r="A4" t="str"><f>"记-"&amp;1</f><v>记-1</v></c>', '<c r="B4" t="b"><v>1</v></c>',
+         '<c r="C4" t="e"><v>#DIV/0!</v></c>', '<c r="D4" s="2"/>'],
+        # 没有 r 属性的单元格按顺序排列
+        ['<c t="inlineStr"><is><t>记-2</t></is></c>', '<c t="s"><v>2</v></c>', "<c><v>1E3</v></c>"],
+    ]
+    src = make_xlsx(str(tmp_path / "src.xlsx"), rows, shared_strings=items)
+
+    wb = load_workbook(src, read_only=True, data_only=True)
+    expected = [tuple(row) for row in wb.active.iter_rows(min_row=2, max_col=4, values_only=True)]
+    wb.close()
+    assert expected[0][3] == datetime.datetime(2024, 1, 1)
+    with WorkbookReader(src) as book:
+        sheet = book.sheet()
+        assert sheet.header() == ("凭证字号", "科目", None, "日期")
+        assert list(sheet.rows(range(4))) == expected
+        # 只取部分列，列顺序任意
+        assert list(sheet.rows([3, 0])) == [(row[3], row[0]) for row in expected]
+
+
+def test_small_chunks(tmp_path, monkeypatch):
+    # 行、标签和共享字符串表跨越分块边界
+    monkeypatch.setattr(xlsx_package, "CHUNK_SIZE", 37)
+    n_rows = 200
+    items = [f"<t>科目{i}</t>" for i in range(50)]
+    rows = [[inline("A1", "凭证字号"), inline("B1", "科目")]]
+    rows += [[number(f"A{n}", n // 3), shared(f"B{n}", n % 50), number(f"D{n}", n)]
+             for n in range(2, n_rows + 1)]
+    src = make_xlsx(str(tmp_path / "src.xlsx"), rows, shared_strings=items)
+    dst = str(tmp_path / "dst.xlsx")
+    values = [f"对方{n % 7}" for n in range(2, n_rows + 1)]
+
+    with WorkbookReader(src) as book:
+        read = list(book.sheet().rows([0, 1, 3]))
+    assert read == [(n // 3, f"科目{n % 50}", n) for n in range(2, n_rows + 1)]
+
+    write_columns(src, dst, 3, "对方科目", {None: values})
+    assert_untouched(src, dst, ALWAYS_CHANGED)
+    ws = load_workbook(dst).active
+    assert column(ws, 3, n_rows) == ["对方科目"] + values
+    assert column(ws, 2, n_rows)[1:] == [f"科目{n % 50}" for n in range(2, n_rows + 1)]
+    assert column(ws, 4, n_rows)[1:] == list(range(2, n_rows + 1))